@@ -1,16 +1,38 @@
 from flask import Flask
 from flask_cors import CORS
 from .config import Config
-from .extensions import db, limiter
+from .extensions import db, limiter, graph
 from .routes import register_blueprints
+from .cache import DatabaseCache
+from .utils import tier_cache
+from .migrations import upgrade
+from . import window  # noqa: F401  (registers the MessageLog flush hook and its backfill)
+from . import usage  # noqa: F401  (same, for the hourly usage rollups)
+from . import inbox  # noqa: F401  (same, for the conversation inbox)
+from .commands import register_commands
+from .events import hub
+from .ratelimit import rate_limiter
+from .governor import governor
+from .metrics import request_metrics
+from .logs import setup_logging
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    setup_logging(app)
     CORS(app, origins=["http://localhost:3000"])  # Allow frontend to access backend
 
+    if app.config["TRUSTED_PROXY_HOPS"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_HOPS"])
+
     db.init_app(app)
+    request_metrics.init_app(app)
     limiter.init_app(app)
+    rate_limiter.init_app(app)
+    governor.init_app(app)
+    graph.init_app(app)
+    hub.init_app(app)
 
     # Enable CORS with restriction to localhost:3000
     CORS(app, resources={r"/*": {
@@ -20,7 +42,11 @@ def create_app():
     }})
 
     with app.app_context():
-        db.create_all()
+        upgrade()  # create_all plus any columns/indexes added since the database was created
+
+    if app.config["TIER_CACHE_SHARED"]:
+        tier_cache.shared = DatabaseCache(app)
 
     register_blueprints(app)
+    register_commands(app)
     return app
@@ -0,0 +1,127 @@
+# app/admin_stats.py — system-wide numbers for /admin/analytics
+#
+# Every figure comes from one grouped query over a small table: clients for
+# the status breakdown, usage_totals (kept current on every MessageLog insert,
+# see app/usage.py) for message volume, billing_records for revenue. The
+# assembled snapshot is cached for ADMIN_STATS_TTL seconds and refreshed in
+# the background, so the admin panel never waits on a 50k-client scan.
+
+import datetime as dt
+from flask import current_app
+from sqlalchemy import func, case
+from .extensions import db
+from .models import Client, Plan, UsageTotal, BillingRecord
+from .cache import TTLCache
+
+TOP_SENDERS = 10
+REVENUE_PERIODS = 12  # most recent billing periods broken out
+
+stats_cache = TTLCache("admin_stats")
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _client_status(now):
+    row = db.session.query(
+        func.count(Client.id),
+        _count_if(Client.is_active.is_(True)),
+        _count_if(Client.plan_expiry < now),
+        _count_if(Client.is_key_revoked.is_(True)),
+        _count_if(Client.auto_renew.is_(True))
+    ).one()
+    total, active, expired, revoked, auto_renew = (int(v or 0) for v in row)
+    return {
+        "total_clients": total,
+        "active_clients": active,
+        "inactive_clients": total - active,
+        "expired_clients": expired,
+        "revoked_keys": revoked,
+        "auto_renew_clients": auto_renew
+    }
+
+
+def _messages_per_plan():
+    rows = (
+        db.session.query(
+            Plan.name,
+            func.count(Client.id),
+            func.coalesce(func.sum(UsageTotal.sent), 0),
+            func.coalesce(func.sum(UsageTotal.received), 0),
+            func.coalesce(func.sum(Client.usage_count), 0)
+        )
+        .outerjoin(Client, Client.plan_id == Plan.id)
+        .outerjoin(UsageTotal, UsageTotal.client_id == Client.id)
+        .group_by(Plan.id, Plan.name)
+        .order_by(Plan.name)
+    )
+    return [{
+        "plan": name,
+        "clients": int(clients),
+        "sent": int(sent),
+        "received": int(received),
+        "current_period_usage": int(usage)
+    } for name, clients, sent, received, usage in rows]
+
+
+def _revenue():
+    total_cents, records = db.session.query(
+        func.coalesce(func.sum(BillingRecord.amount_cents), 0),
+        func.count(BillingRecord.id)
+    ).one()
+    periods = (
+        db.session.query(BillingRecord.billing_period, func.sum(BillingRecord.amount_cents), func.count(BillingRecord.id))
+        .group_by(BillingRecord.billing_period)
+        .order_by(BillingRecord.billing_period.desc())
+        .limit(REVENUE_PERIODS)
+    )
+    return {
+        "total_cents": int(total_cents),
+        "records": int(records),
+        "by_period": [
+            {"period": period, "amount_cents": int(amount or 0), "records": int(count)}
+            for period, amount, count in periods
+        ]
+    }
+
+
+def _top_senders():
+    rows = (
+        db.session.query(Client.id, Client.username, UsageTotal.sent, UsageTotal.received)
+        .join(UsageTotal, UsageTotal.client_id == Client.id)
+        .order_by(UsageTotal.sent.desc())
+        .limit(TOP_SENDERS)
+    )
+    return [
+        {"client_id": cid, "username": username, "sent": sent, "received": received}
+        for cid, username, sent, received in rows
+    ]
+
+
+def compute_stats():
+    now = dt.datetime.utcnow()
+    stats = _client_status(now)
+    stats.update({
+        "messages_per_plan": _messages_per_plan(),
+        "revenue": _revenue(),
+        "top_senders": _top_senders(),
+        "generated_at": now.isoformat()
+    })
+    return stats
+
+
+def _load(app):
+    with app.app_context():
+        return compute_stats()
+
+
+def get_stats():
+    app = current_app._get_current_object()
+    ttl = app.config["ADMIN_STATS_TTL"]
+    return stats_cache.get_or_load("stats", lambda: _load(app), ttl=ttl, stale_ttl=ttl * 10)
+
+
+def invalidate_stats():
+    """Call after admin actions so the panel shows their effect right away."""
+    stats_cache.invalidate("stats")
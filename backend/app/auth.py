@@ -1,39 +1,156 @@
 from flask import request, jsonify, g, Blueprint, current_app
 import jwt
+import math
+import threading
+import time
 from datetime import datetime, timedelta
 from functools import wraps
-from .models import Client
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from .extensions import db
+from .models import Client, Plan, AuthInvalidation
 from .config import Config
+from .cache import TTLCache
+from .ratelimit import rate_limiter
+
+# Verified client + plan snapshots, so an authenticated request costs no query
+# until the handler touches something else. Admin routes that change a client
+# call invalidate_client(..., all_processes=True), which also records the change
+# in auth_invalidations; every process reads that table at most every
+# AUTH_INVALIDATION_POLL seconds, so a revoke or deactivation reaches all
+# gunicorn workers within about that long. Everything else ages out after
+# AUTH_CACHE_TTL.
+client_cache = TTLCache("auth_clients", ttl=Config.AUTH_CACHE_TTL, maxsize=Config.AUTH_CACHE_SIZE)
+CLOCK_SKEW = 5  # seconds of overlap between polls, for clocks of different hosts
+
+_invalidations_lock = threading.Lock()
+_invalidations_seen = {"checked_at": None, "next_poll": 0.0}
+
+_SNAPSHOT_EXCLUDE = {"password"}  # never cached; lazy-loaded if a handler needs it
+
+
+def _columns(obj, exclude=()):
+    return {attr.key: getattr(obj, attr.key) for attr in sa_inspect(obj).mapper.column_attrs if attr.key not in exclude}
+
+
+def _snapshot(client):
+    return {
+        "client": _columns(client, _SNAPSHOT_EXCLUDE),
+        "plan": _columns(client.plan) if client.plan else None
+    }
+
+
+def _from_snapshot(snapshot):
+    """Rebuilds the cached rows as persistent objects in the current session without a SELECT."""
+    plan = None
+    if snapshot["plan"]:
+        plan = Plan(**snapshot["plan"])
+        make_transient_to_detached(plan)
+
+    client = Client(**snapshot["client"])
+    set_committed_value(client, "plan", plan)
+    make_transient_to_detached(client)
+    return db.session.merge(client, load=False)
+
+
+def invalidate_client(client_id, all_processes=False):
+    """
+    Drops the cached client. With `all_processes` (admin changes: revoke,
+    deactivate, plan, delete) the other worker processes drop theirs too.
+    """
+    client_cache.invalidate(int(client_id))
+    if not all_processes:
+        return
+    now = datetime.utcnow()
+    db.session.execute(AuthInvalidation.__table__.insert().values(client_id=int(client_id), changed_at=now))
+    # Older announcements are useless once every cached copy has expired anyway
+    db.session.execute(AuthInvalidation.__table__.delete().where(
+        AuthInvalidation.changed_at < now - timedelta(seconds=Config.AUTH_CACHE_TTL + CLOCK_SKEW)
+    ))
+    db.session.commit()
+
+
+def _sync_invalidations():
+    """Applies other processes' invalidate_client(all_processes=True) calls, polling at most every AUTH_INVALIDATION_POLL."""
+    with _invalidations_lock:
+        if time.monotonic() < _invalidations_seen["next_poll"]:
+            return
+        _invalidations_seen["next_poll"] = time.monotonic() + current_app.config["AUTH_INVALIDATION_POLL"]
+        since = _invalidations_seen["checked_at"]
+
+    now = datetime.utcnow()
+    if since is None:
+        since = now - timedelta(seconds=Config.AUTH_CACHE_TTL + CLOCK_SKEW)  # anything this process may have cached
+    rows = db.session.execute(
+        AuthInvalidation.__table__.select()
+        .with_only_columns(AuthInvalidation.client_id)
+        .where(AuthInvalidation.changed_at >= since - timedelta(seconds=CLOCK_SKEW))
+    ).all()
+    for (client_id,) in rows:
+        client_cache.invalidate(client_id)
+    _invalidations_seen["checked_at"] = now
+
+
+def _load_client(client_id: int) -> Client | None:
+    _sync_invalidations()
+    snapshot = client_cache.get(client_id)
+    if snapshot is not None:
+        return _from_snapshot(snapshot)
+
+    client = db.session.get(Client, client_id, options=[joinedload(Client.plan)])
+    if client is not None:
+        client_cache.set(client_id, _snapshot(client))
+    return client
 
 
 def _verify_api_key(token: str) -> Client | None:
     try:
         data = jwt.decode(token, Config.JWT_SECRET, algorithms=[Config.JWT_ALG])
-        client = Client.query.get(int(data["sub"]))
-        print("Decoded JWT:", data)
+        client = _load_client(int(data["sub"]))
     except Exception as e:
-        print("JWT decode failed:", str(e))
+        current_app.logger.info(f"JWT decode failed: {e}")
         return None
 
     if not client:
-        print("Client not found")
+        current_app.logger.info("Client not found")
         return None
 
     if not client.is_active:
-        print("Client inactive")
+        current_app.logger.info("Client inactive")
         return None
 
     if client.is_key_revoked:
-        print("Client key revoked")
+        current_app.logger.info("Client key revoked")
         return None
 
     if client.plan_expiry and client.plan_expiry < datetime.utcnow():
-        print("Plan expired:", client.plan_expiry)
+        current_app.logger.info(f"Plan expired: {client.plan_expiry}")
         return None
 
     return client
 
 
+def _request_client(token: str) -> Client | None:
+    """_verify_api_key, done once per request: the per-IP limiter check and require_api_key share it."""
+    verified = g.get("_verified_key")
+    if verified is None or verified[0] != token:
+        verified = g._verified_key = (token, _verify_api_key(token))
+    return verified[1]
+
+
+def has_valid_api_key() -> bool:
+    """
+    True when the request carries a valid API key. Such requests are exempt
+    from the per-IP default limits and rate limited per client instead; a
+    made-up Bearer header is still limited by IP.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return False
+    return _request_client(auth_header.split(" ")[1]) is not None
+
+
 def require_api_key(view_func):
     @wraps(view_func)
     def wrapper(*args, **kwargs):
@@ -42,11 +159,19 @@ def require_api_key(view_func):
             return jsonify({"error": "Missing or invalid token"}), 401
 
         token = auth_header.split(" ")[1]
-        client = _verify_api_key(token)
+        client = _request_client(token)
 
         if client is None:
             return jsonify({"error": "Invalid or expired token or plan"}), 403
 
+        if not getattr(view_func, "rate_limit_exempt", False):
+            retry_after = rate_limiter.hit_client(client)
+            if retry_after:
+                seconds = max(1, math.ceil(retry_after))
+                resp = jsonify({"error": f"Rate limit exceeded. Retry in {seconds} seconds."})
+                resp.headers["Retry-After"] = str(seconds)
+                return resp, 429
+
         g.client = client
         return view_func(*args, **kwargs)
 
@@ -0,0 +1,182 @@
+# app/cache.py — small in-process caches with stale-while-revalidate
+
+import threading
+import time
+import datetime as dt
+from collections import OrderedDict
+from .extensions import db
+from .models import CacheEntry
+
+_registry = {}
+
+
+def all_cache_stats():
+    """Hit/miss counters for every cache created in this process."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+class TTLCache:
+    """
+    Thread-safe TTL cache, optionally bounded as an LRU.
+
+    `get_or_load` serves fresh entries from memory. Once an entry expires it is
+    still served for `stale_ttl` seconds while a single background thread
+    reloads it, so callers on the hot path never wait on the loader unless
+    the key is missing entirely.
+
+    An optional `shared` backend (see `DatabaseCache`) lets several worker
+    processes reuse one loaded value instead of each calling the loader.
+    """
+
+    def __init__(self, name, ttl=60, stale_ttl=0, maxsize=None, shared=None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._counters = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "shared_hits": 0,
+            "refreshes": 0, "refresh_errors": 0, "evictions": 0
+        }
+        _registry[name] = self
+
+    # ----------- BASIC OPERATIONS -----------
+    def get(self, key):
+        """Returns the cached value if it is still fresh, else None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[1] > time.time():
+                self._data.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        expires_at = expires_at or time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if self.maxsize:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self._counters["evictions"] += 1
+
+    def invalidate(self, key=None):
+        """Drops one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self._shared_key(key) if key is not None else f"{self.name}:", prefix=key is None)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters, size=len(self._data))
+        lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        counters["hit_ratio"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0.0
+        return counters
+
+    # ----------- READ-THROUGH -----------
+    def get_or_load(self, key, loader, ttl=None, stale_ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        now = time.time()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and now < entry[1]:
+                self._data.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            if entry and now < entry[1] + stale_ttl:
+                self._counters["stale_hits"] += 1
+                start_refresh = key not in self._refreshing
+                if start_refresh:
+                    self._refreshing.add(key)
+            else:
+                self._counters["misses"] += 1
+                entry = None
+
+        if entry is None:
+            return self._load(key, loader, ttl)
+
+        if start_refresh:
+            threading.Thread(
+                target=self._refresh, args=(key, loader, ttl),
+                name=f"cache-refresh-{self.name}", daemon=True
+            ).start()
+        return entry[0]
+
+    def _load(self, key, loader, ttl):
+        if self.shared is not None:
+            found = self.shared.get(self._shared_key(key))
+            if found is not None and found[1] > time.time():
+                with self._lock:
+                    self._counters["shared_hits"] += 1
+                self.set(key, found[0], expires_at=found[1])
+                return found[0]
+
+        value = loader()
+        expires_at = time.time() + ttl
+        self.set(key, value, expires_at=expires_at)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), value, expires_at)
+        return value
+
+    def _refresh(self, key, loader, ttl):
+        try:
+            self._load(key, loader, ttl)
+            with self._lock:
+                self._counters["refreshes"] += 1
+        except Exception:
+            # Keep serving the stale value; the next stale hit retries
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _shared_key(self, key):
+        return f"{self.name}:{key}"
+
+
+class DatabaseCache:
+    """
+    Shared cache layer stored in the `cache_entries` table, so every gunicorn
+    worker sees one value per key.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, key):
+        with self.app.app_context():
+            row = db.session.get(CacheEntry, key)
+            if row is None:
+                return None
+            return row.value, row.expires_at.replace(tzinfo=dt.timezone.utc).timestamp()
+
+    def set(self, key, value, expires_at):
+        with self.app.app_context():
+            db.session.merge(CacheEntry(
+                key=key,
+                value=value,
+                expires_at=dt.datetime.utcfromtimestamp(expires_at)
+            ))
+            db.session.commit()
+
+    def delete(self, key, prefix=False):
+        with self.app.app_context():
+            if prefix:
+                query = CacheEntry.query.filter(CacheEntry.key.startswith(key, autoescape=True))
+            else:
+                query = CacheEntry.query.filter_by(key=key)
+            query.delete(synchronize_session=False)
+            db.session.commit()
+
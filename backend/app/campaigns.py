@@ -0,0 +1,523 @@
+# app/campaigns.py — personalised template broadcasts
+#
+# A campaign is one approved template plus an audience in which every row
+# carries its own parameters ({{1}}, {{first_name}}, a header image link, a
+# URL button suffix). The audience is uploaded as CSV or JSON lines and read
+# as a stream: rows are validated and inserted into campaign_recipients
+# CAMPAIGN_UPLOAD_BATCH at a time, so a million-row upload never sits in
+# memory. The unique (campaign_id, recipient) index drops duplicate numbers.
+#
+# Started campaigns are drained by the queue workers (backend/worker.py) in
+# between jobs. Like a job, each chunk's sends, recipient statuses, MessageLog
+# rows and progress counters are committed in one transaction that only
+# succeeds while the worker still holds the lease. A worker hands a campaign
+# back after CAMPAIGN_SLICE_SECONDS, so queued send_message jobs keep
+# flowing. Chunks stay inside the 24h unique-recipient tier limit: a campaign
+# that used it up waits CAMPAIGN_TIER_RETRY_SECONDS and carries on.
+
+import csv
+import datetime as dt
+import json
+import re
+import time
+from flask import current_app
+from sqlalchemy import update, select, func, or_, and_
+from sqlalchemy.dialects import sqlite, postgresql
+from .extensions import db
+from .models import Campaign, CampaignRecipient, Client
+from .metering import remaining_quota, reserve, settle, release
+from .dispatch import fan_out, build_logs, publish_sent, sent_wamid, split_throttled
+from .governor import governor
+from .utils import send_whatsapp_template, get_whatsapp_tier_and_limit
+from .window import count_template_recipients_since, template_recipients_since
+
+ACTIVE_STATUSES = ("queued", "running")
+PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z0-9_]+)\s*\}\}")
+MEDIA_FORMATS = ("IMAGE", "VIDEO", "DOCUMENT")
+MAX_PARAM_LENGTH = 1024
+CAP_EXCEEDED_ERROR = "Monthly usage cap exceeded."
+THROTTLED_TOO_OFTEN_ERROR = "Throttled by WhatsApp on every attempt."
+
+
+class AudienceError(ValueError):
+    """Bad campaign definition or audience row; routes turn it into a 400 (rows are counted as invalid)."""
+
+
+# ----------- TEMPLATE PARAMETERS -----------
+def _placeholders(text, named):
+    names = list(dict.fromkeys(PLACEHOLDER.findall(text or "")))
+    return names if named else sorted(names, key=lambda n: int(n) if n.isdigit() else 0)
+
+
+def compile_template(tpl):
+    """
+    The parameters a catalogue template needs, as a list of slots. Each slot
+    names the audience columns that fill it: body placeholders by their own
+    name ("1", "first_name"), "header.<name>" for a text header,
+    "header.link" for a media header and "button.<index>" for a URL button.
+    """
+    named = (tpl.get("parameter_format") or "").upper() == "NAMED"
+    slots = []
+    for comp in tpl.get("components") or []:
+        kind = (comp.get("type") or "").upper()
+        if kind == "HEADER":
+            fmt = (comp.get("format") or "TEXT").upper()
+            if fmt in MEDIA_FORMATS:
+                slots.append({"type": "header", "format": fmt.lower(), "params": ["link"], "columns": ["header.link"]})
+                continue
+            params = _placeholders(comp.get("text"), named)
+            if params:
+                slots.append({
+                    "type": "header", "format": "text", "named": named,
+                    "params": params, "columns": [f"header.{p}" for p in params]
+                })
+        elif kind == "BODY":
+            params = _placeholders(comp.get("text"), named)
+            if params:
+                slots.append({"type": "body", "named": named, "params": params, "columns": params})
+        elif kind == "BUTTONS":
+            for index, button in enumerate(comp.get("buttons") or []):
+                if (button.get("type") or "").upper() == "URL" and PLACEHOLDER.search(button.get("url") or ""):
+                    slots.append({"type": "button", "index": index, "params": ["1"], "columns": [f"button.{index}"]})
+    return slots
+
+
+def template_columns(slots):
+    return [column for slot in slots for column in slot["columns"]]
+
+
+def normalize_number(raw):
+    """'+92 300-1234567' -> '923001234567'."""
+    number = re.sub(r"[\s()+.-]", "", str(raw or ""))
+    if not number.isdigit() or not 7 <= len(number) <= 15:
+        raise AudienceError(f"Invalid phone number '{raw}'")
+    return number
+
+
+def _check_value(column, value):
+    value = str(value).strip()
+    if len(value) > MAX_PARAM_LENGTH:
+        raise AudienceError(f"'{column}' is longer than {MAX_PARAM_LENGTH} characters")
+    if column == "header.link":
+        if not value.startswith(("https://", "http://")):
+            raise AudienceError("'header.link' must be an http(s) URL")
+    elif "\n" in value or "\t" in value or "     " in value:
+        # Graph rejects the whole send for these, so catch them at upload
+        raise AudienceError(f"'{column}' can't contain new lines, tabs or more than 4 consecutive spaces")
+    return value
+
+
+def validate_params(columns, params, defaults):
+    """The row's values for `columns` (only those), checked the way Graph would. Raises AudienceError."""
+    values = {}
+    for column in columns:
+        value = params.get(column)
+        if value is None or value == "":
+            if column in defaults:
+                continue
+            raise AudienceError(f"Missing '{column}'")
+        values[column] = _check_value(column, value)
+    return values
+
+
+def render_components(slots, params, defaults=None):
+    """Graph `components` for one recipient."""
+    defaults = defaults or {}
+
+    def value(column):
+        return params.get(column) or defaults.get(column)
+
+    components = []
+    for slot in slots:
+        if slot["type"] == "button":
+            components.append({
+                "type": "button", "sub_type": "url", "index": str(slot["index"]),
+                "parameters": [{"type": "text", "text": value(slot["columns"][0])}]
+            })
+        elif slot["type"] == "header" and slot["format"] != "text":
+            fmt = slot["format"]
+            components.append({"type": "header", "parameters": [{"type": fmt, fmt: {"link": value("header.link")}}]})
+        else:
+            parameters = []
+            for name, column in zip(slot["params"], slot["columns"]):
+                parameter = {"type": "text", "text": value(column)}
+                if slot["named"]:
+                    parameter["parameter_name"] = name
+                parameters.append(parameter)
+            components.append({"type": slot["type"], "parameters": parameters})
+    return components
+
+
+# ----------- AUDIENCE UPLOAD -----------
+def read_csv(lines):
+    """Yields (row number, to, params, error) from CSV text lines with a header row containing 'to'."""
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or "to" not in [f.strip() for f in reader.fieldnames]:
+        raise AudienceError("The CSV header must have a 'to' column")
+    reader.fieldnames = [f.strip() for f in reader.fieldnames]
+    for row in reader:
+        params = {k: v for k, v in row.items() if k and k != "to" and v}
+        yield reader.line_num, row.get("to"), params, None
+
+
+def read_ndjson(lines):
+    """Yields (line number, to, params, error) from lines like {"to": "923001234567", "params": {"1": "Ali"}}."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict) or not isinstance(row.get("params") or {}, dict):
+            yield number, None, None, "Expected an object with 'to' and 'params'"
+            continue
+        yield number, row.get("to"), row.get("params") or {}, None
+
+
+def _insert_recipients(rows):
+    """Inserts a batch of audience rows, skipping numbers the campaign already has."""
+    table = CampaignRecipient.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table).on_conflict_do_nothing(index_elements=[table.c.campaign_id, table.c.recipient])
+        db.session.execute(stmt, rows)
+    else:
+        numbers = {r["recipient"] for r in rows}
+        present = set(db.session.scalars(select(table.c.recipient).where(
+            table.c.campaign_id == rows[0]["campaign_id"], table.c.recipient.in_(numbers)
+        )))
+        rows = [r for r in rows if r["recipient"] not in present]
+        if rows:
+            db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def _count_recipients(campaign_id):
+    return db.session.query(func.count(CampaignRecipient.id)).filter_by(campaign_id=campaign_id).scalar()
+
+
+def ingest_audience(campaign, records):
+    """
+    Validates and stores the (row, to, params, error) records of an upload,
+    one committed batch at a time. Returns the upload summary.
+    """
+    cfg = current_app.config
+    columns = template_columns(campaign.slots)
+    defaults = campaign.defaults or {}
+    max_errors = cfg["JOB_MAX_STORED_ERRORS"]
+    before = _count_recipients(campaign.id)
+
+    valid, invalid, errors, batch = 0, 0, [], []
+    for row_number, to, params, error in records:
+        if error is None:
+            try:
+                batch.append({
+                    "campaign_id": campaign.id,
+                    "recipient": normalize_number(to),
+                    "params": validate_params(columns, params, defaults),
+                    "status": "pending",
+                    "requeues": 0
+                })
+            except AudienceError as e:
+                error = str(e)
+        if error is not None:
+            invalid += 1
+            if len(errors) < max_errors:
+                errors.append({"row": row_number, "recipient": to, "error": error})
+            continue
+        valid += 1
+        if len(batch) >= cfg["CAMPAIGN_UPLOAD_BATCH"]:
+            _insert_recipients(batch)
+            batch = []
+    if batch:
+        _insert_recipients(batch)
+
+    total = _count_recipients(campaign.id)
+    db.session.execute(
+        update(Campaign)
+        .where(Campaign.id == campaign.id)
+        .values(
+            total_count=total,
+            invalid_count=Campaign.invalid_count + invalid,
+            errors=((campaign.errors or []) + errors)[:max_errors]
+        )
+    )
+    db.session.commit()
+    return {
+        "accepted": total - before,
+        "duplicates": valid - (total - before),
+        "invalid": invalid,
+        "total": total,
+        "errors": errors
+    }
+
+
+def campaign_status(campaign):
+    total = campaign.total_count
+    done = campaign.sent_count + campaign.failed_count
+    return {
+        "campaign_id": campaign.id,
+        "name": campaign.name,
+        "template": campaign.template_name,
+        "language": campaign.language,
+        "columns": template_columns(campaign.slots),
+        "status": campaign.status,
+        "total": total,
+        "invalid": campaign.invalid_count,
+        "sent": campaign.sent_count,
+        "failed": campaign.failed_count,
+        "pending": total - done,
+        "requeued": campaign.requeued_count,
+        "progress": round(done / total * 100, 2) if total else 0.0,
+        "error": campaign.error,
+        "errors": campaign.errors or [],
+        "created_at": campaign.created_at.isoformat() if campaign.created_at else None,
+        "started_at": campaign.started_at.isoformat() if campaign.started_at else None,
+        "finished_at": campaign.finished_at.isoformat() if campaign.finished_at else None
+    }
+
+
+# ----------- LEASING -----------
+def claim_campaign(worker_id):
+    """Leases the oldest runnable campaign to `worker_id`, like jobs.claim_job(). Returns it or None."""
+    now = dt.datetime.utcnow()
+    lease_until = now + dt.timedelta(seconds=current_app.config["JOB_LEASE_SECONDS"])
+    runnable = (
+        Campaign.status.in_(ACTIVE_STATUSES),
+        or_(Campaign.lease_expires_at.is_(None), Campaign.lease_expires_at < now)
+    )
+
+    candidates = db.session.query(Campaign.id).filter(*runnable).order_by(Campaign.id).limit(10).all()
+    for (campaign_id,) in candidates:
+        res = db.session.execute(
+            update(Campaign)
+            .where(Campaign.id == campaign_id, *runnable)
+            .values(
+                status="running",
+                leased_by=worker_id,
+                lease_expires_at=lease_until,
+                attempts=Campaign.attempts + 1,
+                started_at=func.coalesce(Campaign.started_at, now)
+            )
+        )
+        db.session.commit()
+        if res.rowcount == 1:
+            return db.session.get(Campaign, campaign_id)
+
+    return None
+
+
+def _owned(campaign, worker_id, *conditions, running=True):
+    """Still leased by `worker_id` (and, unless running=False, not cancelled meanwhile)."""
+    status = (Campaign.status == "running",) if running else ()
+    return and_(Campaign.id == campaign.id, Campaign.leased_by == worker_id, *status, *conditions)
+
+
+def _hand_back(campaign, worker_id, delay=0, running=True, **values):
+    """Drops the lease (optionally keeping the campaign unclaimable for `delay` seconds). False if already lost."""
+    until = dt.datetime.utcnow() + dt.timedelta(seconds=delay) if delay else None
+    res = db.session.execute(
+        update(Campaign).where(_owned(campaign, worker_id, running=running)).values(leased_by=None, lease_expires_at=until, **values)
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def _fail_remaining(campaign, worker_id, error):
+    """Stops a campaign that can't continue, failing every recipient not yet handled."""
+    res = db.session.execute(
+        update(Campaign)
+        .where(_owned(campaign, worker_id))
+        .values(status="failed", error=error, leased_by=None, lease_expires_at=None, finished_at=dt.datetime.utcnow())
+    )
+    if res.rowcount != 1:
+        db.session.rollback()
+        return
+    failed = db.session.execute(
+        update(CampaignRecipient)
+        .where(CampaignRecipient.campaign_id == campaign.id, CampaignRecipient.status.in_(("pending", "requeued")))
+        .values(status="failed", error=error)
+    ).rowcount
+    db.session.execute(
+        update(Campaign).where(Campaign.id == campaign.id).values(failed_count=Campaign.failed_count + failed)
+    )
+    db.session.commit()
+
+
+# ----------- PROCESSING -----------
+def _within_tier(client_id, rows, now):
+    """Longest prefix of `rows` that keeps the client inside its 24h unique-recipient tier limit."""
+    _, limit = get_whatsapp_tier_and_limit()
+    since = now - dt.timedelta(hours=24)
+    allowance = limit - count_template_recipients_since(client_id, since)
+    seen = template_recipients_since(client_id, since, [r.recipient for r in rows])
+    allowed = []
+    for row in rows:
+        if row.recipient not in seen:
+            if allowance < 1:
+                break
+            allowance -= 1
+        allowed.append(row)
+    return allowed
+
+
+def _error_text(entry):
+    response = entry.get("response")
+    return (response if isinstance(response, str) else json.dumps(response, default=str))[:1000]
+
+
+def _send_chunk(campaign, worker_id, monthly_cap):
+    """
+    Sends the next chunk of pending recipients and commits its outcome.
+    Returns "sent", "done" (nothing left), "wait" (tier limit or contended quota), "capped", "cancelled"
+    (the chunk was recorded, but the campaign was cancelled meanwhile) or "lost" (lease gone).
+    """
+    cfg = current_app.config
+    start = campaign.cursor
+    rows = (
+        CampaignRecipient.query
+        .filter(
+            CampaignRecipient.campaign_id == campaign.id,
+            CampaignRecipient.status == "pending",
+            CampaignRecipient.id > start
+        )
+        .order_by(CampaignRecipient.id)
+        .limit(cfg["JOB_CHUNK_SIZE"])
+        .all()
+    )
+
+    if not rows:
+        # End of a pass: recipients Graph throttled get another one, from the top
+        again = db.session.execute(
+            update(CampaignRecipient)
+            .where(CampaignRecipient.campaign_id == campaign.id, CampaignRecipient.status == "requeued")
+            .values(status="pending")
+        ).rowcount
+        if not again:
+            db.session.rollback()
+            return "done"
+        res = db.session.execute(update(Campaign).where(_owned(campaign, worker_id, Campaign.cursor == start)).values(cursor=0))
+        if res.rowcount != 1:
+            db.session.rollback()
+            return "lost"
+        db.session.commit()
+        db.session.refresh(campaign)
+        return "sent"
+
+    now = dt.datetime.utcnow()
+    rows = _within_tier(campaign.client_id, rows, now)
+    if not rows:
+        db.session.rollback()
+        return "wait"
+
+    # A chunk bigger than the quota left is cut down to fit; only an exhausted quota caps the campaign
+    reservation = reserve(campaign.client_id, len(rows), monthly_cap)
+    for _ in range(3):  # other senders of the client can take quota between the read and the reserve
+        if reservation is not None:
+            break
+        left = remaining_quota(campaign.client_id, monthly_cap)
+        if not left:
+            return "capped"
+        rows = rows[:left]
+        reservation = reserve(campaign.client_id, len(rows), monthly_cap)
+    if reservation is None:
+        return "wait"  # quota is contended right now, try again later
+
+    components = {r.recipient: render_components(campaign.slots, r.params or {}, campaign.defaults) for r in rows}
+
+    def send(recipient):
+        return send_whatsapp_template(recipient, campaign.template_name, campaign.language, components[recipient])
+
+    try:
+        successes, send_errors = fan_out(list(components), send)
+    except Exception:
+        release(reservation)
+        raise
+    throttled, send_errors = split_throttled(send_errors)
+
+    by_number = {r.recipient: r for r in rows}
+    changes = [
+        {"id": by_number[s["recipient"]].id, "status": "sent", "wamid": sent_wamid(s), "sent_at": now, "error": None}
+        for s in successes
+    ]
+    changes += [{"id": by_number[e["recipient"]].id, "status": "failed", "error": _error_text(e)} for e in send_errors]
+    requeued = 0
+    for recipient in throttled:
+        row = by_number[recipient]
+        if row.requeues < cfg["GOVERNOR_MAX_REQUEUES"]:
+            changes.append({"id": row.id, "status": "requeued", "requeues": row.requeues + 1})
+            requeued += 1
+        else:
+            changes.append({"id": row.id, "status": "failed", "error": THROTTLED_TOO_OFTEN_ERROR})
+    failed = len(send_errors) + len(throttled) - requeued
+
+    # Advance only if we still own the lease and nobody moved the cursor. A cancel that
+    # arrived mid-chunk doesn't block this: the messages went out and must be recorded
+    res = db.session.execute(
+        update(Campaign)
+        .where(_owned(campaign, worker_id, Campaign.cursor == start, running=False))
+        .values(
+            cursor=rows[-1].id,
+            sent_count=Campaign.sent_count + len(successes),
+            failed_count=Campaign.failed_count + failed,
+            requeued_count=Campaign.requeued_count + requeued,
+            attempts=0,
+            lease_expires_at=dt.datetime.utcnow() + dt.timedelta(seconds=cfg["JOB_LEASE_SECONDS"])
+        )
+    )
+    if res.rowcount != 1:
+        db.session.rollback()
+        release(reservation)
+        return "lost"
+
+    for keys in {tuple(sorted(c)) for c in changes}:
+        # ORM bulk UPDATE by primary key, one executemany per shape of change
+        db.session.execute(update(CampaignRecipient), [c for c in changes if tuple(sorted(c)) == keys])
+    if requeued:
+        governor.record_requeued(requeued)
+    if successes:
+        db.session.add_all(build_logs(campaign.client_id, successes, campaign.template_name, None, now))
+        publish_sent(campaign.client_id, successes, campaign.template_name)
+    settle(reservation, campaign.client_id, len(successes))  # charges what was sent, refunds the rest
+
+    db.session.commit()
+    db.session.refresh(campaign)
+    return "cancelled" if campaign.status == "cancelled" else "sent"
+
+
+def process_campaign(campaign, worker_id):
+    """Sends chunks of a leased campaign for up to CAMPAIGN_SLICE_SECONDS, then hands it back."""
+    cfg = current_app.config
+
+    if campaign.attempts > cfg["JOB_MAX_ATTEMPTS"]:
+        _fail_remaining(campaign, worker_id, "Stopped after repeated worker failures.")
+        return
+
+    client = db.session.get(Client, campaign.client_id)
+    monthly_cap = client.plan.monthly_cap if client and client.plan else None
+    deadline = time.monotonic() + cfg["CAMPAIGN_SLICE_SECONDS"]
+
+    while time.monotonic() < deadline:
+        outcome = _send_chunk(campaign, worker_id, monthly_cap)
+        if outcome == "lost":
+            current_app.logger.info(f"Campaign {campaign.id} was cancelled or re-leased, leaving it")
+            return
+        if outcome == "cancelled":
+            current_app.logger.info(f"Campaign {campaign.id} was cancelled, stopping after the chunk in flight")
+            _hand_back(campaign, worker_id, running=False)
+            return
+        if outcome == "done":
+            _hand_back(campaign, worker_id, status="completed", finished_at=dt.datetime.utcnow())
+            return
+        if outcome == "capped":
+            _fail_remaining(campaign, worker_id, CAP_EXCEEDED_ERROR)
+            return
+        if outcome == "wait":
+            # Waiting out the tier limit isn't a failed attempt
+            _hand_back(campaign, worker_id, delay=cfg["CAMPAIGN_TIER_RETRY_SECONDS"], attempts=0)
+            return
+
+    _hand_back(campaign, worker_id)
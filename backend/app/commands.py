@@ -0,0 +1,70 @@
+# app/commands.py — maintenance commands, run with `flask --app wsgi <command>`
+
+import click
+from .window import rebuild_recipient_window
+from .usage import rebuild_usage
+from .inbox import rebuild_conversations
+from .migrations import upgrade
+from .metering import release_expired
+from .synthetic import seed_synthetic
+
+
+def register_commands(app):
+    @app.cli.command("db-upgrade")
+    def db_upgrade():
+        """Create missing tables, columns and indexes on an existing database."""
+        summary = upgrade()
+        for kind, names in summary.items():
+            click.echo(f"{kind}: {', '.join(names) if names else 'up to date'}")
+
+    @app.cli.command("rebuild-window")
+    @click.option("--client-id", type=int, default=None, help="only rebuild this client's numbers")
+    def rebuild_window(client_id):
+        """Recompute recipient_windows from message_logs."""
+        rebuild_recipient_window(client_id)
+        click.echo("✅ Rebuilt recipient window" + (f" for client {client_id}" if client_id else ""))
+
+    @app.cli.command("rebuild-usage")
+    @click.option("--client-id", type=int, default=None, help="only rebuild this client's counters")
+    def rebuild_usage_command(client_id):
+        """Recompute usage_hourly and usage_totals from message_logs."""
+        rebuild_usage(client_id)
+        click.echo("✅ Rebuilt usage rollups" + (f" for client {client_id}" if client_id else ""))
+
+    @app.cli.command("rebuild-inbox")
+    @click.option("--client-id", type=int, default=None, help="only rebuild this client's conversations")
+    def rebuild_inbox(client_id):
+        """Recompute the user_sessions conversation summaries from message_logs."""
+        rebuild_conversations(client_id)
+        click.echo("✅ Rebuilt conversation inbox" + (f" for client {client_id}" if client_id else ""))
+
+    @app.cli.command("release-reservations")
+    def release_reservations():
+        """Refund monthly-cap reservations left behind by crashed processes."""
+        click.echo(f"✅ Released {release_expired()} expired usage reservations")
+
+    @app.cli.command("seed-synthetic")
+    @click.option("--rows", type=int, default=1_000_000, show_default=True, help="message_logs rows to generate")
+    @click.option("--clients", type=int, default=50, show_default=True)
+    @click.option("--numbers", type=int, default=200_000, show_default=True, help="distinct contact numbers")
+    @click.option("--days", type=int, default=90, show_default=True, help="days of history, ending today")
+    @click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="last day of history, for byte-identical reruns")
+    @click.option("--seed", type=int, default=7, show_default=True)
+    @click.option("--inbound-share", type=float, default=0.3, show_default=True)
+    @click.option("--event-share", type=float, default=0.25, show_default=True, help="share of logs with a stored webhook event")
+    @click.option("--no-rollups", is_flag=True, help="skip rebuilding the window, usage and inbox rollups")
+    def seed_synthetic_command(rows, clients, numbers, days, end, seed, inbound_share, event_share, no_rollups):
+        """Bulk-generate a production-sized synthetic dataset (deterministic per --seed)."""
+        def progress(done, total):
+            click.echo(f"\r  {done:,}/{total:,} message_logs", nl=False)
+
+        try:
+            summary = seed_synthetic(
+                rows, clients=clients, numbers=numbers, days=days, end=end.date() if end else None, seed=seed,
+                inbound_share=inbound_share, event_share=event_share, progress=progress, rebuild=not no_rollups
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo()
+        for name, value in summary.items():
+            click.echo(f"{name}: {', '.join(value) or 'none' if isinstance(value, list) else f'{value:,}'}")
@@ -20,10 +20,87 @@ class Config:#HOLDS SETTINGS IN ONE PLACE
     JWT_ALG = "HS256" #algorithm that is used for signing 
     API_KEY_LIFETIME_HOURS = int(os.getenv("API_KEY_LIFETIME_HOURS", 720)) #client's API can last only 30 days 
     ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "ADMIN_CHANGE_ME") #protects the 'generate_key route'--> only someone who knows this token can create new API clients 
-    RATELIMIT_DEFAULT = "200/day"  #any user can call ny route upto 200 times a day
+    RATELIMIT_DEFAULT = "200/day"  #any caller without an API key can call any route upto 200 times a day (per IP)
+    LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/minute") #password attempts per IP on /login
+    RATELIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URL", "memory://") #e.g. redis://host:6379 to share the per-IP limits between processes
+    TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0)) #load balancers in front of the app, so per-IP limits see the real client IP
+    RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory" if SQLALCHEMY_DATABASE_URI.startswith("sqlite") else "database") #"database" shares the token buckets between processes, "memory" is per process; on SQLite every take would serialise on the file lock, so memory is the default there
+    RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 20)) #requests an API client can make back to back
+    RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", 5)) #rate the burst allowance refills at
+    RATE_LIMIT_PER_HOUR = float(os.getenv("RATE_LIMIT_PER_HOUR", 3600)) #sustained requests per client per hour, plans/clients can override all three
     WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", "https://graph.facebook.com/v22.0")
     WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
     WHATSAPP_PHONE_ID = os.getenv("WHATSAPP_PHONE_ID")
     WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "my_secure_token")
     WHATSAPP_BUSINESS_ACCOUNT_ID = os.getenv("WHATSAPP_BUSINESS_ACCOUNT_ID")
-
+    WHATSAPP_MPS = float(os.getenv("WHATSAPP_MPS", 80)) #messages/second Meta allows per business phone number
+    WHATSAPP_MPS_BURST = float(os.getenv("WHATSAPP_MPS_BURST", 80)) #sends allowed back to back before pacing kicks in
+    GOVERNOR_BACKOFF = float(os.getenv("GOVERNOR_BACKOFF", 0.5)) #send rate is multiplied by this when Graph throttles us
+    GOVERNOR_RECOVERY = float(os.getenv("GOVERNOR_RECOVERY", 1)) #messages/second regained per second of clean sending
+    GOVERNOR_MIN_MPS = float(os.getenv("GOVERNOR_MIN_MPS", 1)) #the rate never backs off below this
+    GOVERNOR_PAUSE_SECONDS = float(os.getenv("GOVERNOR_PAUSE_SECONDS", 1)) #pause after a throttle when Graph sends no Retry-After
+    GOVERNOR_RETRIES = int(os.getenv("GOVERNOR_RETRIES", 2)) #in-line retries of a throttled send before the recipient is requeued
+    GOVERNOR_MAX_REQUEUES = int(os.getenv("GOVERNOR_MAX_REQUEUES", 3)) #times a queued job puts a throttled recipient back before failing it
+    GOVERNOR_WINDOW_SECONDS = float(os.getenv("GOVERNOR_WINDOW_SECONDS", 10)) #window the achieved messages/second is measured over
+    WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET") #when set, webhook POSTs must carry a valid X-Hub-Signature-256
+    SEND_MAX_WORKERS = int(os.getenv("SEND_MAX_WORKERS", 16)) #max Graph API sends in flight for one multi-recipient request
+    GRAPH_POOL_CONNECTIONS = int(os.getenv("GRAPH_POOL_CONNECTIONS", 4)) #number of host pools kept by the shared Graph client
+    GRAPH_POOL_SIZE = int(os.getenv("GRAPH_POOL_SIZE", 32)) #keep-alive connections per host, should be >= SEND_MAX_WORKERS
+    GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", 3)) #retries on connect errors, 429 and (idempotent) 5xx; message sends leave 429s to the send governor
+    GRAPH_BACKOFF_FACTOR = float(os.getenv("GRAPH_BACKOFF_FACTOR", 0.5)) #exponential backoff base in seconds
+    GRAPH_CONNECT_TIMEOUT = float(os.getenv("GRAPH_CONNECT_TIMEOUT", 3.05))
+    GRAPH_READ_TIMEOUT = float(os.getenv("GRAPH_READ_TIMEOUT", 20))
+    TIER_CACHE_TTL = int(os.getenv("TIER_CACHE_TTL", 3600)) #seconds the messaging tier is served without asking Meta
+    TIER_CACHE_STALE_TTL = int(os.getenv("TIER_CACHE_STALE_TTL", 86400)) #how long a stale tier is served while it refreshes in the background
+    TIER_CACHE_SHARED = os.getenv("TIER_CACHE_SHARED", "false").lower() in ("1", "true", "yes") #share the tier across worker processes via the db
+    JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 100)) #recipients sent and committed together by a queue worker
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 120)) #a job whose worker went silent this long is picked up again
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0)) #seconds an idle worker sleeps between queue polls
+    USAGE_RESERVATION_TTL = int(os.getenv("USAGE_RESERVATION_TTL", 900)) #quota reserved by a process that never settled is refunded after this
+    JOB_MAX_STORED_ERRORS = int(os.getenv("JOB_MAX_STORED_ERRORS", 500)) #per-recipient errors kept on a job for status polling
+    MESSAGE_LOG_PAGE_SIZE = int(os.getenv("MESSAGE_LOG_PAGE_SIZE", 100)) #default page size for /messages/log
+    MESSAGE_LOG_MAX_PAGE_SIZE = int(os.getenv("MESSAGE_LOG_MAX_PAGE_SIZE", 1000))
+    MESSAGE_LOG_STREAM_BATCH = int(os.getenv("MESSAGE_LOG_STREAM_BATCH", 1000)) #rows fetched per round trip when streaming logs
+    AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 30)) #seconds a verified client/plan is reused without a db lookup
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000)) #max clients kept in the auth cache (LRU)
+    AUTH_INVALIDATION_POLL = float(os.getenv("AUTH_INVALIDATION_POLL", 1)) #seconds before a revoke/deactivation made in another process is seen
+    TEMPLATE_CACHE_TTL = int(os.getenv("TEMPLATE_CACHE_TTL", 300)) #seconds before the template catalogue is re-synced from Meta
+    TEMPLATE_CACHE_STALE_TTL = int(os.getenv("TEMPLATE_CACHE_STALE_TTL", 3600)) #how long an old catalogue is served while it re-syncs
+    WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 500)) #buffered webhook deliveries parsed and written per transaction
+    WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", 60)) #claimed deliveries of a silent consumer are picked up again
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5)) #after this a delivery stays in webhook_inbox with its error
+    WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 0.5)) #seconds an idle consumer sleeps between polls
+    WEBHOOK_PENDING_RETRY_SECONDS = float(os.getenv("WEBHOOK_PENDING_RETRY_SECONDS", 5)) #how often consumers retry statuses that arrived before their message was logged
+    WEBHOOK_PENDING_MAX_HOURS = int(os.getenv("WEBHOOK_PENDING_MAX_HOURS", 24)) #statuses still unmatched after this are dropped
+    INBOUND_FALLBACK_CLIENT_ID = int(os.getenv("INBOUND_FALLBACK_CLIENT_ID")) if os.getenv("INBOUND_FALLBACK_CLIENT_ID") else None #owner of inbound messages from numbers no client has messaged yet (otherwise they are dropped and counted)
+    ADMIN_STATS_TTL = int(os.getenv("ADMIN_STATS_TTL", 60)) #seconds /admin/analytics is served from its cached snapshot
+    ADMIN_CLIENTS_PAGE_SIZE = int(os.getenv("ADMIN_CLIENTS_PAGE_SIZE", 100)) #default page size for /admin/clients
+    ADMIN_CLIENTS_MAX_PAGE_SIZE = int(os.getenv("ADMIN_CLIENTS_MAX_PAGE_SIZE", 1000))
+    CONVERSATIONS_PAGE_SIZE = int(os.getenv("CONVERSATIONS_PAGE_SIZE", 100)) #default page size for /conversations/inbox
+    CONVERSATIONS_MAX_PAGE_SIZE = int(os.getenv("CONVERSATIONS_MAX_PAGE_SIZE", 5000))
+    CONVERSATION_PAGE_SIZE = int(os.getenv("CONVERSATION_PAGE_SIZE", 50)) #messages per window of /conversation/<n>/messages
+    CONVERSATION_MAX_PAGE_SIZE = int(os.getenv("CONVERSATION_MAX_PAGE_SIZE", 500))
+    LONG_POLL_MAX_WAIT = float(os.getenv("LONG_POLL_MAX_WAIT", 30)) #longest ?wait= a history request may block for
+    LONG_POLL_INTERVAL = float(os.getenv("LONG_POLL_INTERVAL", 1.0)) #seconds between checks while long-polling
+    EVENTS_BROADCASTER = os.getenv("EVENTS_BROADCASTER", "database") #'database' fans out across processes via event_log, 'local' stays in-process
+    EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", 0.5)) #seconds between event_log reads in each web process
+    EVENTS_GAP_WAIT_SECONDS = float(os.getenv("EVENTS_GAP_WAIT_SECONDS", 30)) #how long the tail waits for an event_log id that was skipped (a slower transaction may still commit it)
+    EVENTS_RETENTION_SECONDS = int(os.getenv("EVENTS_RETENTION_SECONDS", 3600)) #how far back a reconnecting stream can resume
+    EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 1000)) #events buffered per open stream before it is closed to resync
+    EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15)) #seconds between keep-alive comments on an idle stream
+    EVENTS_STREAM_MAX_SECONDS = int(os.getenv("EVENTS_STREAM_MAX_SECONDS", 300)) #streams are recycled after this, the browser reconnects
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes") #per-request latency/SQL histograms served on /metrics
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN") #when set, /metrics requires 'Authorization: Bearer <token>'
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0)) #requests slower than this are logged with their SQL statements, 0 = off
+    SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", 10)) #distinct statements listed per slow request
+    CAMPAIGN_UPLOAD_BATCH = int(os.getenv("CAMPAIGN_UPLOAD_BATCH", 1000)) #audience rows validated and inserted per transaction while an upload streams in
+    CAMPAIGN_SLICE_SECONDS = float(os.getenv("CAMPAIGN_SLICE_SECONDS", 30)) #a worker hands a campaign back after this, so queued jobs don't wait behind it
+    CAMPAIGN_TIER_RETRY_SECONDS = int(os.getenv("CAMPAIGN_TIER_RETRY_SECONDS", 600)) #how long a campaign waits once the 24h tier limit is used up
+    CAMPAIGNS_PAGE_SIZE = int(os.getenv("CAMPAIGNS_PAGE_SIZE", 50)) #default page size for /campaigns and /campaigns/<id>/recipients
+    CAMPAIGNS_MAX_PAGE_SIZE = int(os.getenv("CAMPAIGNS_MAX_PAGE_SIZE", 1000))
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "") #per-logger overrides, e.g. "app.utils=WARNING,werkzeug=ERROR"
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json") #"json" (one object per line) or "text" for local development
+    LOG_SAMPLING = os.getenv("LOG_SAMPLING", "send.result=0.01") #share of high-volume events kept, e.g. "send.result=0.1"
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000)) #records buffered for the log writer thread before new ones are dropped
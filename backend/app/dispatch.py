@@ -0,0 +1,153 @@
+# app/dispatch.py — concurrent fan-out for multi-recipient sends
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import requests
+from .models import MessageLog
+from .utils import send_whatsapp_template, send_whatsapp_text
+from .window import inbound_recipients_since
+from .events import publish, MESSAGE_SENT
+from .governor import governor
+
+SESSION_CLOSED_ERROR = "Cannot send freeform text. No inbound message from recipient in the last 24 hours."
+THROTTLED_ERROR = "Throttled by WhatsApp, the recipient has been requeued."
+
+
+def _deliver_one(recipient, send):
+    """
+    Runs a single send and turns its outcome into a result entry shaped like
+    the ones `send_message` has always reported.
+    Returns (ok, entry).
+    """
+    try:
+        res, throttled = governor.send(send, recipient)  # paced to Meta's messages/second for the phone number
+        if throttled:
+            return False, {"recipient": recipient, "status": 429, "response": THROTTLED_ERROR, "throttled": True}
+        res.raise_for_status()
+        body = res.json()
+
+        if "error" in body:
+            raise RuntimeError(body["error"].get("message", "Unknown error"))
+
+        return True, {"recipient": recipient, "status": 200, "response": body}
+
+    except requests.exceptions.HTTPError as he:
+        return False, {
+            "recipient": recipient,
+            "status": he.response.status_code if he.response is not None else 502,
+            "response": he.response.text if he.response is not None else str(he)
+        }
+
+    except RuntimeError as re:
+        return False, {"recipient": recipient, "status": 400, "response": str(re)}
+
+    except Exception:
+        current_app.logger.exception(f"Error sending to {recipient}")
+        return False, {"recipient": recipient, "status": 500, "response": "Internal server error"}
+
+
+def fan_out(recipients, send, max_workers=None):
+    """
+    Calls `send(recipient)` for every recipient with at most `max_workers`
+    requests in flight. `send` must return a `requests.Response`.
+
+    Returns (successes, errors), both in the order of `recipients`.
+    """
+    app = current_app._get_current_object()
+    max_workers = max(1, min(max_workers or app.config["SEND_MAX_WORKERS"], len(recipients) or 1))
+
+    def run(recipient):
+        # Send helpers read current_app.config, so every worker thread needs its own context
+        with app.app_context():
+            return _deliver_one(recipient, send)
+
+    if max_workers == 1:
+        outcomes = [_deliver_one(r, send) for r in recipients]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wa-send") as pool:
+            outcomes = list(pool.map(run, recipients))
+
+    successes = [entry for ok, entry in outcomes if ok]
+    errors = [entry for ok, entry in outcomes if not ok]
+    return successes, errors
+
+
+def split_throttled(errors):
+    """
+    Separates recipients that were still throttled after the governor's
+    retries from real failures. Returns (recipients to requeue, other errors).
+    """
+    throttled = [e["recipient"] for e in errors if e.get("throttled")]
+    return throttled, [e for e in errors if not e.get("throttled")]
+
+
+def build_sender(msg_type, data):
+    """
+    Turns a validated send_message payload into the per-recipient send call.
+    Returns (send, template_name, content) where the last two are what gets logged.
+    """
+    if msg_type == "text":
+        def send(recipient):
+            return send_whatsapp_text(recipient, data["text"])
+
+        return send, "text", data["text"]
+
+    def send(recipient):
+        return send_whatsapp_template(
+            recipient,
+            data["name"],
+            data.get("language", "en_US"),
+            data.get("components", [])
+        )
+
+    return send, data["name"], None
+
+
+def recent_inbound_numbers(client_id, since, recipients):
+    """Which of `recipients` messaged the client after `since`, i.e. have an open 24h session."""
+    return inbound_recipients_since(client_id, since, recipients)
+
+
+def split_by_session(recipients, recent_inbound):
+    """
+    Freeform text is only allowed inside the 24h customer service window.
+    Returns (sendable, errors) where errors use the usual result shape.
+    """
+    sendable, errors = [], []
+    for recipient in recipients:
+        if recipient in recent_inbound:
+            sendable.append(recipient)
+        else:
+            errors.append({"recipient": recipient, "status": 403, "response": SESSION_CLOSED_ERROR})
+    return sendable, errors
+
+
+def sent_wamid(entry):
+    """The message id Graph assigned to a successful send, used to match webhook status updates."""
+    messages = entry.get("response", {}).get("messages") or [{}]
+    return messages[0].get("id")
+
+
+def build_logs(client_id, successes, template_name, content, sent_at):
+    """MessageLog rows for a batch of successful sends, ready for one add_all()."""
+    return [
+        MessageLog(
+            client_id=client_id,
+            recipient_number=s["recipient"],
+            template_name=template_name,
+            sent_at=sent_at,
+            status="sent",
+            error_message=None,
+            direction="outbound",
+            content=content,
+            wamid=sent_wamid(s)
+        ) for s in successes
+    ]
+
+
+def publish_sent(client_id, successes, template_name):
+    """One live `message.sent` event per batch (delivered after the logs commit)."""
+    publish(client_id, MESSAGE_SENT, {
+        "template_name": template_name,
+        "messages": [{"recipient": s["recipient"], "wamid": sent_wamid(s)} for s in successes]
+    })
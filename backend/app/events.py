@@ -0,0 +1,228 @@
+# app/events.py — per-client live events behind GET /events/stream
+#
+# Code that changes something a dashboard shows calls publish(client_id, type, data).
+# Events are held on the SQLAlchemy session and handed to the broadcaster
+# only after the transaction commits, so nobody sees an event for a row that
+# was rolled back. The broadcaster gets them to every process that has open
+# streams; each process's EventHub then fans them out to its subscribers.
+#
+# Broadcasters (EVENTS_BROADCASTER):
+#   local    — same process only (single dev server)
+#   database — rows in event_log, tailed by one thread per web process. Works
+#              across gunicorn workers and with publishers in worker.py, and
+#              stands in for Redis/Postgres LISTEN until one is needed.
+
+import datetime as dt
+import itertools
+import queue
+import threading
+import time
+from sqlalchemy import event, select, func, or_
+from sqlalchemy.orm import Session
+from .extensions import db
+from .models import EventLog
+
+MESSAGE_SENT = "message.sent"
+MESSAGE_INBOUND = "message.inbound"
+TEMPLATE_STATUS = "template.status"
+
+MAX_GAPS = 1000  # skipped event_log ids the tail keeps re-reading
+
+
+def status_event(status):
+    """message.delivered / message.read / message.failed"""
+    return f"message.{status}"
+
+
+class Subscription:
+    def __init__(self, client_id, maxsize):
+        self.client_id = client_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False  # the stream ends and the browser resumes from Last-Event-ID
+
+    def push(self, evt):
+        try:
+            self.queue.put_nowait(evt)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+# ----------- BROADCASTERS -----------
+class LocalBroadcaster:
+    """Delivers straight to this process's subscribers."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._ids = itertools.count(1)
+
+    def send(self, events):
+        for evt in events:
+            self.hub.deliver(dict(evt, id=next(self._ids)))
+
+    def listen(self):
+        pass
+
+    def replay(self, client_id, last_id):
+        return []
+
+
+class DatabaseBroadcaster:
+    """Appends to event_log; a background thread per process tails it."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, events):
+        with self.hub.engine.begin() as conn:
+            conn.execute(EventLog.__table__.insert(), [
+                {"client_id": e["client_id"], "type": e["type"], "data": e["data"], "created_at": e["created_at"]}
+                for e in events
+            ])
+
+    def listen(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._tail, name="event-log-tail", daemon=True)
+                self._thread.start()
+
+    def replay(self, client_id, last_id):
+        stmt = (
+            select(EventLog)
+            .where(EventLog.id > last_id, or_(EventLog.client_id == client_id, EventLog.client_id.is_(None)))
+            .order_by(EventLog.id)
+            .limit(self.hub.config["EVENTS_QUEUE_SIZE"])
+        )
+        with self.hub.engine.connect() as conn:
+            return [self._as_event(row) for row in conn.execute(stmt)]
+
+    @staticmethod
+    def _as_event(row):
+        return {"id": row.id, "client_id": row.client_id, "type": row.type, "data": row.data}
+
+    def _tail(self):
+        # Ids are handed out at insert but become visible at commit, so a
+        # slower transaction can commit an id below one already delivered.
+        # Skipped ids are kept as gaps and re-read until they show up, or for
+        # EVENTS_GAP_WAIT_SECONDS (a rolled-back insert never fills its gap).
+        cfg = self.hub.config
+        table = EventLog.__table__
+        with self.hub.engine.connect() as conn:
+            last_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+        gaps = {}  # missing id -> monotonic time to give up on it
+        last_prune = time.monotonic()
+
+        while True:
+            try:
+                now = time.monotonic()
+                for gap in [i for i, until in gaps.items() if until < now]:
+                    del gaps[gap]
+                newer = table.c.id > last_id
+                where = or_(newer, table.c.id.in_(list(gaps))) if gaps else newer
+                with self.hub.engine.connect() as conn:
+                    rows = conn.execute(select(table).where(where).order_by(table.c.id).limit(1000)).all()
+                    if now - last_prune > 60:
+                        cutoff = dt.datetime.utcnow() - dt.timedelta(seconds=cfg["EVENTS_RETENTION_SECONDS"])
+                        conn.execute(table.delete().where(table.c.created_at < cutoff))
+                        conn.commit()
+                        last_prune = now
+                for row in rows:
+                    self.hub.deliver(self._as_event(row))
+                    if row.id in gaps:
+                        del gaps[row.id]
+                        continue
+                    give_up = now + cfg["EVENTS_GAP_WAIT_SECONDS"]
+                    for missing in range(max(last_id + 1, row.id - MAX_GAPS), row.id):
+                        gaps[missing] = give_up
+                    last_id = row.id
+                if len(gaps) > MAX_GAPS:
+                    for gap in sorted(gaps)[:len(gaps) - MAX_GAPS]:
+                        del gaps[gap]
+                if len(rows) == 1000:
+                    continue
+            except Exception:
+                self.hub.logger.exception("Event log tail failed, retrying")
+            time.sleep(cfg["EVENTS_POLL_INTERVAL"])
+
+
+BROADCASTERS = {"local": LocalBroadcaster, "database": DatabaseBroadcaster}
+
+
+# ----------- HUB -----------
+class EventHub:
+    """In-process pub/sub: client id -> open stream subscriptions."""
+
+    def __init__(self):
+        self.broadcaster = None
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+        self.logger = app.logger
+        with app.app_context():
+            self.engine = db.engine
+        self.broadcaster = BROADCASTERS[app.config["EVENTS_BROADCASTER"]](self)
+
+    def subscribe(self, client_id):
+        self.broadcaster.listen()
+        sub = Subscription(client_id, self.config["EVENTS_QUEUE_SIZE"])
+        with self._lock:
+            self._subscribers.setdefault(client_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.client_id, set())
+            subs.discard(sub)
+            if not subs:
+                self._subscribers.pop(sub.client_id, None)
+
+    def deliver(self, evt):
+        with self._lock:
+            if evt["client_id"] is None:
+                targets = [s for subs in self._subscribers.values() for s in subs]
+            else:
+                targets = list(self._subscribers.get(evt["client_id"], ()))
+        for sub in targets:
+            sub.push(evt)
+
+    def replay(self, client_id, last_id):
+        return self.broadcaster.replay(client_id, last_id)
+
+
+hub = EventHub()
+
+
+def publish(client_id, kind, data):
+    """Queues an event for `client_id` (None = all clients), sent once the current transaction commits."""
+    db.session.info.setdefault("pending_events", []).append({
+        "client_id": client_id,
+        "type": kind,
+        "data": data,
+        "created_at": dt.datetime.utcnow()
+    })
+
+
+@event.listens_for(Session, "after_commit")
+def _send_pending(session):
+    events = session.info.pop("pending_events", None)
+    if not events or hub.broadcaster is None:
+        return
+    try:
+        hub.broadcaster.send(events)
+    except Exception:
+        # Live updates are best effort; the data itself is already committed
+        hub.logger.exception(f"Could not broadcast {len(events)} events")
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop("pending_events", None)
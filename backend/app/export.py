@@ -0,0 +1,153 @@
+# app/export.py — streaming bulk export of message logs (CSV, gzip NDJSON, Parquet)
+
+import csv
+import datetime as dt
+import io
+import json
+import zlib
+from sqlalchemy import select
+from .extensions import db
+from .models import MessageLog
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+COLUMNS = (
+    "id", "recipient_number", "direction", "template_name", "content",
+    "status", "sent_at", "delivery_time", "error_message"
+)
+
+FORMATS = {
+    # format: (mimetype, file extension)
+    "csv": ("text/csv", "csv"),
+    "ndjson.gz": ("application/x-ndjson", "ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    """Unsupported format or bad date range; routes turn it into a 400."""
+
+
+def parse_date(value, end_of_day=False):
+    """Accepts YYYY-MM-DD or a full ISO timestamp. A bare `to` date includes that whole day."""
+    if not value:
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"Invalid date '{value}', use YYYY-MM-DD or ISO 8601")
+    if end_of_day and len(value) == 10:
+        parsed += dt.timedelta(days=1)
+    return parsed
+
+
+def iter_rows(client_id, start=None, end=None, batch_size=5000):
+    """
+    Yields lists of row tuples (in COLUMNS order) oldest first, `batch_size`
+    at a time. Core select + yield_per streams from a server-side cursor, so
+    the full result is never materialized.
+    """
+    cols = [getattr(MessageLog, c) for c in COLUMNS]
+    stmt = select(*cols).where(MessageLog.client_id == client_id)
+    if start:
+        stmt = stmt.where(MessageLog.sent_at >= start)
+    if end:
+        stmt = stmt.where(MessageLog.sent_at < end)
+    stmt = stmt.order_by(MessageLog.sent_at, MessageLog.id).execution_options(yield_per=batch_size)
+
+    result = db.session.execute(stmt)
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, dt.datetime) else value
+
+
+def encode_csv(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for batch in batches:
+        writer.writerows([_iso(v) for v in row] for row in batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def encode_ndjson_gz(batches):
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for batch in batches:
+        text = "".join(json.dumps(dict(zip(COLUMNS, map(_iso, row)))) + "\n" for row in batch)
+        chunk = gz.compress(text.encode())
+        if chunk:
+            yield chunk
+    yield gz.flush()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def encode_parquet(batches):
+    """One Parquet row group per batch, written to the response as soon as it is encoded."""
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("recipient_number", pa.string()),
+        ("direction", pa.string()),
+        ("template_name", pa.string()),
+        ("content", pa.string()),
+        ("status", pa.string()),
+        ("sent_at", pa.timestamp("us")),
+        ("delivery_time", pa.timestamp("us")),
+        ("error_message", pa.string()),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema
+        ))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(fmt, client_id, start=None, end=None, batch_size=5000):
+    """Returns (chunk iterator, mimetype, file extension) for one client's logs."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Invalid 'format', must be one of: {', '.join(FORMATS)}")
+    if fmt == "parquet" and pa is None:
+        raise ExportError("Parquet export requires the 'pyarrow' package")
+
+    encoder = {"csv": encode_csv, "ndjson.gz": encode_ndjson_gz, "parquet": encode_parquet}[fmt]
+    mimetype, ext = FORMATS[fmt]
+    return encoder(iter_rows(client_id, start, end, batch_size)), mimetype, ext
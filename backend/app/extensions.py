@@ -4,9 +4,16 @@ from flask_sqlalchemy import SQLAlchemy #to create a global SQLalchemy object wh
 from flask_limiter import Limiter #blocks people from sending too many requests --> limit how many times API can be used i.e. stop from sending 1000 messsages in one minute 
 from flask_limiter.util import get_remote_address
 from passlib.hash import bcrypt #to store JWT's bycrypt hash in db
+from .graph import GraphClient #pooled keep-alive session for all WhatsApp Graph API calls
 
 
 #creating tools but not running them yet 
 db = SQLAlchemy() #instanitiation of the db 
-limiter = Limiter(key_func=get_remote_address) #block overuse 
+def _authenticated():
+    from .auth import has_valid_api_key #imported here, auth imports this module
+    return has_valid_api_key()
+
+
+limiter = Limiter(key_func=get_remote_address, default_limits_exempt_when=_authenticated) #block overuse by IP; requests with a valid API key get per-client token buckets instead (app/ratelimit.py)
 hash_engine = bcrypt #secure API keys safely 
+graph = GraphClient() #talks to graph.facebook.com, bound to the app in create_app
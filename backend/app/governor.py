@@ -0,0 +1,163 @@
+# app/governor.py — paces outbound sends to the phone number's allowed throughput
+#
+# Every send waits for a token from the phone number's bucket in
+# app/ratelimit.py, refilled at the governor's current rate. The rate starts
+# at WHATSAPP_MPS and adapts (additive increase, multiplicative decrease):
+#   throttled by Graph (HTTP 429, or error codes 4 / 80007 / 130429)
+#       — rate *= GOVERNOR_BACKOFF, and the bucket is drained for the
+#         Retry-After (or GOVERNOR_PAUSE_SECONDS), pausing every process
+#   clean send — the rate climbs back by GOVERNOR_RECOVERY messages/second
+#         per second of sending, up to WHATSAPP_MPS
+# A throttled recipient is retried up to GOVERNOR_RETRIES times in line. If
+# it is still throttled it comes back as a 429 error entry marked
+# "throttled", which send_message and the queue workers requeue instead of
+# reporting as failed.
+#
+# The adaptive rate and the counters behind /admin/throughput are per
+# process; the bucket (and so the pause) is shared through RATE_LIMIT_STORAGE.
+
+import threading
+import time
+from collections import deque
+from .ratelimit import rate_limiter
+
+THROTTLE_CODES = frozenset({4, 80007, 130429})  # app, WABA and per-number throughput limits
+
+
+def throttle_delay(res):
+    """
+    Seconds Graph asked us to back off for when `res` is a throughput error,
+    0.0 when it gave no hint, or None when the response was not throttled.
+    """
+    throttled = res.status_code == 429
+    if not throttled:
+        try:
+            code = (res.json().get("error") or {}).get("code")
+        except ValueError:
+            code = None
+        throttled = code in THROTTLE_CODES
+    if not throttled:
+        return None
+    try:
+        return max(float(res.headers.get("Retry-After", 0)), 0.0)
+    except ValueError:
+        return 0.0
+
+
+class _PhoneState:
+    def __init__(self, rate):
+        self.rate = rate
+        self.last_backoff = 0.0
+        self.last_success = None
+        self.sent = 0
+        self.throttled = 0
+        self.requeued = 0
+        self.window = deque()  # send timestamps within GOVERNOR_WINDOW_SECONDS
+
+
+class SendGovernor:
+    def __init__(self):
+        self._phones = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+        with self._lock:
+            self._phones.clear()
+
+    def _state(self, phone_id):
+        phone_id = phone_id or self.config["WHATSAPP_PHONE_ID"]
+        with self._lock:
+            state = self._phones.get(phone_id)
+            if state is None:
+                state = self._phones[phone_id] = _PhoneState(self.config["WHATSAPP_MPS"])
+            return phone_id, state
+
+    def acquire(self, phone_id=None):
+        """Blocks until the phone number may send one more message at the current rate."""
+        phone_id, state = self._state(phone_id)
+        rate_limiter.acquire_send(phone_id, rate=state.rate)
+
+    def record_sent(self, phone_id=None):
+        """A send that Graph did not throttle; lets the rate climb back towards WHATSAPP_MPS."""
+        cfg = self.config
+        phone_id, state = self._state(phone_id)
+        now = time.time()
+        with self._lock:
+            state.sent += 1
+            state.window.append(now)
+            if state.last_success is not None and state.rate < cfg["WHATSAPP_MPS"]:
+                elapsed = min(now - state.last_success, 1.0)
+                state.rate = min(cfg["WHATSAPP_MPS"], state.rate + cfg["GOVERNOR_RECOVERY"] * elapsed)
+            state.last_success = now
+            self._trim(state, now, cfg["GOVERNOR_WINDOW_SECONDS"])
+
+    def record_throttled(self, delay, phone_id=None):
+        """
+        Graph throttled a send: lowers the rate and pauses the number for
+        `delay` seconds (GOVERNOR_PAUSE_SECONDS when Graph gave no hint).
+        In-flight sends that hit the same limit only back off once.
+        """
+        cfg = self.config
+        phone_id, state = self._state(phone_id)
+        delay = delay or cfg["GOVERNOR_PAUSE_SECONDS"]
+        now = time.time()
+        with self._lock:
+            state.throttled += 1
+            state.last_success = None
+            backoff = now - state.last_backoff >= delay
+            if backoff:
+                state.rate = max(cfg["GOVERNOR_MIN_MPS"], state.rate * cfg["GOVERNOR_BACKOFF"])
+                state.last_backoff = now
+            rate = state.rate
+        if backoff:
+            rate_limiter.pause_send(delay, phone_id, rate=rate)
+
+    def record_requeued(self, count, phone_id=None):
+        _, state = self._state(phone_id)
+        with self._lock:
+            state.requeued += count
+
+    def send(self, send, recipient, phone_id=None):
+        """
+        Calls `send(recipient)` at the governed rate, retrying throttled
+        attempts up to GOVERNOR_RETRIES times.
+        Returns (response, throttled).
+        """
+        for _ in range(self.config["GOVERNOR_RETRIES"] + 1):
+            self.acquire(phone_id)
+            res = send(recipient)
+            delay = throttle_delay(res)
+            if delay is None:
+                self.record_sent(phone_id)
+                return res, False
+            self.record_throttled(delay, phone_id)
+        return res, True
+
+    @staticmethod
+    def _trim(state, now, window):
+        horizon = now - window
+        while state.window and state.window[0] < horizon:
+            state.window.popleft()
+
+    def stats(self):
+        """Achieved messages/second and throttle counters per phone number, for this process."""
+        cfg = self.config
+        window = cfg["GOVERNOR_WINDOW_SECONDS"]
+        now = time.time()
+        out = {}
+        with self._lock:
+            for phone_id, state in self._phones.items():
+                self._trim(state, now, window)
+                out[phone_id] = {
+                    "allowed_mps": cfg["WHATSAPP_MPS"],
+                    "current_mps": round(state.rate, 2),
+                    "achieved_mps": round(len(state.window) / window, 2),
+                    "sent": state.sent,
+                    "throttled": state.throttled,
+                    "requeued": state.requeued
+                }
+        return out
+
+
+governor = SendGovernor()
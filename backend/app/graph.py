@@ -0,0 +1,121 @@
+# app/graph.py — shared, pooled HTTP client for the WhatsApp Graph API
+
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .metrics import graph_route, observe_graph
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _GraphRetry(Retry):
+    """
+    Retries 429/5xx for idempotent calls. A POST (e.g. creating a template) is
+    only retried on 429, where Meta guarantees the request was not processed,
+    so a flaky 5xx can never turn into a duplicate.
+    """
+    retry_throttled_posts = True
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() not in IDEMPOTENT_METHODS and (status_code != 429 or not self.retry_throttled_posts):
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class _SendRetry(_GraphRetry):
+    """
+    For message sends, which go through the send governor (app/governor.py):
+    a 429 comes straight back so the governor can slow the phone number down,
+    pause it and requeue, instead of finding out after hidden retries.
+    """
+    retry_throttled_posts = False
+
+
+class GraphClient:
+    """
+    Keep-alive connection pool in front of graph.facebook.com. Created once per
+    process in `create_app` so every send reuses warm TCP/TLS connections
+    instead of paying a fresh handshake per message.
+    """
+
+    def __init__(self, app=None):
+        self.session = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg = app.config
+        self.base_url = cfg["WHATSAPP_API_URL"].rstrip("/")
+        self.token = cfg["WHATSAPP_TOKEN"]
+        self.timeout = (cfg["GRAPH_CONNECT_TIMEOUT"], cfg["GRAPH_READ_TIMEOUT"])
+        self.config = cfg
+
+        if self.session is not None:
+            self.session.close()
+            self.send_session.close()
+        self.session = self._session(cfg, _GraphRetry)
+        self.send_session = self._session(cfg, _SendRetry)  # message sends, see request(governed=True)
+        app.extensions["graph"] = self
+
+    @staticmethod
+    def _session(cfg, retry_class):
+        retry = retry_class(
+            total=cfg["GRAPH_MAX_RETRIES"],
+            connect=cfg["GRAPH_MAX_RETRIES"],
+            read=0,  # a read timeout may mean Meta already accepted the message
+            status=cfg["GRAPH_MAX_RETRIES"],
+            backoff_factor=cfg["GRAPH_BACKOFF_FACTOR"],
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # method filtering happens in _GraphRetry.is_retry
+            raise_on_status=False,  # hand the last response back to the caller
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(
+            pool_connections=cfg["GRAPH_POOL_CONNECTIONS"],
+            pool_maxsize=cfg["GRAPH_POOL_SIZE"],
+            pool_block=True,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def url(self, path):
+        path = str(path)
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, timeout=None, governed=False, **kwargs):
+        """`governed` calls (message sends) get 429s back unretried; the send governor handles them."""
+        headers = {"Authorization": f"Bearer {self.token}"}
+        headers.update(kwargs.pop("headers", None) or {})
+        session = self.send_session if governed else self.session
+        start, status = time.perf_counter(), "error"
+        try:
+            res = session.request(
+                method,
+                self.url(path),
+                headers=headers,
+                timeout=timeout or self.timeout,
+                **kwargs
+            )
+            status = res.status_code
+            return res
+        finally:
+            # Includes the adapter's own retries, i.e. what the caller waited for
+            observe_graph(method, graph_route(path, self.config), status, time.perf_counter() - start)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
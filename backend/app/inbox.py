@@ -0,0 +1,161 @@
+# app/inbox.py — per-contact conversation summaries behind /conversations/inbox
+#
+# user_sessions holds one row per (client, number) with the latest message,
+# when the contact last wrote to us and how many of their messages are
+# unread. Like recipient_windows, it is upserted from every flush that
+# inserts MessageLog rows, so the inbox is a single index range read on
+# (client_id, last_message_at) instead of a DISTINCT scan plus one request
+# per conversation.
+
+import datetime as dt
+from sqlalchemy import event, case, select, and_, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from .extensions import db
+from .models import MessageLog, UserSession
+from .migrations import backfill
+from .window import later_of
+
+PREVIEW_LENGTH = 500
+SESSION_WINDOW = dt.timedelta(hours=24)
+
+
+def _preview(content, template_name):
+    text = content or template_name or ""
+    return text[:PREVIEW_LENGTH]
+
+
+def record_conversations(connection, rows, count_unread=True):
+    """
+    Folds (client_id, recipient_number, sent_at, direction, content,
+    template_name) dicts into user_sessions in one statement. Inbound
+    messages bump unread_count unless `count_unread` is false.
+    """
+    merged = {}
+    for row in rows:
+        if row.get("client_id") is None:
+            continue
+        key = (row["client_id"], row["recipient_number"])
+        inbound = row["direction"] == "inbound"
+        seen = merged.setdefault(key, {
+            "client_id": row["client_id"],
+            "user_number": row["recipient_number"],
+            "last_message_at": None,
+            "last_message": None,
+            "last_direction": None,
+            "last_inbound_at": None,
+            "unread_count": 0
+        })
+        if seen["last_message_at"] is None or row["sent_at"] >= seen["last_message_at"]:
+            seen["last_message_at"] = row["sent_at"]
+            seen["last_message"] = _preview(row.get("content"), row.get("template_name"))
+            seen["last_direction"] = row["direction"]
+        if inbound:
+            if seen["last_inbound_at"] is None or row["sent_at"] > seen["last_inbound_at"]:
+                seen["last_inbound_at"] = row["sent_at"]
+            if count_unread:
+                seen["unread_count"] += 1
+    if not merged:
+        return
+
+    table = UserSession.__table__
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        newer = table.c.last_message_at.is_(None) | (stmt.excluded.last_message_at >= table.c.last_message_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.client_id, table.c.user_number],
+            set_={
+                "last_message_at": later_of(table.c.last_message_at, stmt.excluded.last_message_at),
+                "last_message": case((newer, stmt.excluded.last_message), else_=table.c.last_message),
+                "last_direction": case((newer, stmt.excluded.last_direction), else_=table.c.last_direction),
+                "last_inbound_at": later_of(table.c.last_inbound_at, stmt.excluded.last_inbound_at),
+                "unread_count": table.c.unread_count + stmt.excluded.unread_count
+            }
+        )
+        connection.execute(stmt, list(merged.values()))
+        return
+
+    # Other databases: plain read-modify-write per conversation
+    for values in merged.values():
+        key = and_(table.c.client_id == values["client_id"], table.c.user_number == values["user_number"])
+        current = connection.execute(select(table.c.last_message_at).where(key)).first()
+        if current is None:
+            connection.execute(table.insert().values(**values))
+            continue
+        update = {
+            "last_inbound_at": later_of(table.c.last_inbound_at, literal(values["last_inbound_at"], table.c.last_inbound_at.type)),
+            "unread_count": table.c.unread_count + values["unread_count"]
+        }
+        if current[0] is None or values["last_message_at"] >= current[0]:
+            update.update({c: values[c] for c in ("last_message_at", "last_message", "last_direction")})
+        connection.execute(table.update().where(key).values(update))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_conversations(session, flush_context):
+    rows = [
+        {
+            "client_id": obj.client_id,
+            "recipient_number": obj.recipient_number,
+            "sent_at": obj.sent_at or dt.datetime.utcnow(),
+            "direction": obj.direction or "outbound",
+            "content": obj.content,
+            "template_name": obj.template_name
+        }
+        for obj in session.new if isinstance(obj, MessageLog)
+    ]
+    if rows:
+        record_conversations(session.connection(), rows)
+
+
+# ----------- READS -----------
+def serialize_conversation(s, now):
+    window_open = s.last_inbound_at is not None and s.last_inbound_at > now - SESSION_WINDOW
+    return {
+        "phone_number": s.user_number,
+        "last_message": s.last_message or "No messages yet",
+        "last_message_time": s.last_message_at.isoformat() if s.last_message_at else None,
+        "last_direction": s.last_direction,
+        "last_inbound_at": s.last_inbound_at.isoformat() if s.last_inbound_at else None,
+        "unread_count": s.unread_count,
+        "can_send_text": window_open,
+        "window_expires_at": (s.last_inbound_at + SESSION_WINDOW).isoformat() if window_open else None
+    }
+
+
+def mark_read(client_id, number):
+    """Clears a conversation's unread counter. Returns False if there is no such conversation."""
+    res = db.session.execute(
+        UserSession.__table__.update()
+        .where(UserSession.client_id == client_id, UserSession.user_number == number)
+        .values(unread_count=0, last_read_at=dt.datetime.utcnow())
+    )
+    db.session.commit()
+    return res.rowcount > 0
+
+
+# ----------- BACKFILL -----------
+@backfill("user_sessions.last_message")
+def rebuild_conversations(client_id=None, batch_size=10000):
+    """
+    Recomputes the conversation summaries from message_logs (all clients, or
+    one), oldest first so the latest message wins. History counts as read.
+    """
+    delete = UserSession.__table__.delete()
+    query = select(
+        MessageLog.client_id, MessageLog.recipient_number, MessageLog.sent_at,
+        MessageLog.direction, MessageLog.content, MessageLog.template_name
+    ).where(MessageLog.client_id.isnot(None), MessageLog.sent_at.isnot(None))
+    if client_id is not None:
+        delete = delete.where(UserSession.client_id == client_id)
+        query = query.where(MessageLog.client_id == client_id)
+
+    db.session.execute(delete)
+    # Read on a separate connection so the upserts can run while the cursor is open
+    with db.engine.connect() as reader:
+        result = reader.execute(query.order_by(MessageLog.sent_at, MessageLog.id).execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            record_conversations(db.session.connection(), [row._asdict() for row in partition], count_unread=False)
+    db.session.commit()
@@ -0,0 +1,249 @@
+# app/jobs.py — database-backed outbound message queue
+#
+# send_message(async=true) stores an OutboundJob row and returns its id.
+# backend/worker.py runs N processes that lease jobs with a conditional UPDATE
+# (works the same on SQLite and Postgres, no broker needed) and send them in
+# chunks. Each chunk's MessageLog rows and the job's cursor are committed in
+# one transaction that only succeeds while the worker still holds the lease,
+# so a crashed or timed-out worker can make a chunk be *sent* twice
+# (at-least-once delivery) but never *logged* twice.
+#
+# When no job is waiting, workers also send campaigns (app/campaigns.py), one
+# CAMPAIGN_SLICE_SECONDS slice at a time.
+#
+# Recipients that Graph still throttles after app/governor.py's retries are
+# appended to the end of the job again (up to GOVERNOR_MAX_REQUEUES times
+# each) instead of being counted as failed.
+
+import datetime as dt
+import time
+from flask import current_app
+from sqlalchemy import update, or_, func
+from .extensions import db
+from .models import OutboundJob, Client
+from .metering import reserve, settle, release, release_expired
+from .dispatch import (
+    fan_out, build_sender, build_logs, publish_sent, recent_inbound_numbers, split_by_session, split_throttled
+)
+from .governor import governor
+from .campaigns import claim_campaign, process_campaign
+
+ACTIVE_STATUSES = ("queued", "running")
+CAP_EXCEEDED_ERROR = "Monthly usage cap exceeded."
+THROTTLED_TOO_OFTEN_ERROR = "Throttled by WhatsApp on every attempt."
+
+
+def enqueue_send(client, msg_type, recipients, data):
+    """Persists a validated send_message request as a queued job."""
+    payload = {k: data[k] for k in ("text", "name", "language", "components") if k in data}
+    job = OutboundJob(
+        client_id=client.id,
+        msg_type=msg_type,
+        payload=payload,
+        recipients=list(dict.fromkeys(recipients)),  # de-duplicated, order kept
+        status="queued",
+        errors=[]
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def job_status(job):
+    total = len(job.recipients or [])
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "type": job.msg_type,
+        "total": total,
+        "processed": job.cursor,
+        "sent": job.sent_count,
+        "failed": job.error_count,
+        "progress": round(job.cursor / total * 100, 2) if total else 100.0,
+        "requeued": sum((job.requeued or {}).values()),
+        "attempts": job.attempts,
+        "errors": job.errors or [],
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+# ----------- LEASING -----------
+def claim_job(worker_id):
+    """
+    Leases the oldest runnable job to `worker_id`. A job is runnable when it
+    is queued, or running under a lease that has expired.
+    Returns the job, or None when the queue is empty.
+    """
+    now = dt.datetime.utcnow()
+    lease_until = now + dt.timedelta(seconds=current_app.config["JOB_LEASE_SECONDS"])
+    runnable = (
+        OutboundJob.status.in_(ACTIVE_STATUSES),
+        or_(OutboundJob.lease_expires_at.is_(None), OutboundJob.lease_expires_at < now)
+    )
+
+    candidates = (
+        db.session.query(OutboundJob.id)
+        .filter(*runnable)
+        .order_by(OutboundJob.id)
+        .limit(10)
+        .all()
+    )
+
+    for (job_id,) in candidates:
+        res = db.session.execute(
+            update(OutboundJob)
+            .where(OutboundJob.id == job_id, *runnable)
+            .values(
+                status="running",
+                leased_by=worker_id,
+                lease_expires_at=lease_until,
+                attempts=OutboundJob.attempts + 1,
+                started_at=func.coalesce(OutboundJob.started_at, now)
+            )
+        )
+        db.session.commit()
+        if res.rowcount == 1:  # someone else may have won the race for this row
+            return db.session.get(OutboundJob, job_id)
+
+    return None
+
+
+def _finish(job, status):
+    job.status = status
+    job.leased_by = None
+    job.lease_expires_at = None
+    job.finished_at = dt.datetime.utcnow()
+    db.session.commit()
+
+
+# ----------- PROCESSING -----------
+def _requeue(job, throttled):
+    """
+    Picks which throttled recipients go to the back of the job again.
+    Returns (recipients to append, updated requeue counts, errors for the rest).
+    """
+    max_requeues = current_app.config["GOVERNOR_MAX_REQUEUES"]
+    counts = dict(job.requeued or {})
+    requeue, errors = [], []
+    for recipient in throttled:
+        if counts.get(recipient, 0) < max_requeues:
+            counts[recipient] = counts.get(recipient, 0) + 1
+            requeue.append(recipient)
+        else:
+            errors.append({"recipient": recipient, "status": 429, "response": THROTTLED_TOO_OFTEN_ERROR})
+    return requeue, counts, errors
+
+
+def process_job(job, worker_id):
+    """Sends the remaining recipients of a leased job, one committed chunk at a time."""
+    cfg = current_app.config
+
+    if job.attempts > cfg["JOB_MAX_ATTEMPTS"]:
+        _finish(job, "failed")
+        return
+
+    send, template_name, content = build_sender(job.msg_type, job.payload)
+    client = db.session.get(Client, job.client_id)
+    monthly_cap = client.plan.monthly_cap if client and client.plan else None
+    chunk_size = cfg["JOB_CHUNK_SIZE"]
+
+    while job.cursor < len(job.recipients):
+        recipients = job.recipients
+        start = job.cursor
+        chunk = recipients[start:start + chunk_size]
+        now = dt.datetime.utcnow()
+
+        reservation = None
+        if job.msg_type == "text":
+            recent_inbound = recent_inbound_numbers(job.client_id, now - dt.timedelta(hours=24), chunk)
+            sendable, errors = split_by_session(chunk, recent_inbound)
+        else:
+            sendable, errors = chunk, []
+            reservation = reserve(job.client_id, len(sendable), monthly_cap)
+            if reservation is None:
+                sendable, errors = [], [{"recipient": r, "status": 403, "response": CAP_EXCEEDED_ERROR} for r in chunk]
+
+        try:
+            successes, send_errors = fan_out(sendable, send)
+        except Exception:
+            release(reservation)
+            raise
+        throttled, send_errors = split_throttled(send_errors)
+        requeue, requeued, throttle_errors = _requeue(job, throttled)
+        errors.extend(send_errors + throttle_errors)
+
+        # Advance the cursor only if we still own the lease and nobody moved it
+        stored_errors = (job.errors or []) + errors
+        requeue_values = {"recipients": recipients + requeue, "requeued": requeued} if requeue else {}
+        res = db.session.execute(
+            update(OutboundJob)
+            .where(
+                OutboundJob.id == job.id,
+                OutboundJob.leased_by == worker_id,
+                OutboundJob.cursor == start
+            )
+            .values(
+                cursor=start + len(chunk),
+                sent_count=OutboundJob.sent_count + len(successes),
+                error_count=OutboundJob.error_count + len(errors),
+                errors=stored_errors[:cfg["JOB_MAX_STORED_ERRORS"]],
+                lease_expires_at=dt.datetime.utcnow() + dt.timedelta(seconds=cfg["JOB_LEASE_SECONDS"]),
+                **requeue_values
+            )
+        )
+        if res.rowcount != 1:
+            db.session.rollback()
+            release(reservation)
+            current_app.logger.warning(f"Lost lease on job {job.id}, leaving it to its new owner")
+            return
+
+        if requeue:
+            governor.record_requeued(len(requeue))
+        if successes:
+            db.session.add_all(build_logs(job.client_id, successes, template_name, content, now))
+            publish_sent(job.client_id, successes, template_name)
+        if reservation is not None:
+            settle(reservation, job.client_id, len(successes))  # charges what was sent, refunds the rest
+
+        db.session.commit()
+        db.session.refresh(job)
+
+    _finish(job, "completed")
+
+
+def run_worker(worker_id, poll_interval=None, once=False, should_stop=lambda: False):
+    """Claims and processes jobs until `should_stop()` is true (or the queue is empty when `once`)."""
+    poll_interval = poll_interval or current_app.config["JOB_POLL_INTERVAL"]
+
+    while not should_stop():
+        job = claim_job(worker_id)
+        if job is None:
+            # No jobs waiting: give a campaign one slice, then look at the queue again
+            campaign = claim_campaign(worker_id)
+            if campaign is not None:
+                try:
+                    process_campaign(campaign, worker_id)
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception(f"Campaign {campaign.id} failed on {worker_id}")
+                finally:
+                    db.session.remove()
+                continue
+
+            release_expired()  # quota held by workers that died mid-chunk
+            db.session.remove()
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            process_job(job, worker_id)
+        except Exception:
+            # Lease runs out and another worker (or this one) retries the job
+            db.session.rollback()
+            current_app.logger.exception(f"Job {job.id} failed on {worker_id}")
+        finally:
+            db.session.remove()
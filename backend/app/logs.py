@@ -0,0 +1,184 @@
+# app/logs.py — structured, non-blocking logging
+#
+# setup_logging() (called from create_app) puts a QueueHandler on the root
+# logger: the request thread only appends the record to a bounded queue, and a
+# QueueListener thread formats it (JSON lines by default) and writes it to
+# stdout. When the queue is full records are dropped and counted instead of
+# blocking the request.
+#
+# LOG_LEVELS sets levels per logger ("app.utils=WARNING,werkzeug=ERROR"), and
+# LOG_SAMPLING keeps only a share of high-volume events
+# ("send.result=0.01"). Use log_event() for those, so a sampled-out event
+# costs a dict lookup and a random() call, and nothing is formatted.
+
+import atexit
+import datetime as dt
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from flask import has_request_context, request, g
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_sample_rates = {}  # event name -> share of events kept
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+def parse_levels(spec):
+    """'app.utils=WARNING, werkzeug=error' -> {'app.utils': 'WARNING', 'werkzeug': 'ERROR'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_sampling(spec):
+    """'send.result=0.01' -> {'send.result': 0.01}; rates are clamped to [0, 1]."""
+    rates = {}
+    for item in (spec or "").split(","):
+        name, sep, rate = item.partition("=")
+        if sep and name.strip():
+            try:
+                rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+            except ValueError:
+                continue
+    return rates
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """
+    Logs `event` with `fields` as structured data, subject to LOG_SAMPLING.
+    The JSON output carries them as {"event": ..., "recipient": ..., ...}.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _sample_rates.get(event, 1.0)
+    if rate < 1.0 and random.random() >= rate:
+        return
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.log(level, event, extra={"event": event, **fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request context and `extra` fields."""
+
+    def format(self, record):
+        out = {
+            "ts": dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(out, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps the request method/path and client id on records, on the thread that logged them."""
+
+    def filter(self, record):
+        try:
+            if has_request_context():
+                record.method = request.method
+                record.path = request.path
+                client = g.get("client")
+                if client is not None:
+                    record.client_id = client.id
+        except Exception:
+            pass  # context is best effort, never a reason to lose the record
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Enqueues records as they are; formatting happens on the listener thread. Drops when full."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() runs the formatter here, on the request thread. Only
+        # the %-args are merged now, so mutating them later can't change the line.
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def dropped_records():
+    """Records dropped because the log queue was full, in this process."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def _restart_in_child():
+    # The listener thread doesn't survive fork() (gunicorn --preload, multiprocessing),
+    # so each child gets a fresh queue and listener writing to the same stream
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _listener = QueueListener(_handler.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_logging(app):
+    global _listener, _handler
+    cfg = app.config
+    _sample_rates.clear()
+    _sample_rates.update(parse_sampling(cfg["LOG_SAMPLING"]))
+
+    logging.getLogger().setLevel(cfg["LOG_LEVEL"].upper())
+    app.logger.setLevel(logging.NOTSET)  # follow the root/LOG_LEVELS configuration
+    for name, level in parse_levels(cfg["LOG_LEVELS"]).items():
+        logging.getLogger(name).setLevel(level)
+
+    with _lock:
+        if _listener is not None:
+            return  # create_app() ran before in this process (commands, benchmarks)
+        output = logging.StreamHandler(sys.stdout)
+        if cfg["LOG_FORMAT"] == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        _handler = NonBlockingQueueHandler(queue.Queue(cfg["LOG_QUEUE_SIZE"]))
+        _handler.addFilter(_ContextFilter())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(lambda: _listener.stop())  # flushes what is still queued
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+    # Flask's own stderr handler would write synchronously (and twice)
+    app.logger.removeHandler(default_handler)
@@ -0,0 +1,118 @@
+# app/metering.py — atomic monthly-cap metering for template sends
+#
+# Quota is taken before sending and settled after:
+#
+#   reservation = reserve(client_id, n, monthly_cap)   # None -> cap exceeded
+#   ... send ...
+#   settle(reservation, sent)                          # in the logs' transaction
+#
+# reserve() is one conditional UPDATE on the client row (reserved_count += n
+# only while usage_count + reserved_count + n stays within the cap) committed
+# on its own, so the row is locked for a single statement rather than for the
+# whole Graph fan-out. settle() moves what was actually sent into
+# usage_count and hands the rest back. Reservations of a crashed process
+# expire after USAGE_RESERVATION_TTL and are refunded by release_expired().
+
+import datetime as dt
+from flask import current_app
+from sqlalchemy import update, select, func, case
+from .extensions import db
+from .models import Client, UsageReservation
+
+
+def has_quota(client_id, monthly_cap, count):
+    """Advisory up-front check (e.g. before queueing a job); reserve() is what enforces the cap."""
+    used = db.session.query(func.coalesce(Client.usage_count, 0) + Client.reserved_count).filter(Client.id == client_id).scalar()
+    return used is not None and used + count <= monthly_cap
+
+
+def remaining_quota(client_id, monthly_cap):
+    """Sends the client can still reserve this period (cap - used - reserved), or None when unlimited."""
+    if monthly_cap is None:
+        return None
+    used = db.session.query(func.coalesce(Client.usage_count, 0) + Client.reserved_count).filter(Client.id == client_id).scalar()
+    return max(monthly_cap - (used or 0), 0)
+
+
+def reserve(client_id, count, monthly_cap):
+    """Takes `count` sends from the client's quota. Returns a reservation id, or None if over the cap."""
+    if count <= 0:
+        return None
+    conditions = [Client.id == client_id]
+    if monthly_cap is not None:
+        conditions.append(func.coalesce(Client.usage_count, 0) + Client.reserved_count + count <= monthly_cap)
+    now = dt.datetime.utcnow()
+    with db.engine.begin() as conn:
+        res = conn.execute(
+            update(Client)
+            .where(*conditions)
+            .values(reserved_count=Client.reserved_count + count)
+        )
+        if res.rowcount != 1:
+            return None
+        return conn.execute(UsageReservation.__table__.insert().values(
+            client_id=client_id,
+            count=count,
+            created_at=now,
+            expires_at=now + dt.timedelta(seconds=current_app.config["USAGE_RESERVATION_TTL"])
+        )).inserted_primary_key[0]
+
+
+def _take(conn_or_session, reservation_id):
+    """Deletes a reservation and returns its (client_id, count), or None if it was already released."""
+    row = conn_or_session.execute(
+        select(UsageReservation.client_id, UsageReservation.count).where(UsageReservation.id == reservation_id)
+    ).first()
+    if row is None:
+        return None
+    res = conn_or_session.execute(UsageReservation.__table__.delete().where(UsageReservation.id == reservation_id))
+    return tuple(row) if res.rowcount == 1 else None  # lost the race to release_expired()
+
+
+def settle(reservation_id, client_id, used):
+    """
+    Charges `used` sends and refunds the rest of the reservation, in the
+    current session transaction (commit it together with the MessageLog rows).
+    """
+    taken = _take(db.session, reservation_id) if reservation_id is not None else None
+    values = {"usage_count": func.coalesce(Client.usage_count, 0) + used}
+    if taken:
+        values["reserved_count"] = Client.reserved_count - taken[1]
+    if used or taken:
+        db.session.execute(update(Client).where(Client.id == client_id).values(values))
+
+
+def release(reservation_id):
+    """Refunds a whole reservation (nothing was sent, or the send was abandoned)."""
+    if reservation_id is None:
+        return
+    with db.engine.begin() as conn:
+        taken = _take(conn, reservation_id)
+        if taken:
+            conn.execute(
+                update(Client).where(Client.id == taken[0]).values(reserved_count=Client.reserved_count - taken[1])
+            )
+
+
+def release_expired():
+    """Refunds reservations whose process died before settling. Returns how many were released."""
+    ids = [r[0] for r in db.session.execute(
+        select(UsageReservation.id).where(UsageReservation.expires_at < dt.datetime.utcnow())
+    )]
+    db.session.commit()
+    for reservation_id in ids:
+        release(reservation_id)
+    return len(ids)
+
+
+def close_period(client_id, billed):
+    """
+    Starts a new billing period after `billed` sends were invoiced. Subtracts
+    instead of resetting to 0 so sends settled in the meantime still count.
+    """
+    remaining = func.coalesce(Client.usage_count, 0) - billed
+    db.session.execute(
+        update(Client)
+        .where(Client.id == client_id)
+        .values(usage_count=case((remaining < 0, 0), else_=remaining))
+    )
@@ -0,0 +1,190 @@
+# app/metrics.py — per-request latency, SQL and Graph call instrumentation
+#
+# RequestMetrics (bound in create_app) times every request and counts the SQL
+# statements it runs through SQLAlchemy cursor events, labelled by URL rule
+# rather than raw path so /conversation/<phone_number>/messages stays one
+# series. GraphClient reports each outbound call through observe_graph().
+# Everything lands in in-process histograms that GET /metrics renders in the
+# Prometheus text format; with several gunicorn workers each process reports
+# its own, so scrape them individually (or sum in Prometheus).
+#
+# With SLOW_REQUEST_MS set, a request slower than that is logged together with
+# its statements grouped by SQL text, so an N+1 shows up as one statement run
+# many times.
+
+import threading
+import time
+from flask import request, current_app
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+_local = threading.local()  # the RequestStats of the request this thread is serving
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values, rendered like prometheus_client's."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, data in series:
+            for bound, count in zip(self.buckets, data):
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, values, ('le', bound))} {count}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, values, ('le', '+Inf'))} {data[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, values)} {data[-2]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, values)} {data[-1]}")
+        return lines
+
+
+def render_registry():
+    """Every histogram of this process in the Prometheus text format, as a list of lines."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return lines
+
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ("method", "endpoint", "status"))
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements run per request.", ("method", "endpoint"), COUNT_BUCKETS)
+request_db_seconds = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", ("method", "endpoint"))
+graph_seconds = Histogram(
+    "graph_request_duration_seconds", "Outbound Graph API call latency.", ("method", "endpoint", "status"))
+
+
+# ----------- GRAPH CALLS -----------
+def graph_route(path, config):
+    """'123456/messages' -> '{phone_id}/messages', so ids don't become label values."""
+    names = {config.get("WHATSAPP_PHONE_ID"): "{phone_id}", config.get("WHATSAPP_BUSINESS_ACCOUNT_ID"): "{waba_id}"}
+    path = str(path).split("?", 1)[0]
+    if "://" in path:
+        path = path.split("://", 1)[1].split("/", 1)[-1]
+    segments = [s for s in path.split("/") if s]
+    if segments and segments[0].startswith("v") and segments[0][1:].replace(".", "").isdigit():
+        segments = segments[1:]  # API version of an absolute paging URL
+    return "/".join(names.get(s) or ("{id}" if s.isdigit() else s) for s in segments)
+
+
+def observe_graph(method, route, status, seconds):
+    graph_seconds.observe(seconds, method, route, str(status))
+
+
+# ----------- REQUESTS AND SQL -----------
+class RequestStats:
+    def __init__(self, track_statements):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = {} if track_statements else None  # SQL text -> [count, seconds]
+        self.status = None
+
+
+class RequestMetrics:
+    def init_app(self, app):
+        self.config = app.config
+        if not app.config["METRICS_ENABLED"]:
+            return
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        with app.app_context():
+            engine = app.extensions["sqlalchemy"].engine  # not imported from .extensions: graph.py imports this module
+        event.listen(engine, "before_cursor_execute", self._before_cursor)
+        event.listen(engine, "after_cursor_execute", self._after_cursor)
+
+    def _before(self):
+        _local.stats = RequestStats(track_statements=self.config["SLOW_REQUEST_MS"] > 0)
+
+    def _after(self, response):
+        stats = getattr(_local, "stats", None)
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    def _teardown(self, exc):
+        stats = getattr(_local, "stats", None)
+        _local.stats = None
+        if stats is None:
+            return
+        seconds = time.perf_counter() - stats.start
+        method = request.method
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        status = stats.status or 500
+
+        request_seconds.observe(seconds, method, endpoint, str(status))
+        request_queries.observe(stats.queries, method, endpoint)
+        request_db_seconds.observe(stats.db_seconds, method, endpoint)
+
+        slow_ms = self.config["SLOW_REQUEST_MS"]
+        if slow_ms and seconds * 1000 >= slow_ms:
+            self._log_slow(method, request.full_path.rstrip("?"), status, seconds, stats)
+
+    def _log_slow(self, method, path, status, seconds, stats):
+        top = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)
+        top = top[:self.config["SLOW_REQUEST_MAX_STATEMENTS"]]
+        lines = [f"  {count}x {total * 1000:.1f} ms  {' '.join(sql.split())[:300]}" for sql, (count, total) in top]
+        current_app.logger.warning(
+            f"Slow request {method} {path} -> {status} in {seconds * 1000:.0f} ms, "
+            f"{stats.queries} SQL statements ({stats.db_seconds * 1000:.0f} ms)" + ("\n" + "\n".join(lines) if lines else "")
+        )
+
+    @staticmethod
+    def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+        if getattr(_local, "stats", None) is not None:
+            # One value, not a stack: statements on a connection don't nest, and one that
+            # raised (so never reached after_cursor_execute) is simply overwritten
+            conn.info["query_start"] = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+        stats = getattr(_local, "stats", None)
+        start = conn.info.pop("query_start", None)
+        if stats is None or start is None:
+            return
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            entry = stats.statements.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,94 @@
+# app/migrations.py — in-place schema upgrades for existing SQLite/Postgres databases
+#
+# db.create_all() only creates missing tables. upgrade() additionally adds
+# columns and indexes that were introduced after a database was first
+# created, so an old whatsapp_api.db (or a production Postgres) catches up
+# with app/models.py on the next start or with `flask --app wsgi db-upgrade`.
+
+from sqlalchemy import inspect, text
+from .extensions import db
+
+# Tables ("table") and columns ("table.column") that need a data backfill the first time they appear
+_BACKFILLS = {}
+
+
+def backfill(name):
+    """Registers a function to run right after table or column `name` is added to an existing database."""
+    def decorator(func):
+        _BACKFILLS[name] = func
+        return func
+    return decorator
+
+
+def _add_column(conn, table, column):
+    preparer = conn.dialect.identifier_preparer
+    col_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {col_type}"
+    # Existing rows get NULL, so a NOT NULL column is only enforced once it has a server default
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = f"'{default}'" if isinstance(default, str) else getattr(default, "text", default)
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def _create_index(engine, index):
+    if engine.dialect.name == "postgresql":
+        # Build big indexes without blocking writes; CONCURRENTLY can't run in a transaction
+        preparer = engine.dialect.identifier_preparer
+        cols = ", ".join(preparer.format_column(c) for c in index.columns)
+        unique = "UNIQUE " if index.unique else ""
+        ddl = (
+            f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {preparer.quote(index.name)} "
+            f"ON {preparer.format_table(index.table)} ({cols})"
+        )
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(ddl))
+    else:
+        index.create(bind=engine, checkfirst=True)
+
+
+def upgrade(engine=None):
+    """
+    Brings the connected database up to date with the models.
+    Returns a summary dict of what was created.
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    fresh_database = not existing_tables
+
+    db.metadata.create_all(bind=engine)
+    summary = {"tables": [], "columns": [], "indexes": []}
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            summary["tables"].append(table.name)
+            continue
+
+        present_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in present_columns]
+        if missing:
+            with engine.begin() as conn:
+                for column in missing:
+                    _add_column(conn, table, column)
+                    summary["columns"].append(f"{table.name}.{column.name}")
+
+        present_indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in present_indexes:
+                _create_index(engine, index)
+                summary["indexes"].append(index.name)
+
+    if not fresh_database:
+        for name in summary["tables"] + summary["columns"]:
+            if name in _BACKFILLS:
+                _BACKFILLS[name]()
+
+    if engine.dialect.name == "sqlite" and summary["indexes"]:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))  # let the planner see the new indexes' selectivity
+
+    return summary
@@ -12,6 +12,7 @@ class Plan(db.Model):
     monthly_cap = db.Column(db.Integer, nullable=True)  # None = unlimited
     price_cents = db.Column(db.Integer, nullable=False)
     description = db.Column(db.Text, nullable=True)
+    rate_limits = db.Column(db.JSON, nullable=True)  # {"burst", "per_second", "per_hour"}, see app/ratelimit.py
 
     def __repr__(self):
         return f"<Plan {self.name} (${self.price_cents / 100:.2f})>"
@@ -27,6 +28,7 @@ class Client(db.Model):
     password = db.Column(db.String(256), nullable=False)
 
     usage_count = db.Column(db.Integer, default=0)
+    reserved_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # in-flight sends, see app/metering.py
     created_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     is_key_revoked = db.Column(db.Boolean, default=False)
@@ -37,6 +39,9 @@ class Client(db.Model):
 
     # NEW: toggle for auto-renewal
     auto_renew = db.Column(db.Boolean, default=True, nullable=False)
+    rate_limits = db.Column(db.JSON, nullable=True)  # per-client override of the plan's rate_limits
+
+    __table_args__ = (db.Index("ix_clients_created_id", "created_at", "id"),)  # /admin/clients keyset paging
 
     def __repr__(self):
         return f"<Client {self.id} {self.username}, Plan: {self.plan.name if self.plan else 'None'}>"
@@ -44,6 +49,10 @@ class Client(db.Model):
 
 # ----------- USER SESSION MODEL -----------
 class UserSession(db.Model):
+    """
+    One row per (client, contact): the conversation inbox. Kept up to date
+    whenever MessageLog rows are written (see app/inbox.py).
+    """
     __tablename__ = "user_sessions"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -51,8 +60,17 @@ class UserSession(db.Model):
     client_id = db.Column(db.Integer, db.ForeignKey("clients.id"))
     last_message_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
 
+    last_message = db.Column(db.Text, nullable=True)  # content (or template name) of the latest message
+    last_direction = db.Column(db.String(10), nullable=True)
+    last_inbound_at = db.Column(db.DateTime, nullable=True)  # opens the 24h customer service window
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_read_at = db.Column(db.DateTime, nullable=True)
+
     client = db.relationship("Client", backref="sessions")
-    __table_args__ = (db.UniqueConstraint('client_id', 'user_number', name='uix_client_user'),)
+    __table_args__ = (
+        db.UniqueConstraint('client_id', 'user_number', name='uix_client_user'),
+        db.Index("ix_user_sessions_client_last", "client_id", "last_message_at", "id"),  # inbox, newest first
+    )
 
     def __repr__(self):
         return f"<Session {self.user_number} for Client {self.client_id}>"
@@ -76,12 +94,188 @@ class MessageLog(db.Model):
     error_message = db.Column(db.Text, nullable=True)
 
     direction = db.Column(db.String(10), nullable=False, default="outbound")  # NEW
+    wamid = db.Column(db.String(100), nullable=True)  # WhatsApp message id from Graph / the webhook
 
+    # Every hot query filters on client_id plus one of status/direction/recipient and sorts by sent_at
+    __table_args__ = (
+        db.Index("ix_message_logs_client_sent", "client_id", "sent_at"),  # /messages/log, dashboard window
+        db.Index("ix_message_logs_client_status_sent", "client_id", "status", "sent_at"),  # ?status=, sent/received totals
+        db.Index("ix_message_logs_client_direction_sent", "client_id", "direction", "sent_at"),  # ?direction=, inbound checks
+        db.Index("ix_message_logs_client_recipient_sent", "client_id", "recipient_number", "sent_at"),  # conversations, can_send_text
+        db.Index("ux_message_logs_wamid", "wamid", unique=True),  # webhook status updates; NULLs don't collide
+    )
 
     def __repr__(self):
         return f"<MessageLog to {self.recipient_number} - {self.status}>"
 
 
+# ----------- RECIPIENT WINDOW MODEL -----------
+class RecipientWindow(db.Model):
+    """
+    Last template send / last inbound message per (client, number), kept up to
+    date whenever MessageLog rows are written (see app/window.py). Replaces the
+    24h DISTINCT scans over message_logs in the tier and session checks.
+    """
+    __tablename__ = "recipient_windows"
+
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    recipient_number = db.Column(db.String(20), primary_key=True)
+    last_template_at = db.Column(db.DateTime, nullable=True)
+    last_inbound_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_recipient_windows_client_template", "client_id", "last_template_at"),)
+
+    def __repr__(self):
+        return f"<RecipientWindow {self.recipient_number} for Client {self.client_id}>"
+
+
+# ----------- USAGE ROLLUP MODELS -----------
+class UsageHourly(db.Model):
+    """
+    Messages written per client, hour, direction and status (the status the
+    log row was written with), kept up to date by app/usage.py. The dashboard
+    reads at most 24 of these instead of grouping message_logs.
+    """
+    __tablename__ = "usage_hourly"
+
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)  # UTC, truncated to the hour
+    direction = db.Column(db.String(10), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UsageHourly {self.client_id} {self.hour} {self.direction}/{self.status}: {self.count}>"
+
+
+class UsageTotal(db.Model):
+    """All-time sent/received counters per client, maintained alongside usage_hourly."""
+    __tablename__ = "usage_totals"
+
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    received = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UsageTotal {self.client_id}: {self.sent} sent, {self.received} received>"
+
+
+# ----------- USAGE RESERVATION MODEL -----------
+class UsageReservation(db.Model):
+    """Quota held by a send that is in flight; settled or refunded by app/metering.py."""
+    __tablename__ = "usage_reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # refunded by release_expired() after this
+
+    def __repr__(self):
+        return f"<UsageReservation {self.count} for Client {self.client_id}>"
+
+
+# ----------- OUTBOUND JOB MODEL -----------
+class OutboundJob(db.Model):
+    """A queued send_message request, drained by backend/worker.py."""
+    __tablename__ = "outbound_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
+    client = db.relationship("Client", backref=db.backref("outbound_jobs", cascade="all, delete-orphan"))  # deleted with the client
+
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    msg_type = db.Column(db.String(10), nullable=False)  # text or template
+    payload = db.Column(db.JSON, nullable=False)  # text / name / language / components
+    recipients = db.Column(db.JSON, nullable=False)
+
+    cursor = db.Column(db.Integer, nullable=False, default=0)  # recipients already sent and logged
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON, nullable=True)
+    requeued = db.Column(db.JSON, nullable=True)  # recipient -> times appended again after Graph throttled it
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    leased_by = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_outbound_jobs_status_id", "status", "id"),)
+
+    def __repr__(self):
+        return f"<OutboundJob {self.id} for Client {self.client_id} - {self.status}>"
+
+
+# ----------- CAMPAIGN MODELS -----------
+class Campaign(db.Model):
+    """A personalised template broadcast, see app/campaigns.py."""
+    __tablename__ = "campaigns"
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
+    client = db.relationship("Client", backref=db.backref("campaigns", cascade="all, delete-orphan"))  # deleted with the client
+
+    name = db.Column(db.String(200), nullable=False)
+    template_name = db.Column(db.String(512), nullable=False)
+    language = db.Column(db.String(20), nullable=False)
+    slots = db.Column(db.JSON, nullable=False)  # the template's parameters, compiled by campaigns.compile_template()
+    defaults = db.Column(db.JSON, nullable=True)  # column -> value used when a row leaves it empty
+
+    status = db.Column(db.String(20), nullable=False, default="draft")  # draft, queued, running, completed, cancelled, failed
+    error = db.Column(db.Text, nullable=True)  # why a campaign failed
+    errors = db.Column(db.JSON, nullable=True)  # rejected audience rows (first JOB_MAX_STORED_ERRORS)
+
+    total_count = db.Column(db.Integer, nullable=False, default=0)  # accepted, de-duplicated recipients
+    invalid_count = db.Column(db.Integer, nullable=False, default=0)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    requeued_count = db.Column(db.Integer, nullable=False, default=0)
+    cursor = db.Column(db.Integer, nullable=False, default=0)  # id of the last campaign_recipients row handled this pass
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # claims since the last chunk that committed
+    leased_by = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_campaigns_status_id", "status", "id"),  # worker claims
+        db.Index("ix_campaigns_client_created_id", "client_id", "created_at", "id"),  # GET /campaigns
+    )
+
+    def __repr__(self):
+        return f"<Campaign {self.id} '{self.name}' for Client {self.client_id} - {self.status}>"
+
+
+class CampaignRecipient(db.Model):
+    """One audience row of a campaign with its own template parameters."""
+    __tablename__ = "campaign_recipients"
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id", ondelete="CASCADE"), nullable=False)
+    recipient = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.JSON, nullable=True)  # column -> value, rendered into components at send time
+
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sent, failed, requeued
+    requeues = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    wamid = db.Column(db.String(128), nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ux_campaign_recipients_campaign_recipient", "campaign_id", "recipient", unique=True),  # de-duplicates uploads
+        db.Index("ix_campaign_recipients_campaign_status_id", "campaign_id", "status", "id"),  # next chunk, failure listing
+    )
+
+    def __repr__(self):
+        return f"<CampaignRecipient {self.recipient} of Campaign {self.campaign_id} - {self.status}>"
+
+
 # ----------- BILLING RECORD MODEL -----------
 class BillingRecord(db.Model):
     __tablename__ = "billing_records"
@@ -109,10 +303,125 @@ class WebhookEvent(db.Model):
     payload = db.Column(db.JSON, nullable=True)
     received_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
 
+    # The consumer checks (message_id, event_type) to drop Meta's redeliveries
+    __table_args__ = (db.Index("ix_webhook_events_message_event", "message_id", "event_type"),)
+
     def __repr__(self):
         return f"<WebhookEvent {self.event_type} at {self.received_at}>"
 
 
+class PendingStatus(db.Model):
+    """
+    Status callbacks whose wamid had no MessageLog row yet (the send hadn't
+    committed). The webhook consumer applies them once the row shows up; only
+    then is the WebhookEvent recorded, so redelivery dedupe can't drop them.
+    """
+    __tablename__ = "webhook_pending_statuses"
+
+    id = db.Column(db.Integer, primary_key=True)
+    wamid = db.Column(db.String(100), nullable=False, index=True)
+    status = db.Column(db.String(50), nullable=False)
+    status_at = db.Column(db.DateTime, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    payload = db.Column(db.JSON, nullable=True)
+    received_at = db.Column(db.DateTime, default=dt.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<PendingStatus {self.status} for {self.wamid}>"
+
+
+# ----------- WEBHOOK INBOX MODEL -----------
+class WebhookInbox(db.Model):
+    """Raw webhook deliveries waiting for the batched consumer (app/webhooks.py)."""
+    __tablename__ = "webhook_inbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    body = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    claimed_by = db.Column(db.String(100), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"<WebhookInbox {self.id} received {self.received_at}>"
+
+
+# ----------- MESSAGE TEMPLATE MODEL -----------
+class MessageTemplate(db.Model):
+    """Local copy of the Meta template catalogue, see app/template_catalog.py."""
+    __tablename__ = "message_templates"
+
+    id = db.Column(db.String(64), primary_key=True)  # Meta template id
+    name = db.Column(db.String(512), nullable=False, index=True)
+    language = db.Column(db.String(20), nullable=True)
+    category = db.Column(db.String(50), nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+    data = db.Column(db.JSON, nullable=False)  # the template exactly as Graph returned it
+    synced_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<MessageTemplate {self.name} ({self.language}) - {self.status}>"
+
+
+# ----------- AUTH INVALIDATION MODEL -----------
+class AuthInvalidation(db.Model):
+    """Clients changed by an admin, so every process drops its cached copy (see app/auth.py)."""
+    __tablename__ = "auth_invalidations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, nullable=False)  # no FK: deleted clients are announced too
+    changed_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<AuthInvalidation client {self.client_id} at {self.changed_at}>"
+
+
+# ----------- SHARED CACHE ENTRY MODEL -----------
+class CacheEntry(db.Model):
+    __tablename__ = "cache_entries"
+
+    key = db.Column(db.String(200), primary_key=True)  # "<cache name>:<key>"
+    value = db.Column(db.JSON, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<CacheEntry {self.key} until {self.expires_at}>"
+
+
+# ----------- RATE LIMIT BUCKET MODEL -----------
+class RateLimitBucket(db.Model):
+    """Token bucket state shared by all processes when RATE_LIMIT_STORAGE=database."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = db.Column(db.String(200), primary_key=True)  # "client:<id>:burst", "phone:<phone id>", ...
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time of the last take/refill
+
+    def __repr__(self):
+        return f"<RateLimitBucket {self.key} {self.tokens:.2f}>"
+
+
+# ----------- EVENT LOG MODEL -----------
+class EventLog(db.Model):
+    """
+    Recently published live events (see app/events.py). Lets every web
+    process fan out events published by another process, and lets a
+    reconnecting stream resume from Last-Event-ID.
+    """
+    __tablename__ = "event_log"
+    __table_args__ = {"sqlite_autoincrement": True}  # pruned ids are never handed out again
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, nullable=True)  # None = every client (e.g. template reviews)
+    type = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<EventLog {self.id} {self.type} for Client {self.client_id}>"
+
+
 class SubscriptionRequest(db.Model):
     __tablename__ = "subscription_requests"
 
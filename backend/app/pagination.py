@@ -0,0 +1,72 @@
+# app/pagination.py — keyset (cursor) pagination helpers
+#
+# Pages are addressed by the (timestamp, id) of the last row seen instead of an
+# OFFSET, so fetching page 1,000 costs the same index seek as page 1.
+
+import base64
+import datetime as dt
+from flask import request
+from sqlalchemy import and_, or_
+
+
+class PaginationError(ValueError):
+    """Bad `limit` / `cursor` query parameter; routes turn it into a 400."""
+
+
+def encode_cursor(ts, row_id):
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        return dt.datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise PaginationError("Invalid 'cursor'")
+
+
+def page_limit(default, maximum, param="limit"):
+    """Reads ?limit= from the request, clamped to [1, maximum]."""
+    raw = request.args.get(param)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise PaginationError(f"'{param}' must be an integer")
+    if value < 1:
+        raise PaginationError(f"'{param}' must be positive")
+    return min(value, maximum)
+
+
+def after_cursor(query, ts_col, id_col, cursor, descending=True):
+    """
+    Restricts `query` to rows strictly past `cursor` in (ts, id) order and
+    applies that ordering. Written with OR/AND rather than row values so it
+    behaves the same on SQLite and Postgres.
+    """
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(ts_col < ts, and_(ts_col == ts, id_col < row_id)))
+        else:
+            query = query.filter(or_(ts_col > ts, and_(ts_col == ts, id_col > row_id)))
+
+    if descending:
+        return query.order_by(ts_col.desc(), id_col.desc())
+    return query.order_by(ts_col.asc(), id_col.asc())
+
+
+def fetch_page(query, limit, ts_attr, id_attr="id"):
+    """
+    Runs an already-ordered keyset query and returns (rows, next_cursor).
+    Fetches one extra row to know whether another page exists.
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_attr), getattr(last, id_attr))
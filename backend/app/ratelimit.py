@@ -0,0 +1,216 @@
+# app/ratelimit.py — per-client and per-phone-number token buckets
+#
+# Every authenticated request (require_api_key) takes one token from two
+# buckets keyed on the client, not on the caller's IP:
+#   burst     — `burst` tokens refilling at `per_second`, absorbs short spikes
+#   sustained — `per_hour` tokens refilling evenly over the hour
+# Limits start from RATE_LIMIT_* config and are overridden by the plan's and
+# then the client's `rate_limits` JSON, e.g. {"burst": 50, "per_hour": 20000}.
+# A limit of 0 turns that bucket off.
+#
+# Every Graph send also takes a token from the bucket of the WhatsApp phone
+# number it goes out on (WHATSAPP_MPS per second, Meta's per-number
+# throughput) and waits for one, so we slow down before Graph answers 429.
+# app/governor.py lowers that rate and drains the bucket when Graph throttles
+# us anyway, which pauses every process sending on the number.
+#
+# Storages (RATE_LIMIT_STORAGE):
+#   memory   — this process only (single dev server)
+#   database — rows in rate_limit_buckets, each take is one conditional
+#              UPDATE, so all gunicorn workers and worker.py processes share
+#              the same buckets. The default, except on SQLite, where a
+#              write per request and per send would serialise on the file lock.
+
+import threading
+import time
+from sqlalchemy import update, select, case
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import RateLimitBucket
+
+LIMIT_KEYS = ("burst", "per_second", "per_hour")
+
+
+def rate_limit_exempt(view_func):
+    """Marks a view whose requests don't take client tokens (put it below @require_api_key)."""
+    view_func.rate_limit_exempt = True
+    return view_func
+
+
+def validate_limits(limits):
+    """Checks a plan/client `rate_limits` override. Returns an error message, or None."""
+    if limits is None:
+        return None
+    if not isinstance(limits, dict):
+        return "'rate_limits' must be an object"
+    for key, value in limits.items():
+        if key not in LIMIT_KEYS:
+            return f"Unknown rate limit '{key}', expected one of {', '.join(LIMIT_KEYS)}"
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            return f"Rate limit '{key}' must be a non-negative number"
+    return None
+
+
+# ----------- STORAGES -----------
+class MemoryStorage:
+    """Buckets in a dict; limits are per process."""
+
+    def __init__(self, limiter):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Takes one token. Returns 0 on success, else the seconds until one is available."""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated_at = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated_at)
+
+    def drain(self, key, tokens, now):
+        """Sets the bucket to `tokens` (may be negative, i.e. a debt to wait out)."""
+        with self._lock:
+            self._buckets[key] = (tokens, now)
+
+
+class DatabaseStorage:
+    """Buckets in rate_limit_buckets; refill and take happen in one UPDATE."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def take(self, key, capacity, rate, now):
+        t = RateLimitBucket.__table__
+        refilled = t.c.tokens + (now - t.c.updated_at) * rate
+        level = case((refilled > capacity, capacity), else_=refilled)
+
+        for _ in range(2):
+            with self.limiter.engine.begin() as conn:
+                res = conn.execute(
+                    update(t)
+                    .where(t.c.key == key, level >= 1)
+                    .values(tokens=level - 1, updated_at=now)
+                )
+                if res.rowcount == 1:
+                    return 0
+                row = conn.execute(select(t.c.tokens, t.c.updated_at).where(t.c.key == key)).first()
+            if row is not None:
+                tokens = min(capacity, row.tokens + (now - row.updated_at) * rate)
+                return max((1 - tokens) / rate, 0.001)
+            try:
+                with self.limiter.engine.begin() as conn:
+                    conn.execute(t.insert().values(key=key, tokens=capacity - 1, updated_at=now))
+                return 0
+            except IntegrityError:
+                continue  # another process created the bucket first, take from it instead
+        return 0.001
+
+    def refund(self, key, capacity):
+        t = RateLimitBucket.__table__
+        with self.limiter.engine.begin() as conn:
+            conn.execute(
+                update(t)
+                .where(t.c.key == key)
+                .values(tokens=case((t.c.tokens + 1 > capacity, capacity), else_=t.c.tokens + 1))
+            )
+
+    def drain(self, key, tokens, now):
+        t = RateLimitBucket.__table__
+        with self.limiter.engine.begin() as conn:
+            res = conn.execute(update(t).where(t.c.key == key).values(tokens=tokens, updated_at=now))
+        if res.rowcount == 0:
+            try:
+                with self.limiter.engine.begin() as conn:
+                    conn.execute(t.insert().values(key=key, tokens=tokens, updated_at=now))
+            except IntegrityError:
+                self.drain(key, tokens, now)  # another process created the bucket first
+
+
+STORAGES = {"memory": MemoryStorage, "database": DatabaseStorage}
+
+
+# ----------- LIMITER -----------
+class RateLimiter:
+    def __init__(self):
+        self.storage = None
+
+    def init_app(self, app):
+        self.config = app.config
+        with app.app_context():
+            self.engine = db.engine
+        self.storage = STORAGES[app.config["RATE_LIMIT_STORAGE"]](self)
+
+    def client_limits(self, client):
+        """Config defaults, overridden by the plan's and then the client's `rate_limits`."""
+        cfg = self.config
+        limits = {
+            "burst": cfg["RATE_LIMIT_BURST"],
+            "per_second": cfg["RATE_LIMIT_PER_SECOND"],
+            "per_hour": cfg["RATE_LIMIT_PER_HOUR"]
+        }
+        for override in (client.plan.rate_limits if client.plan else None, client.rate_limits):
+            limits.update({k: v for k, v in (override or {}).items() if k in limits and v is not None})
+        return limits
+
+    def _take_all(self, buckets):
+        """
+        Takes a token from every (key, capacity, rate) bucket, or from none of
+        them. Returns 0 on success, else seconds until the caller may retry.
+        """
+        now = time.time()
+        taken = []
+        for key, capacity, rate in buckets:
+            if capacity <= 0 or rate <= 0:
+                continue
+            wait = self.storage.take(key, capacity, rate, now)
+            if wait:
+                for k, c in taken:
+                    self.storage.refund(k, c)
+                return wait
+            taken.append((key, capacity))
+        return 0
+
+    def hit_client(self, client):
+        """One request by `client`. Returns 0 if allowed, else the Retry-After in seconds."""
+        limits = self.client_limits(client)
+        return self._take_all([
+            (f"client:{client.id}:burst", limits["burst"], limits["per_second"]),
+            (f"client:{client.id}:sustained", limits["per_hour"], limits["per_hour"] / 3600)
+        ])
+
+    def _phone_bucket(self, phone_id, rate):
+        cfg = self.config
+        phone_id = phone_id or cfg["WHATSAPP_PHONE_ID"]
+        rate = rate or cfg["WHATSAPP_MPS"]
+        return f"phone:{phone_id}", min(cfg["WHATSAPP_MPS_BURST"], max(rate, 1)), rate
+
+    def acquire_send(self, phone_id=None, rate=None):
+        """
+        Blocks until the phone number may send one more message (Meta's
+        per-number throughput). `rate` overrides WHATSAPP_MPS, e.g. while
+        app/governor.py is backing off.
+        """
+        bucket = self._phone_bucket(phone_id, rate)
+        while True:
+            wait = self._take_all([bucket])
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def pause_send(self, seconds, phone_id=None, rate=None):
+        """Empties the phone number's bucket so no process sends on it for about `seconds`."""
+        key, _, rate = self._phone_bucket(phone_id, rate)
+        self.storage.drain(key, -seconds * rate, time.time())
+
+
+rate_limiter = RateLimiter()
+
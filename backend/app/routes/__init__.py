@@ -8,6 +8,10 @@ from .subscription import sub_bp
 from .dashboard import usage_bp
 from .conversations import conv_bp
 from .profile import prof_bp
+from .webhook import webhook_bp
+from .events import events_bp
+from .metrics import metrics_bp
+from .campaigns import campaign_bp
 
 def register_blueprints(app: Flask):
     app.register_blueprint(admin_bp)
@@ -18,4 +22,8 @@ def register_blueprints(app: Flask):
     app.register_blueprint(usage_bp)
     app.register_blueprint(conv_bp)
     app.register_blueprint(prof_bp)
+    app.register_blueprint(webhook_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(campaign_bp)
 
@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
-from ..extensions import db
-from ..models import Client, Plan, SubscriptionRequest, BillingRecord
+from ..extensions import db, graph
+from ..models import Client, Plan, SubscriptionRequest, BillingRecord, Campaign, CampaignRecipient, RecipientWindow, UsageHourly, UsageTotal, UsageReservation
 from ..config import Config
 import datetime as dt
 import requests
-from app.auth import require_admin_token
+from app.auth import require_admin_token, invalidate_client
+from ..cache import all_cache_stats
+from ..admin_stats import get_stats, invalidate_stats
+from ..metering import close_period
+from ..ratelimit import validate_limits
+from ..governor import governor
+from ..pagination import PaginationError, after_cursor, fetch_page, page_limit
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -37,6 +45,7 @@ def onboard_client():
     )
     db.session.add(client)
     db.session.commit()
+    invalidate_stats()
 
     return jsonify({
         "client_id": client.id,
@@ -53,14 +62,17 @@ def create_plan():
     name, price_cents = data.get("name"), data.get("price_cents")
     monthly_cap = data.get("monthly_cap")
     description = data.get("description", "")
+    rate_limits = data.get("rate_limits")
 
     if not name or price_cents is None:
         return jsonify({"error": "Missing 'name' and 'price_cents'."}), 400
+    if error := validate_limits(rate_limits):
+        return jsonify({"error": error}), 400
 
     if Plan.query.filter_by(name=name).first():
         return jsonify({"error": "Plan with this name already exists."}), 400
 
-    plan = Plan(name=name, monthly_cap=monthly_cap, price_cents=price_cents, description=description)
+    plan = Plan(name=name, monthly_cap=monthly_cap, price_cents=price_cents, description=description, rate_limits=rate_limits)
     db.session.add(plan)
     db.session.commit()
     return jsonify({"message": "Plan created", "plan_id": plan.id}), 201
@@ -70,8 +82,26 @@ def create_plan():
 @admin_bp.get("/clients")
 @require_admin_token
 def list_clients():
-    clients = Client.query.all()
-    return jsonify([{
+    """
+    Newest clients first, one page at a time. The body stays a plain array;
+    the next page's cursor and the total count travel in X-Next-Cursor and
+    X-Total-Count.
+    """
+    try:
+        limit = page_limit(
+            current_app.config["ADMIN_CLIENTS_PAGE_SIZE"],
+            current_app.config["ADMIN_CLIENTS_MAX_PAGE_SIZE"]
+        )
+        query = after_cursor(
+            Client.query.options(joinedload(Client.plan)),
+            Client.created_at, Client.id,
+            request.args.get("cursor")
+        )
+        clients, next_cursor = fetch_page(query, limit, "created_at")
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    resp = jsonify([{
         "id": c.id,
         "username": c.username,
         "plan": c.plan.name if c.plan else None,
@@ -79,7 +109,11 @@ def list_clients():
         "is_active": c.is_active,
         "created_at": c.created_at.isoformat(),
         "expiry": c.plan_expiry.isoformat() if c.plan_expiry else None
-    } for c in clients]), 200
+    } for c in clients])
+    resp.headers["X-Total-Count"] = str(db.session.query(func.count(Client.id)).scalar())
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp, 200
 
 
 # ----------- UPDATE CLIENT PLAN/STATUS -----------
@@ -98,8 +132,14 @@ def update_client(client_id):
         if not plan:
             return jsonify({"error": "Plan not found"}), 404
         client.plan = plan
+    if "rate_limits" in data:
+        if error := validate_limits(data["rate_limits"]):
+            return jsonify({"error": error}), 400
+        client.rate_limits = data["rate_limits"]  # null falls back to the plan's limits
 
     db.session.commit()
+    invalidate_client(client_id, all_processes=True)
+    invalidate_stats()
     return jsonify({"message": "Client updated"}), 200
 
 
@@ -108,8 +148,20 @@ def update_client(client_id):
 @require_admin_token
 def delete_client(client_id):
     client = Client.query.get_or_404(client_id)
+    # Audiences can be millions of rows: delete them in bulk rather than through the
+    # ORM cascade (and for databases created before the FK was ON DELETE CASCADE)
+    db.session.execute(
+        CampaignRecipient.__table__.delete().where(
+            CampaignRecipient.campaign_id.in_(select(Campaign.id).where(Campaign.client_id == client_id))
+        )
+    )
+    # Derived per-client rows go with the client (MessageLog rows are kept, unassigned)
+    for table in (RecipientWindow, UsageHourly, UsageTotal, UsageReservation):
+        db.session.execute(table.__table__.delete().where(table.client_id == client_id))
     db.session.delete(client)
     db.session.commit()
+    invalidate_client(client_id, all_processes=True)
+    invalidate_stats()
     return jsonify({"message": f"Client {client_id} deleted"}), 200
 
 
@@ -117,14 +169,23 @@ def delete_client(client_id):
 @admin_bp.get("/analytics")
 @require_admin_token
 def system_analytics():
-    total_clients = Client.query.count()
-    active = Client.query.filter_by(is_active=True).count()
-    expired = Client.query.filter(Client.plan_expiry < dt.datetime.utcnow()).count()
-    return jsonify({
-        "total_clients": total_clients,
-        "active_clients": active,
-        "expired_clients": expired
-    }), 200
+    # Client status, messages per plan, revenue and top senders (app/admin_stats.py)
+    return jsonify(get_stats()), 200
+
+
+# ----------- CACHE STATS -----------
+@admin_bp.get("/cache_stats")
+@require_admin_token
+def cache_stats():
+    return jsonify(all_cache_stats()), 200
+
+
+# ----------- SEND THROUGHPUT -----------
+@admin_bp.get("/throughput")
+@require_admin_token
+def throughput():
+    """Achieved vs allowed messages/second per phone number, as seen by this process."""
+    return jsonify(governor.stats()), 200
 
 
 # ----------- WHATSAPP ACCOUNT STATUS INFO -----------
@@ -132,13 +193,10 @@ def system_analytics():
 @require_admin_token
 def whatsapp_status():
     phone_id = current_app.config['WHATSAPP_PHONE_ID']
-    token = current_app.config["WHATSAPP_TOKEN"]
-    url = f"{current_app.config['WHATSAPP_API_URL']}/{phone_id}"
     fields = "display_phone_number,quality_rating,messaging_limit_tier"
-    headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        res = requests.get(url, headers=headers, params={"fields": fields})
+        res = graph.get(phone_id, params={"fields": fields})
         res.raise_for_status()
         return jsonify(res.json()), 200
     except requests.RequestException as e:
@@ -182,7 +240,7 @@ def process_subscription_request(request_id):
             generated_at=now
         )
         db.session.add(billing_record)
-        client.usage_count = 0
+        close_period(client.id, billing_record.message_count or 0)
 
     elif req.request_type == "cancel":
         client.is_active = False
@@ -203,10 +261,12 @@ def process_subscription_request(request_id):
             generated_at=now
         )
         db.session.add(billing_record)
-        client.usage_count = 0
+        close_period(client.id, billing_record.message_count or 0)
 
     req.status = "completed"
     req.completed_at = now
     db.session.commit()
+    invalidate_client(client.id, all_processes=True)
+    invalidate_stats()
 
     return jsonify({"message": "Request processed successfully"}), 200
@@ -0,0 +1,225 @@
+from flask import Blueprint, request, jsonify, g, current_app
+from ..extensions import db
+from ..auth import require_api_key
+from ..models import Campaign, CampaignRecipient
+from ..campaigns import (
+    AudienceError, campaign_status, compile_template, ingest_audience, read_csv, read_ndjson,
+    template_columns, validate_params
+)
+from ..template_catalog import get_catalog
+from ..pagination import PaginationError, after_cursor, fetch_page, page_limit
+from sqlalchemy import update
+import datetime as dt
+import requests
+
+campaign_bp = Blueprint("campaigns", __name__, url_prefix="/campaigns")
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+
+def _own_campaign(campaign_id):
+    return Campaign.query.filter_by(id=campaign_id, client_id=g.client.id).first()
+
+
+def _text_lines(stream):
+    """Decoded lines of the request body, read as they arrive."""
+    first = True
+    for line in stream:
+        yield line.decode("utf-8-sig" if first else "utf-8", errors="replace")
+        first = False
+
+
+@campaign_bp.post("")
+@require_api_key
+def create_campaign():
+    """
+    {"name": ..., "template": ..., "language": "en_US", "defaults": {"header.link": "https://..."}}
+    The response lists the audience `columns` the template needs.
+    """
+    data = request.get_json() or {}
+    name, template_name = data.get("name"), data.get("template")
+    language = data.get("language", "en_US")
+    defaults = data.get("defaults") or {}
+
+    if not name or not template_name:
+        return jsonify({"error": "Missing 'name' or 'template' field"}), 400
+    if not isinstance(defaults, dict):
+        return jsonify({"error": "'defaults' must be an object"}), 400
+
+    try:
+        tpl = get_catalog().find(template_name, language)
+    except requests.RequestException:
+        return jsonify({"error": "Could not load the template catalogue from WhatsApp"}), 502
+    if tpl is None:
+        return jsonify({"error": f"Template '{template_name}' ({language}) not found"}), 404
+    if (tpl.get("status") or "").upper() != "APPROVED":
+        return jsonify({"error": f"Template '{template_name}' is {tpl.get('status')}, not APPROVED"}), 400
+
+    slots = compile_template(tpl)
+    columns = template_columns(slots)
+    unknown = set(defaults) - set(columns)
+    if unknown:
+        return jsonify({"error": f"Unknown 'defaults' columns: {', '.join(sorted(unknown))}", "columns": columns}), 400
+    try:
+        defaults = validate_params(list(defaults), defaults, {})
+    except AudienceError as e:
+        return jsonify({"error": str(e)}), 400
+
+    campaign = Campaign(
+        client_id=g.client.id,
+        name=name,
+        template_name=template_name,
+        language=language,
+        slots=slots,
+        defaults=defaults,
+        status="draft",
+        errors=[]
+    )
+    db.session.add(campaign)
+    db.session.commit()
+    return jsonify(campaign_status(campaign)), 201
+
+
+@campaign_bp.post("/<int:campaign_id>/audience")
+@require_api_key
+def upload_audience(campaign_id):
+    """
+    Streams audience rows into a draft campaign, as CSV (a 'to' column plus
+    one column per template parameter) or JSON lines
+    ({"to": ..., "params": {...}}). May be called repeatedly; numbers the
+    campaign already has are skipped.
+    """
+    campaign = _own_campaign(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+    if campaign.status != "draft":
+        return jsonify({"error": f"Campaign is {campaign.status}, the audience can only change while it is a draft"}), 409
+
+    fmt = request.args.get("format") or request.mimetype
+    if fmt in CSV_TYPES or fmt == "csv":
+        records = read_csv(_text_lines(request.stream))
+    elif fmt in NDJSON_TYPES or fmt == "ndjson":
+        records = read_ndjson(_text_lines(request.stream))
+    else:
+        return jsonify({"error": "Send the audience as text/csv or application/x-ndjson (or set ?format=csv|ndjson)"}), 415
+
+    try:
+        summary = ingest_audience(campaign, records)
+    except AudienceError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(summary), 200
+
+
+@campaign_bp.post("/<int:campaign_id>/start")
+@require_api_key
+def start_campaign(campaign_id):
+    campaign = _own_campaign(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+    if campaign.total_count == 0:
+        return jsonify({"error": "Upload an audience before starting the campaign"}), 400
+
+    client = g.client
+    if client.plan_expiry and client.plan_expiry < dt.datetime.utcnow():
+        return jsonify({"error": "Subscription expired. Renew to continue messaging."}), 403
+
+    res = db.session.execute(
+        update(Campaign).where(Campaign.id == campaign.id, Campaign.status == "draft").values(status="queued")
+    )
+    db.session.commit()
+    if res.rowcount != 1:
+        return jsonify({"error": "Campaign was already started"}), 409
+
+    db.session.refresh(campaign)
+    return jsonify(campaign_status(campaign)), 202
+
+
+@campaign_bp.post("/<int:campaign_id>/cancel")
+@require_api_key
+def cancel_campaign(campaign_id):
+    """
+    Stops sending; recipients not reached yet stay pending. A worker mid-chunk
+    still records that chunk's sends (and charges for them), then stops.
+    """
+    campaign = _own_campaign(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+
+    res = db.session.execute(
+        update(Campaign)
+        .where(Campaign.id == campaign.id, Campaign.status.in_(("draft", "queued", "running")))
+        .values(status="cancelled", finished_at=dt.datetime.utcnow())  # the lease stays so a worker mid-chunk can record it
+    )
+    db.session.commit()
+    if res.rowcount != 1:
+        return jsonify({"error": f"Campaign is already {campaign.status}"}), 409
+
+    db.session.refresh(campaign)
+    return jsonify(campaign_status(campaign)), 200
+
+
+@campaign_bp.get("/<int:campaign_id>")
+@require_api_key
+def get_campaign(campaign_id):
+    campaign = _own_campaign(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+    return jsonify(campaign_status(campaign)), 200
+
+
+@campaign_bp.get("")
+@require_api_key
+def list_campaigns():
+    """Newest first, keyset-paginated like /messages/log."""
+    try:
+        query = Campaign.query.filter_by(client_id=g.client.id)
+        query = after_cursor(query, Campaign.created_at, Campaign.id, request.args.get("cursor"))
+        limit = page_limit(current_app.config["CAMPAIGNS_PAGE_SIZE"], current_app.config["CAMPAIGNS_MAX_PAGE_SIZE"])
+        campaigns, next_cursor = fetch_page(query, limit, "created_at")
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "campaigns": [campaign_status(c) for c in campaigns],
+        "next_cursor": next_cursor
+    }), 200
+
+
+@campaign_bp.get("/<int:campaign_id>/recipients")
+@require_api_key
+def list_recipients(campaign_id):
+    """Audience rows in upload order; ?status=failed for the failures, ?after=<id> for the next page."""
+    campaign = _own_campaign(campaign_id)
+    if not campaign:
+        return jsonify({"error": "Campaign not found"}), 404
+
+    try:
+        limit = page_limit(current_app.config["CAMPAIGNS_PAGE_SIZE"], current_app.config["CAMPAIGNS_MAX_PAGE_SIZE"])
+        after = int(request.args.get("after", 0))
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError:
+        return jsonify({"error": "'after' must be an integer"}), 400
+
+    query = CampaignRecipient.query.filter(
+        CampaignRecipient.campaign_id == campaign.id,
+        CampaignRecipient.id > after
+    )
+    if request.args.get("status"):
+        query = query.filter(CampaignRecipient.status == request.args["status"])
+    rows = query.order_by(CampaignRecipient.id).limit(limit + 1).all()
+
+    return jsonify({
+        "recipients": [{
+            "id": r.id,
+            "recipient": r.recipient,
+            "params": r.params,
+            "status": r.status,
+            "error": r.error,
+            "wamid": r.wamid,
+            "sent_at": r.sent_at.isoformat() if r.sent_at else None
+        } for r in rows[:limit]],
+        "next_after": rows[limit - 1].id if len(rows) > limit else None
+    }), 200
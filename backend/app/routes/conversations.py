@@ -1,7 +1,12 @@
-from flask import Blueprint, jsonify, g, current_app
-from ..models import MessageLog
+from flask import Blueprint, jsonify, g, current_app, request
+from ..extensions import db
+from ..models import MessageLog, UserSession
 from ..auth import require_api_key
+from ..inbox import serialize_conversation, mark_read
+from ..pagination import PaginationError, after_cursor, encode_cursor, fetch_page, page_limit
 import datetime as dt
+import math
+import time
 
 
 conv_bp = Blueprint("conversations", __name__, url_prefix="/")
@@ -9,44 +14,75 @@ conv_bp = Blueprint("conversations", __name__, url_prefix="/")
 @conv_bp.get("/conversations")
 @require_api_key
 def list_conversations():
-    # Return distinct phone numbers you've chatted with
+    # Return distinct phone numbers you've chatted with, most recent conversation first
     nums = (
-      MessageLog.query
+      UserSession.query
       .filter_by(client_id=g.client.id)
-      .distinct(MessageLog.recipient_number)
-      .with_entities(MessageLog.recipient_number)
+      .order_by(UserSession.last_message_at.desc(), UserSession.id.desc())
+      .with_entities(UserSession.user_number)
       .all()
     )
-    # print(nums)
     return jsonify([n[0] for n in nums]), 200
 
 
+@conv_bp.get("/conversations/inbox")
+@require_api_key
+def conversation_inbox():
+    """
+    The whole inbox in one indexed read: last message, last inbound time,
+    unread count and 24h window per contact, newest conversation first.
+    Keyset-paginated with ?limit= and ?cursor=, ?unread=true for unread only.
+    """
+    try:
+        query = UserSession.query.filter_by(client_id=g.client.id)
+        if request.args.get("unread") == "true":
+            query = query.filter(UserSession.unread_count > 0)
+
+        query = after_cursor(query, UserSession.last_message_at, UserSession.id, request.args.get("cursor"))
+        limit = page_limit(
+            current_app.config["CONVERSATIONS_PAGE_SIZE"],
+            current_app.config["CONVERSATIONS_MAX_PAGE_SIZE"]
+        )
+        sessions, next_cursor = fetch_page(query, limit, "last_message_at")
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    now = dt.datetime.utcnow()
+    return jsonify({
+        "conversations": [serialize_conversation(s, now) for s in sessions],
+        "next_cursor": next_cursor
+    }), 200
+
+
+@conv_bp.post("/conversation/<phone_number>/read")
+@require_api_key
+def mark_conversation_read(phone_number):
+    if not mark_read(g.client.id, phone_number):
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify({"message": "Conversation marked as read"}), 200
+
 
 @conv_bp.route("/conversation/<phone_number>/can_send_text", methods=["GET"])
 @require_api_key
 def check_can_send_text(phone_number):
+    """Same 24h customer-service-window rule as the inbox: open while the contact wrote to us in the last 24h."""
     try:
-        last_message = MessageLog.query.filter_by(
-            client_id=g.client.id,
-            recipient_number=phone_number,
-            status="sent"
-        ).order_by(MessageLog.sent_at.desc()).first()
-
-        can_send_text = False
-        last_message_text = "No messages yet"
-        last_message_time = None
-
-        if last_message:
-            time_diff = dt.datetime.utcnow() - last_message.sent_at
-            can_send_text = time_diff.total_seconds() < 86400
-            text = last_message.template_name or ""  # Or use content if you add it
-            last_message_text = (text[:50] + "...") if len(text) > 50 else text
-            last_message_time = last_message.sent_at.isoformat()
+        session = UserSession.query.filter_by(client_id=g.client.id, user_number=phone_number).first()
+        if session is None:
+            return jsonify({
+                "can_send_text": False,
+                "last_message": "No messages yet",
+                "last_message_time": None,
+                "window_expires_at": None
+            }), 200
 
+        convo = serialize_conversation(session, dt.datetime.utcnow())
+        text = convo["last_message"]
         return jsonify({
-            "can_send_text": can_send_text,
-            "last_message": last_message_text,
-            "last_message_time": last_message_time
+            "can_send_text": convo["can_send_text"],
+            "last_message": (text[:50] + "...") if len(text) > 50 else text,
+            "last_message_time": convo["last_message_time"],
+            "window_expires_at": convo["window_expires_at"]
         }), 200
 
     except Exception as e:
@@ -54,26 +90,80 @@ def check_can_send_text(phone_number):
         return jsonify({"error": str(e)}), 500
 
 
+def _serialize_message(msg):
+    return {
+        "id": msg.id,
+        "text": msg.template_name,    # existing
+        "content": msg.content,       # ← new
+        "timestamp": msg.sent_at.isoformat(),
+        "status": msg.status,
+        "direction": msg.direction  # 🔥 Added line
+    }
+
+
+def _history_window(client_id, phone_number, before, after, limit):
+    """
+    One window of a thread via ix_message_logs_client_recipient_sent.
+    Returns (messages oldest first, has_more) where has_more refers to the
+    direction being paged: older rows by default / with `before`, newer with `after`.
+    """
+    query = MessageLog.query.filter_by(client_id=client_id, recipient_number=phone_number)
+    if after:
+        query = after_cursor(query, MessageLog.sent_at, MessageLog.id, after, descending=False)
+        rows = query.limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    # Newest window first, flipped so the chat renders top to bottom
+    query = after_cursor(query, MessageLog.sent_at, MessageLog.id, before)
+    rows = query.limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+
 @conv_bp.route("/conversation/<phone_number>/messages", methods=["GET"])
 @require_api_key
 def get_conversation_messages(phone_number):
+    """
+    Newest `limit` messages of a thread, oldest first. Page back with
+    ?before=<before cursor>, fetch newer with ?after=<after cursor>.
+    With ?after= and ?wait=<seconds> the request long-polls until something
+    newer arrives or the wait runs out, so an open chat only fetches what is new.
+    """
     try:
-        messages = MessageLog.query.filter_by(
-            client_id=g.client.id,
-            recipient_number=phone_number
-        ).order_by(MessageLog.sent_at.asc()).limit(50).all()
-
-        message_data = [{
-            "id": msg.id,
-            "text": msg.template_name,    # existing
-            "content": msg.content,       # ← new
-            "timestamp": msg.sent_at.isoformat(),
-            "status": msg.status,
-            "direction": msg.direction  # 🔥 Added line
-        } for msg in messages]
-
-        return jsonify({"messages": message_data}), 200
+        cfg = current_app.config
+        before, after = request.args.get("before"), request.args.get("after")
+        if before and after:
+            return jsonify({"error": "Use either 'before' or 'after', not both"}), 400
+        limit = page_limit(cfg["CONVERSATION_PAGE_SIZE"], cfg["CONVERSATION_MAX_PAGE_SIZE"])
+        try:
+            wait = float(request.args.get("wait", 0)) if after else 0
+        except ValueError:
+            wait = None
+        if wait is None or not math.isfinite(wait):  # nan would never reach the deadline
+            return jsonify({"error": "'wait' must be a number of seconds"}), 400
+        wait = min(max(wait, 0), cfg["LONG_POLL_MAX_WAIT"])
+
+        deadline = time.monotonic() + wait
+        while True:
+            messages, has_more = _history_window(g.client.id, phone_number, before, after, limit)
+            if messages or time.monotonic() >= deadline:
+                break
+            db.session.rollback()  # hand the connection back to the pool while waiting
+            time.sleep(min(cfg["LONG_POLL_INTERVAL"], max(deadline - time.monotonic(), 0)))
+
+        # `before` pages further back (only while older messages exist), `after` is the tail position
+        older = encode_cursor(messages[0].sent_at, messages[0].id) if messages and has_more and not after else None
+        newer = encode_cursor(messages[-1].sent_at, messages[-1].id) if messages else after
+
+        return jsonify({
+            "messages": [_serialize_message(msg) for msg in messages],
+            "before": older,
+            "after": newer,
+            "has_more": has_more
+        }), 200
+
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         current_app.logger.error(f"Error fetching messages: {e}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
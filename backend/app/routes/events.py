@@ -0,0 +1,60 @@
+from flask import Blueprint, request, jsonify, g, current_app, Response, stream_with_context
+from ..extensions import db, limiter
+from ..auth import require_api_key
+from ..ratelimit import rate_limit_exempt
+from ..events import hub
+import json
+import time
+
+events_bp = Blueprint("events", __name__, url_prefix="/events")
+
+
+def _format(evt):
+    return f"id: {evt['id']}\nevent: {evt['type']}\ndata: {json.dumps(evt['data'], default=str)}\n\n"
+
+
+@events_bp.get("/stream")
+@limiter.exempt  # one long-lived request per open dashboard
+@require_api_key
+@rate_limit_exempt
+def event_stream():
+    """
+    Server-Sent Events for the authenticated client: message.sent,
+    message.delivered / message.read / message.failed, message.inbound and
+    template.status. Send Last-Event-ID (or ?last_event_id=) to resume.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid 'Last-Event-ID'"}), 400
+
+    cfg = current_app.config
+    client_id = g.client.id
+    sub = hub.subscribe(client_id)  # subscribe before replaying so nothing falls in between
+    backlog = hub.replay(client_id, last_id) if last_id is not None else []
+    db.session.remove()  # the stream itself never touches the session
+
+    def generate():
+        # The broadcaster delivers each event once, but possibly out of id order (an
+        # event whose transaction committed late), so only skip what the replay
+        # already sent rather than everything below the highest id seen
+        replayed = {evt["id"] for evt in backlog}
+        deadline = time.monotonic() + cfg["EVENTS_STREAM_MAX_SECONDS"]
+        try:
+            yield "retry: 3000\n\n"
+            for evt in backlog:
+                yield _format(evt)
+            while time.monotonic() < deadline and not sub.overflowed:
+                evt = sub.get(timeout=cfg["EVENTS_HEARTBEAT"])
+                if evt is None:
+                    yield ": keep-alive\n\n"
+                elif evt["id"] not in replayed:
+                    yield _format(evt)
+        finally:
+            hub.unsubscribe(sub)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # don't let nginx buffer the stream
+    })
@@ -1,7 +1,8 @@
-from flask import request, jsonify, Blueprint, g
+from flask import request, jsonify, Blueprint, g, current_app
 from datetime import datetime
 from ..models import Client
 from ..auth import _issue_api_key, require_api_key
+from ..extensions import limiter
 
 
 
@@ -9,9 +10,9 @@ login_bp = Blueprint("login", __name__, url_prefix="/")
 
 
 @login_bp.post("/login")
+@limiter.limit(lambda: current_app.config["LOGIN_RATE_LIMIT"])  # per IP, whatever Authorization header is sent
 def login():
     data = request.get_json() or {}
-    print(data)
     username = data.get("username")
     password = data.get("password")
 
@@ -33,7 +34,7 @@ def login():
 
     token = _issue_api_key(client.id)
 
-    print(client.name)
+    current_app.logger.info(f"Login by client {client.id}")
     return jsonify({
         "token": token,
         "client_id": client.id,
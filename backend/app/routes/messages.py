@@ -1,11 +1,21 @@
-from flask import Blueprint, request, jsonify, g, current_app
+from flask import Blueprint, request, jsonify, g, current_app, Response, stream_with_context
 from ..extensions import db
-from ..auth import require_api_key
-from ..models import MessageLog
-from ..utils import send_whatsapp_template, send_whatsapp_text, get_whatsapp_tier_and_limit
+from ..auth import require_api_key, invalidate_client
+from ..models import MessageLog, OutboundJob
+from ..utils import get_whatsapp_tier_and_limit
+from ..dispatch import (
+    fan_out, build_sender, build_logs, publish_sent, recent_inbound_numbers, split_by_session, split_throttled
+)
+from ..governor import governor
+from ..jobs import enqueue_send, job_status
+from ..metering import has_quota, reserve, settle, release
+from ..window import count_template_recipients_since, template_recipients_since
+from ..pagination import PaginationError, after_cursor, fetch_page, page_limit
+from ..export import ExportError, FORMATS, export_stream, parse_date
 import datetime as dt
+import json
+import click
 from sqlalchemy import func, distinct
-import requests
 
 msg_bp = Blueprint("messages", __name__, url_prefix="/messages")
 
@@ -33,126 +43,87 @@ def send_message():
     if client.plan_expiry and client.plan_expiry < now:
         return jsonify({"error": "Subscription expired. Renew to continue messaging."}), 403
 
-    monthly_cap = client.plan.monthly_cap
-    if msg_type == "template" and monthly_cap and client.usage_count + len(recipients) > monthly_cap:
+    monthly_cap = client.plan.monthly_cap if client.plan else None  # None = unlimited, 0 allows nothing (as in reserve())
+    if msg_type == "template" and monthly_cap is not None and not has_quota(client.id, monthly_cap, len(recipients)):
         return jsonify({"error": "Monthly usage cap exceeded."}), 403
 
     tier_name, limit_24h = get_whatsapp_tier_and_limit()
 
-    sent_in_24h = {
-        r[0] for r in db.session.query(distinct(MessageLog.recipient_number))
-        .filter(
-            MessageLog.client_id == client.id,
-            MessageLog.status == "sent",
-            MessageLog.sent_at >= now - dt.timedelta(hours=24),
-            MessageLog.template_name != "text"
-        ).all()
-    }
+    # Per-number lookups in recipient_windows instead of a DISTINCT scan over a day of logs
+    since = now - dt.timedelta(hours=24)
+    if msg_type == "template":
+        used_24h = count_template_recipients_since(client.id, since)
+        already_sent = template_recipients_since(client.id, since, recipients)
+        new_uniques = set(recipients) - already_sent
+        if used_24h + len(new_uniques) > limit_24h:
+            return jsonify({
+                "error": (
+                    f"24-hour unique recipient limit exceeded. "
+                    f"Tier: {tier_name}, Limit: {limit_24h}, Used: {used_24h}"
+                )
+            }), 403
 
-    new_uniques = [r for r in recipients if r not in sent_in_24h]
-    if msg_type == "template" and len(sent_in_24h | set(new_uniques)) > limit_24h:
+    if data.get("async"):
+        # Hand delivery to the queue workers (backend/worker.py) and return straight away
+        job = enqueue_send(client, msg_type, recipients, data)
         return jsonify({
-            "error": (
-                f"24-hour unique recipient limit exceeded. "
-                f"Tier: {tier_name}, Limit: {limit_24h}, Used: {len(sent_in_24h)}"
-            )
-        }), 403
-
-    # Check inbound messages within 24h
-    recent_inbound = {
-        r[0] for r in db.session.query(distinct(MessageLog.recipient_number))
-        .filter(
-            MessageLog.client_id == client.id,
-            MessageLog.direction == "inbound",
-            MessageLog.sent_at >= now - dt.timedelta(hours=24)
-        ).all()
-    }
+            "job_id": job.id,
+            "status": job.status,
+            "recipients": len(job.recipients)
+        }), 202
 
-    successes = []
-    errors = []
-
-    for recipient in recipients:
-        try:
-            if msg_type == "text":
-                if recipient not in recent_inbound:
-                    errors.append({
-                        "recipient": recipient,
-                        "status": 403,
-                        "response": "Cannot send freeform text. No inbound message from recipient in the last 24 hours."
-                    })
-                    continue
-
-                res = send_whatsapp_text(recipient, data["text"])
-                template_name = "text"
-                content = data["text"]
-            else:
-                res = send_whatsapp_template(
-                    recipient,
-                    data["name"],
-                    data.get("language", "en_US"),
-                    data.get("components", [])
-                )
-                template_name = data["name"]
-                content = None
-
-            res.raise_for_status()
-            body = res.json()
-
-            if "error" in body:
-                raise RuntimeError(body["error"].get("message", "Unknown error"))
-
-            db.session.add(MessageLog(
-                client_id=client.id,
-                recipient_number=recipient,
-                template_name=template_name,
-                sent_at=now,
-                status="sent",
-                error_message=None,
-                direction="outbound",
-                content=content
-            ))
-
-            if msg_type == "template":
-                client.usage_count = (client.usage_count or 0) + 1
-
-            successes.append({
-                "recipient": recipient,
-                "status": 200,
-                "response": body
-            })
-
-        except requests.exceptions.HTTPError as he:
-            errors.append({
-                "recipient": recipient,
-                "status": he.response.status_code if he.response else 502,
-                "response": he.response.text if he.response else str(he)
-            })
-
-        except RuntimeError as re:
-            errors.append({
-                "recipient": recipient,
-                "status": 400,
-                "response": str(re)
-            })
-
-        except Exception as e:
-            errors.append({
-                "recipient": recipient,
-                "status": 500,
-                "response": "Internal server error"
-            })
-            current_app.logger.exception(f"Error sending to {recipient}")
+    send, template_name, content = build_sender(msg_type, data)
+
+    if msg_type == "text":
+        recent_inbound = recent_inbound_numbers(client.id, since, recipients)
+        sendable, errors = split_by_session(recipients, recent_inbound)
+    else:
+        sendable, errors = recipients, []
+
+    # Take the quota before sending so concurrent requests can't overshoot the cap together
+    reservation = None
+    if msg_type == "template" and sendable:
+        reservation = reserve(client.id, len(sendable), monthly_cap)
+        if reservation is None:
+            return jsonify({"error": "Monthly usage cap exceeded."}), 403
+
+    try:
+        successes, send_errors = fan_out(sendable, send)
+    except Exception:
+        release(reservation)
+        raise
+    throttled, send_errors = split_throttled(send_errors)
+    errors.extend(send_errors)
 
     if successes:
-        db.session.add(client)
+        # One batched insert for the whole request instead of a row per round trip
+        db.session.add_all(build_logs(client.id, successes, template_name, content, now))
+        publish_sent(client.id, successes, template_name)
+        if msg_type == "template":
+            settle(reservation, client.id, len(successes))  # charges what was sent, refunds the rest
         db.session.commit()
+        invalidate_client(client.id)
     else:
         db.session.rollback()
+        release(reservation)
+
+    response = {"results": successes, "errors": errors}
+    if throttled:
+        # Graph kept throttling these even after the governor's retries, let a queue worker finish them
+        job = enqueue_send(client, msg_type, throttled, data)
+        governor.record_requeued(len(throttled))
+        response["queued"] = {"job_id": job.id, "recipients": throttled}
+
+    return jsonify(response), 207 if errors or throttled else 200
 
-    return jsonify({
-        "results": successes,
-        "errors": errors
-    }), 207 if errors else 200
+
+@msg_bp.get("/jobs/<int:job_id>")
+@require_api_key
+def get_job_status(job_id):
+    job = OutboundJob.query.filter_by(id=job_id, client_id=g.client.id).first()
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_status(job)), 200
 
 @msg_bp.get("/recipient_numbers")
 @require_api_key
@@ -175,6 +146,40 @@ def get_tier_info():
         "limit": limit
     })
 
+def serialize_log(msg):
+    return {
+        "id": msg.id,
+        "recipient_number": msg.recipient_number,
+        "template_name": msg.template_name,
+        "content": msg.content,
+        "status": msg.status,
+        "sent_at": msg.sent_at.isoformat(),
+        "delivery_time": msg.delivery_time.isoformat() if msg.delivery_time else None,
+        "error_message": msg.error_message,
+        "direction": msg.direction
+    }
+
+
+def _stream_logs(query, fmt, batch_size):
+    """
+    Yields the whole result as NDJSON or as one chunked JSON document.
+    yield_per reads through a server-side cursor in batches, so memory stays
+    flat no matter how much history the client has.
+    """
+    rows = query.yield_per(batch_size)
+    if fmt == "ndjson":
+        for msg in rows:
+            yield json.dumps(serialize_log(msg)) + "\n"
+        return
+
+    yield '{"messages": ['
+    first = True
+    for msg in rows:
+        yield ("" if first else ",") + json.dumps(serialize_log(msg))
+        first = False
+    yield "]}"
+
+
 @msg_bp.get("/log")
 @require_api_key
 def get_message_log():
@@ -183,6 +188,7 @@ def get_message_log():
         status = request.args.get("status")
         direction = request.args.get("direction")
         recipient = request.args.get("recipient")
+        stream = request.args.get("stream")  # ndjson or json: export everything in constant memory
 
         query = MessageLog.query.filter_by(client_id=g.client.id)
 
@@ -193,22 +199,72 @@ def get_message_log():
         if recipient:
             query = query.filter_by(recipient_number=recipient)
 
-        # Get all matching messages, newest first
-        messages = query.order_by(MessageLog.sent_at.desc()).all()
+        # Newest first, keyset-paginated on (sent_at, id)
+        query = after_cursor(query, MessageLog.sent_at, MessageLog.id, request.args.get("cursor"))
 
-        message_data = [{
-            "id": msg.id,
-            "recipient_number": msg.recipient_number,
-            "template_name": msg.template_name,
-            "content": msg.content,
-            "status": msg.status,
-            "sent_at": msg.sent_at.isoformat(),
-            "delivery_time": msg.delivery_time.isoformat() if msg.delivery_time else None,
-            "error_message": msg.error_message,
-            "direction": msg.direction
-        } for msg in messages]
+        if stream:
+            if stream not in ("ndjson", "json"):
+                return jsonify({"error": "Invalid 'stream', must be 'ndjson' or 'json'"}), 400
+            mimetype = "application/x-ndjson" if stream == "ndjson" else "application/json"
+            body = _stream_logs(query, stream, current_app.config["MESSAGE_LOG_STREAM_BATCH"])
+            return Response(stream_with_context(body), mimetype=mimetype), 200
 
-        return jsonify({"messages": message_data}), 200
+        limit = page_limit(current_app.config["MESSAGE_LOG_PAGE_SIZE"], current_app.config["MESSAGE_LOG_MAX_PAGE_SIZE"])
+        messages, next_cursor = fetch_page(query, limit, "sent_at")
+
+        return jsonify({
+            "messages": [serialize_log(msg) for msg in messages],
+            "next_cursor": next_cursor
+        }), 200
+
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@msg_bp.get("/export")
+@require_api_key
+def export_message_log():
+    """
+    Streams the client's logs for a date range as a file download:
+    ?format=csv|ndjson.gz|parquet&from=YYYY-MM-DD&to=YYYY-MM-DD
+    """
+    fmt = request.args.get("format", "csv")
+    try:
+        start = parse_date(request.args.get("from"))
+        end = parse_date(request.args.get("to"), end_of_day=True)
+        body, mimetype, ext = export_stream(
+            fmt, g.client.id, start, end, current_app.config["MESSAGE_LOG_STREAM_BATCH"]
+        )
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"messages_{g.client.id}_{request.args.get('from', 'all')}_{request.args.get('to', 'now')}.{ext}"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@msg_bp.cli.command("export")
+@click.option("--client-id", type=int, required=True)
+@click.option("--format", "fmt", type=click.Choice(list(FORMATS)), default="csv")
+@click.option("--from", "start", default=None, help="YYYY-MM-DD or ISO timestamp (inclusive)")
+@click.option("--to", "end", default=None, help="YYYY-MM-DD (whole day included) or ISO timestamp")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), required=True)
+@click.option("--batch-size", type=int, default=5000)
+def export_command(client_id, fmt, start, end, output, batch_size):
+    """Export one client's message logs: flask --app wsgi messages export --client-id 1 -o logs.csv"""
+    try:
+        body, _, _ = export_stream(fmt, client_id, parse_date(start), parse_date(end, end_of_day=True), batch_size)
+    except ExportError as e:
+        raise click.UsageError(str(e))
+
+    mode = "w" if fmt == "csv" else "wb"
+    with open(output, mode, **({"newline": ""} if mode == "w" else {})) as fh:
+        for chunk in body:
+            fh.write(chunk)
+    click.echo(f"✅ Exported client {client_id} logs to {output}")
@@ -0,0 +1,54 @@
+from flask import Blueprint, request, jsonify, current_app, Response
+from ..extensions import limiter
+from ..metrics import render_registry, format_labels
+from ..cache import all_cache_stats
+from ..governor import governor
+from ..logs import dropped_records
+import hmac
+
+metrics_bp = Blueprint("metrics", __name__)
+
+CACHE_COUNTERS = ("hits", "stale_hits", "misses", "shared_hits", "refreshes", "refresh_errors", "evictions")
+GOVERNOR_GAUGES = ("allowed_mps", "current_mps", "achieved_mps")
+GOVERNOR_COUNTERS = ("sent", "throttled", "requeued")
+
+
+def _family(name, kind, help_text, samples):
+    """HELP/TYPE header plus one line per (labels, value) sample."""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + [f"{name}{labels} {value}" for labels, value in samples]
+
+
+@metrics_bp.get("/metrics")
+@limiter.exempt  # scraped every few seconds
+def metrics():
+    """Prometheus text exposition of this worker process's request, SQL, Graph, cache and send metrics."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    lines = render_registry()
+
+    caches = all_cache_stats()
+    for counter in CACHE_COUNTERS:
+        lines += _family(f"cache_{counter}_total", "counter", f"Cache {counter.replace('_', ' ')}.", [
+            (format_labels(("cache",), (name,)), stats.get(counter, 0)) for name, stats in sorted(caches.items())
+        ])
+    lines += _family("cache_entries", "gauge", "Entries held by the cache.", [
+        (format_labels(("cache",), (name,)), stats["size"]) for name, stats in sorted(caches.items())
+    ])
+
+    phones = governor.stats()
+    for gauge in GOVERNOR_GAUGES:
+        lines += _family(f"send_{gauge}", "gauge", f"Send governor {gauge.replace('_', ' ')} per phone number.", [
+            (format_labels(("phone_id",), (phone_id,)), stats[gauge]) for phone_id, stats in sorted(phones.items())
+        ])
+    for counter in GOVERNOR_COUNTERS:
+        lines += _family(f"send_{counter}_total", "counter", f"Messages {counter} by the send governor.", [
+            (format_labels(("phone_id",), (phone_id,)), stats[counter]) for phone_id, stats in sorted(phones.items())
+        ])
+
+    lines += _family("log_records_dropped_total", "counter", "Log records dropped because the log queue was full.", [
+        ("", dropped_records())
+    ])
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
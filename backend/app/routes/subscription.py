@@ -19,8 +19,8 @@ def my_subscription():
         "price_usd": f"${plan.price_cents / 100:.2f}" if plan else None,
         "usage_count": client.usage_count,
         "remaining": (
-            plan.monthly_cap - client.usage_count
-            if plan and plan.monthly_cap else "Unlimited"
+            max(plan.monthly_cap - (client.usage_count or 0), 0)
+            if plan and plan.monthly_cap is not None else "Unlimited"
         ),
         "plan_expiry": client.plan_expiry.isoformat() if client.plan_expiry else None
     }), 200
@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify, current_app
+from ..extensions import limiter
+from ..webhooks import enqueue_delivery, run_consumer
+import hashlib
+import hmac
+import os
+import socket
+import click
+
+webhook_bp = Blueprint("webhook", __name__, url_prefix="/webhook")
+
+
+def _valid_signature(body):
+    secret = current_app.config["WHATSAPP_APP_SECRET"]
+    if not secret:
+        return True
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, request.headers.get("X-Hub-Signature-256", ""))
+
+
+@webhook_bp.get("")
+@limiter.exempt
+def verify_webhook():
+    # Meta's subscription handshake: echo hub.challenge back if the token matches
+    if (request.args.get("hub.mode") == "subscribe"
+            and request.args.get("hub.verify_token") == current_app.config["WHATSAPP_VERIFY_TOKEN"]):
+        return request.args.get("hub.challenge", ""), 200
+    return jsonify({"error": "Verification failed"}), 403
+
+
+@webhook_bp.post("")
+@limiter.exempt  # Meta bursts callbacks from a few IPs; never throttle them
+def receive_webhook():
+    """Verify, buffer, acknowledge. Parsing happens in the webhook consumer (app/webhooks.py)."""
+    body = request.get_data()
+    if not _valid_signature(body):
+        return jsonify({"error": "Invalid signature"}), 403
+    if not body:
+        return jsonify({"error": "Empty body"}), 400
+
+    enqueue_delivery(body.decode("utf-8", errors="replace"))
+    return "", 200
+
+
+@webhook_bp.cli.command("consume")
+@click.option("--once", is_flag=True, help="exit once the inbox is empty")
+def consume_command(once):
+    """Drain buffered webhook deliveries: flask --app wsgi webhook consume"""
+    run_consumer(f"{socket.gethostname()}:{os.getpid()}:cli", once=once)
@@ -0,0 +1,330 @@
+# app/synthetic.py — deterministic bulk generator for production-sized datasets
+#
+#   flask --app wsgi seed-synthetic --rows 10000000 --clients 200 --seed 7
+#
+# Writes plans, clients, message_logs, webhook_events, billing_records and
+# subscription_requests with the shapes we see in production:
+#   - a few clients send most of the traffic (Zipf over clients)
+#   - every client has a few very hot contacts and a long tail (Zipf over numbers)
+#   - ~30% inbound, outbound statuses mostly delivered/read, a few failed
+#   - diurnal send curve, quieter weekends, traffic growing over the period
+# Rows are produced day by day in time order (ids follow sent_at, as in a real
+# table) from one random.Random(seed), so the same arguments give the same data.
+#
+# Writes bypass the ORM: COPY on Postgres (psycopg2/psycopg), executemany of
+# plain tuples elsewhere. On an empty message_logs the indexes are dropped for
+# the load and rebuilt by migrations.upgrade() afterwards. The recipient window,
+# usage and inbox rollups are rebuilt from the loaded logs at the end.
+
+import csv
+import datetime as dt
+import io
+import random
+import secrets
+from itertools import accumulate
+from sqlalchemy import select, update, text
+from .extensions import db
+from .models import Plan, Client, MessageLog, WebhookEvent, BillingRecord, SubscriptionRequest
+from .migrations import upgrade
+from .window import rebuild_recipient_window
+from .usage import rebuild_usage
+from .inbox import rebuild_conversations
+
+PLANS = (
+    ("Starter", 100, 1000, "Starter: 100 msgs/mo"),
+    ("Pro", 1000, 5000, "Pro: 1,000 msgs/mo"),
+    ("Business", None, 20000, "Business: unlimited"),
+)
+HOUR_WEIGHTS = (2, 1, 1, 1, 1, 2, 4, 7, 10, 12, 13, 13, 12, 12, 12, 11, 11, 12, 13, 13, 11, 8, 5, 3)
+TEMPLATES = (("text", 30), ("order_update", 25), ("payment_due", 12), ("appointment_reminder", 10), ("promo_sale", 15), ("otp_code", 8))
+OUTBOUND_STATUSES = (("sent", 15), ("delivered", 35), ("read", 43), ("failed", 7))
+ERRORS = ("Message undeliverable", "Re-engagement message", "User's number is part of an experiment", "Rate limit hit")
+PHRASES = (
+    "Hi, is my order shipped?", "Thanks!", "What time do you open?", "Please call me back",
+    "Can I change my delivery address?", "ok", "👍", "How much is the premium plan?",
+    "I didn't receive the code", "Your order #{} has been dispatched."
+)
+REQUEST_TYPES = (("renew", 50), ("change_plan", 25), ("cancel", 15), ("delete_account", 10))
+REQUEST_STATUSES = (("completed", 70), ("rejected", 10), ("pending", 20))
+LOG_COLUMNS = (
+    "client_id", "recipient_number", "template_name", "content", "status",
+    "sent_at", "delivery_time", "error_message", "direction", "wamid"
+)
+EVENT_COLUMNS = ("message_id", "event_type", "payload", "received_at")
+
+
+def _cum(weights):
+    return list(accumulate(weights))
+
+
+_CLOCK = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+_MESSAGES = [p.format(n) for n in range(50) for p in PHRASES]  # preformatted, cheaper than .format() per row
+
+
+def _timestamp(day, seconds):
+    """'YYYY-MM-DD HH:MM:SS.ffffff', the text both SQLite (as SQLAlchemy stores it) and COPY accept."""
+    seconds = min(seconds, 86399.999999)
+    whole = int(seconds)
+    return f"{day} {_CLOCK[whole]}.{int((seconds - whole) * 1e6):06d}"
+
+
+class _Writer:
+    """Appends tuples to a table with the fastest path the connection's driver offers."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.preparer = conn.dialect.identifier_preparer
+        cursor = conn.connection.dbapi_connection.cursor()
+        self.copy = conn.dialect.name == "postgresql" and (hasattr(cursor, "copy_expert") or hasattr(cursor, "copy"))
+        cursor.close()
+
+    def insert(self, table, columns, rows):
+        if not rows:
+            return
+        name = self.preparer.format_table(table)
+        cols = ", ".join(self.preparer.quote(c) for c in columns)
+        if self.copy:
+            if not self.conn.in_transaction():
+                self.conn.begin()  # so conn.commit() commits what the raw cursor copied
+            buf = io.StringIO()
+            csv.writer(buf).writerows(rows)
+            sql = f"COPY {name} ({cols}) FROM STDIN WITH (FORMAT csv)"
+            cursor = self.conn.connection.dbapi_connection.cursor()
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                buf.seek(0)
+                cursor.copy_expert(sql, buf)
+            else:  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    copy.write(buf.getvalue())
+            return
+        style = self.conn.dialect.paramstyle
+        marks = ", ".join("?" if style == "qmark" else "%s" if style in ("format", "pyformat") else f":{i + 1}"
+                          for i in range(len(columns)))
+        self.conn.exec_driver_sql(f"INSERT INTO {name} ({cols}) VALUES ({marks})", rows)
+
+
+class Generator:
+    def __init__(self, rows, clients=50, numbers=200_000, days=90, seed=7, inbound_share=0.3,
+                 event_share=0.25, batch_size=50_000, end=None, progress=None):
+        self.rows = rows
+        self.clients = clients
+        self.numbers = numbers
+        self.days = days
+        self.seed = seed
+        self.inbound_share = inbound_share
+        self.event_share = event_share
+        self.batch_size = batch_size
+        self.progress = progress or (lambda done, total: None)
+        self.rng = random.Random(seed)
+        # History ends now unless pinned, so a fixed `end` reproduces the exact same rows on any day
+        now = dt.datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.end = dt.datetime.combine(end, dt.time()) + dt.timedelta(days=1) if end else today + dt.timedelta(days=1)
+        self.start = self.end - dt.timedelta(days=days)
+        self.last_day_seconds = 86400 if end else (now - today).total_seconds()  # today's rows stop at now
+        self.now = self.end - dt.timedelta(days=1) + dt.timedelta(seconds=self.last_day_seconds)  # where history stops; "now" for expiries and billing
+        self.monthly = {}  # (client_id, "YYYY-MM") -> outbound messages, for billing records
+        self.serial = 0  # makes every generated wamid unique
+
+    # ----------- ACCOUNTS -----------
+    def _plans(self):
+        plans = {p.name: p for p in Plan.query.filter(Plan.name.in_([p[0] for p in PLANS]))}
+        for name, cap, price, description in PLANS:
+            if name not in plans:
+                plans[name] = Plan(name=name, monthly_cap=cap, price_cents=price, description=description)
+                db.session.add(plans[name])
+        db.session.flush()
+        return [plans[p[0]] for p in PLANS]
+
+    def _clients(self):
+        prefix = f"syn{self.seed}_"
+        if Client.query.filter(Client.username.like(f"{prefix}%")).first():
+            raise ValueError(f"This database already has synthetic clients for seed {self.seed}; use another --seed")
+
+        rng, plans, now = self.rng, self._plans(), self.now
+        clients = []
+        for i in range(self.clients):
+            plan = rng.choices(plans, weights=(50, 35, 15))[0]
+            clients.append(Client(
+                name=f"Synthetic Client {self.seed}-{i + 1}",
+                username=f"{prefix}{i + 1}",
+                password=secrets.token_urlsafe(24),  # random, so a seeded database has no guessable logins (and rng stays untouched)
+                plan=plan,
+                created_at=self.start - dt.timedelta(days=rng.randint(1, 365)),
+                is_active=rng.random() < 0.95,
+                plan_expiry=now + dt.timedelta(days=rng.randint(-10, 60)),
+                auto_renew=rng.random() < 0.8
+            ))
+        db.session.add_all(clients)
+        db.session.commit()
+        return clients
+
+    # ----------- MESSAGE LOGS -----------
+    def _day_counts(self):
+        """Rows per day: growing over the period, weekends at 70%."""
+        weights = []
+        for d in range(self.days):
+            day = self.start + dt.timedelta(days=d)
+            growth = 0.6 + 0.8 * d / max(self.days - 1, 1)
+            weights.append(growth * (0.7 if day.weekday() >= 5 else 1.0))
+        total = sum(weights)
+        counts = [int(self.rows * w / total) for w in weights]
+        for d in range(self.rows - sum(counts)):
+            counts[-1 - d % self.days] += 1
+        return counts
+
+    def _day(self, day_index, count, client_ids, client_cum, number_cum):
+        """One day of message_logs rows (in time order) and the webhook events they caused."""
+        rng = self.rng
+        day = self.start + dt.timedelta(days=day_index)
+        day_str, month = day.strftime("%Y-%m-%d"), day.strftime("%Y-%m")
+        epoch = int((day - dt.datetime(1970, 1, 1)).total_seconds())
+
+        hours = rng.choices(range(24), cum_weights=_cum(HOUR_WEIGHTS), k=count)
+        seconds = sorted(h * 3600 + rng.random() * 3600 for h in hours)
+        if day_index == self.days - 1 and self.last_day_seconds < 86400:
+            scale = self.last_day_seconds / 86400
+            seconds = [sod * scale for sod in seconds]
+        owners = rng.choices(client_ids, cum_weights=client_cum, k=count)
+        contacts = rng.choices(range(self.numbers), cum_weights=number_cum, k=count)
+        templates = rng.choices([t for t, _ in TEMPLATES], weights=[w for _, w in TEMPLATES], k=count)
+        statuses = rng.choices([s for s, _ in OUTBOUND_STATUSES], weights=[w for _, w in OUTBOUND_STATUSES], k=count)
+
+        rand, n_messages = rng.random, len(_MESSAGES)
+        logs, events, outbound = [], [], {}
+        for i in range(count):
+            client_id, sod = owners[i], seconds[i]
+            number = f"923{(contacts[i] + client_id * 7919) % self.numbers:09d}"  # every client has its own hot contacts
+            self.serial += 1
+            wamid = f"wamid.syn{self.seed}.{self.serial}"
+            sent_at = _timestamp(day_str, sod)
+
+            if rand() < self.inbound_share:
+                logs.append((client_id, number, "inbound_text", _MESSAGES[int(rand() * n_messages)],
+                             "received", sent_at, None, None, "inbound", wamid))
+                event_type = "message"
+                received_at = sent_at
+            else:
+                template, status = templates[i], statuses[i]
+                content = _MESSAGES[int(rand() * n_messages)] if template == "text" else None
+                delivered = _timestamp(day_str, sod + rng.expovariate(1 / 20)) if status in ("delivered", "read") else None
+                error = ERRORS[int(rand() * len(ERRORS))] if status == "failed" else None
+                logs.append((client_id, number, template, content, status, sent_at, delivered, error, "outbound", wamid))
+                if status != "failed":
+                    outbound[client_id] = outbound.get(client_id, 0) + 1
+                event_type = None if status == "sent" else status
+                received_at = delivered or sent_at
+
+            if event_type and rand() < self.event_share:
+                # Every value is a plain token, so the JSON is built without json.dumps
+                payload = f'{{"id": "{wamid}", "recipient_id": "{number}", "status": "{event_type}", "timestamp": "{epoch + int(sod)}"}}'
+                events.append((wamid, event_type, payload, received_at))
+
+        for client_id, n in outbound.items():
+            self.monthly[(client_id, month)] = self.monthly.get((client_id, month), 0) + n
+        return logs, events
+
+    def _logs(self, writer, clients):
+        client_ids = [c.id for c in clients]
+        client_cum = _cum(1 / (i + 1) ** 1.1 for i in range(len(client_ids)))
+        number_cum = _cum(1 / (i + 1) ** 0.9 for i in range(self.numbers))
+        logs_table, events_table = MessageLog.__table__, WebhookEvent.__table__
+
+        done = events_written = 0
+        for day_index, count in enumerate(self._day_counts()):
+            logs, events = self._day(day_index, count, client_ids, client_cum, number_cum)
+            for i in range(0, len(logs), self.batch_size):
+                writer.insert(logs_table, LOG_COLUMNS, logs[i:i + self.batch_size])
+                writer.conn.commit()
+                done += len(logs[i:i + self.batch_size])
+                self.progress(done, self.rows)
+            for i in range(0, len(events), self.batch_size):
+                writer.insert(events_table, EVENT_COLUMNS, events[i:i + self.batch_size])
+            writer.conn.commit()
+            events_written += len(events)
+        return events_written
+
+    # ----------- BILLING AND SUBSCRIPTIONS -----------
+    def _billing(self, writer, clients):
+        """One record per client and finished month they sent in, billed at their plan's price."""
+        price = {c.id: c.plan.price_cents for c in clients}
+        current = (self.now - dt.timedelta(seconds=1)).strftime("%Y-%m")  # the month of the last generated day
+        rows = []
+        for (client_id, month), count in sorted(self.monthly.items()):
+            if month == current:
+                continue
+            year, mon = map(int, month.split("-"))
+            generated = dt.datetime(year + mon // 12, mon % 12 + 1, 1, 0, 5)
+            rows.append((client_id, price[client_id], count, month, generated.strftime("%Y-%m-%d %H:%M:%S.%f")))
+        writer.insert(BillingRecord.__table__, ("client_id", "amount_cents", "message_count", "billing_period", "generated_at"), rows)
+
+        # usage_count is this month's settled sends
+        for client in clients:
+            count = self.monthly.get((client.id, current), 0)
+            writer.conn.execute(update(Client.__table__).where(Client.__table__.c.id == client.id).values(usage_count=count))
+        writer.conn.commit()
+        return len(rows)
+
+    def _subscription_requests(self, writer, clients):
+        rng, rows = self.rng, []
+        plan_names = [p[0] for p in PLANS]
+        for client in clients:
+            for _ in range(rng.choice((0, 0, 1, 1, 2, 3))):
+                kind = rng.choices([t for t, _ in REQUEST_TYPES], weights=[w for _, w in REQUEST_TYPES])[0]
+                status = rng.choices([s for s, _ in REQUEST_STATUSES], weights=[w for _, w in REQUEST_STATUSES])[0]
+                created = self.start + dt.timedelta(seconds=rng.uniform(0, self.days * 86400))
+                completed = created + dt.timedelta(hours=rng.uniform(1, 72)) if status != "pending" else None
+                details = rng.choice(plan_names) if kind == "change_plan" else None
+                rows.append((client.id, kind, status, details, created.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                             completed.strftime("%Y-%m-%d %H:%M:%S.%f") if completed else None))
+        writer.insert(SubscriptionRequest.__table__,
+                      ("client_id", "request_type", "status", "details", "created_at", "completed_at"), rows)
+        writer.conn.commit()
+        return len(rows)
+
+    # ----------- RUN -----------
+    def run(self, rebuild=True):
+        """Loads everything and returns a summary of row counts."""
+        clients = self._clients()
+        engine = db.engine
+        fresh = db.session.execute(select(MessageLog.id).limit(1)).first() is None
+        db.session.commit()
+
+        if fresh:
+            # Maintaining indexes row by row costs more than building them once at the end
+            for table in (MessageLog.__table__, WebhookEvent.__table__):
+                for index in table.indexes:
+                    index.drop(bind=engine, checkfirst=True)
+
+        with engine.connect() as conn:
+            if conn.dialect.name == "sqlite":
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            writer = _Writer(conn)
+            events = self._logs(writer, clients)
+            billing = self._billing(writer, clients)
+            requests = self._subscription_requests(writer, clients)
+
+        summary = {
+            "clients": len(clients),
+            "message_logs": self.rows,
+            "webhook_events": events,
+            "billing_records": billing,
+            "subscription_requests": requests,
+            "indexes": upgrade()["indexes"]  # recreates whatever was dropped
+        }
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE message_logs"))
+                conn.execute(text("ANALYZE webhook_events"))
+
+        if rebuild:
+            rebuild_recipient_window()
+            rebuild_usage()
+            rebuild_conversations()
+        return summary
+
+
+def seed_synthetic(rows, **options):
+    """Generates `rows` message_logs plus the accounts and records around them. See Generator for options."""
+    rebuild = options.pop("rebuild", True)
+    return Generator(rows, **options).run(rebuild=rebuild)
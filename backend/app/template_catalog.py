@@ -0,0 +1,119 @@
+# app/template_catalog.py — cached copy of the Meta message template catalogue
+#
+# The frontend polls /templates/status and /templates/<name> constantly, but the
+# catalogue only changes when someone submits/edits/deletes a template or Meta
+# finishes a review. So the full list is fetched from Graph at most every
+# TEMPLATE_CACHE_TTL seconds, kept in the message_templates table (shared by
+# every worker process, and a fallback while Graph is down) and served from
+# memory with a by-name index.
+
+import datetime as dt
+import hashlib
+import json
+import requests
+from flask import current_app
+from .extensions import db, graph
+from .models import MessageTemplate
+from .cache import TTLCache
+
+TEMPLATE_FIELDS = "id,name,language,category,status,components,parameter_format,rejected_reason,quality_score"
+STALE_SYNC = dt.datetime(1970, 1, 1)  # marks the persisted copy as "refetch before trusting"
+
+catalog_cache = TTLCache("template_catalog")
+
+
+class Catalog:
+    """Immutable snapshot of the catalogue with an O(1) name index and an ETag."""
+
+    def __init__(self, templates, synced_at):
+        self.templates = templates
+        self.synced_at = synced_at
+        self.by_name = {}
+        for tpl in templates:
+            self.by_name.setdefault(tpl.get("name"), []).append(tpl)
+        self.etag = hashlib.sha1(json.dumps(templates, sort_keys=True).encode()).hexdigest()
+
+    def find(self, name, language=None):
+        matches = self.by_name.get(name, [])
+        if language:
+            matches = [t for t in matches if t.get("language") == language]
+        return matches[0] if matches else None
+
+
+# ----------- LOADING -----------
+def _fetch_from_graph():
+    """Every template on the WABA, following Graph's paging links."""
+    waba_id = current_app.config["WHATSAPP_BUSINESS_ACCOUNT_ID"]
+    res = graph.get(f"{waba_id}/message_templates", params={"fields": TEMPLATE_FIELDS, "limit": 200})
+    templates = []
+    while True:
+        if res.status_code != 200:
+            current_app.logger.error(f"Meta API error: {res.status_code} - {res.text}")
+            res.raise_for_status()
+        body = res.json()
+        templates.extend(body.get("data", []))
+        next_url = body.get("paging", {}).get("next")
+        if not next_url:
+            return templates
+        res = graph.get(next_url)
+
+
+def _persist(templates, synced_at):
+    db.session.query(MessageTemplate).delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(MessageTemplate, [{
+        "id": str(t.get("id") or f"{t.get('name')}:{t.get('language')}"),
+        "name": t.get("name", ""),
+        "language": t.get("language"),
+        "category": t.get("category"),
+        "status": t.get("status"),
+        "data": t,
+        "synced_at": synced_at
+    } for t in templates])
+    db.session.commit()
+
+
+def _read_persisted():
+    rows = MessageTemplate.query.order_by(MessageTemplate.name, MessageTemplate.language).all()
+    if not rows:
+        return None
+    return Catalog([r.data for r in rows], min(r.synced_at for r in rows))
+
+
+def _load(app):
+    with app.app_context():
+        ttl = app.config["TEMPLATE_CACHE_TTL"]
+        persisted = _read_persisted()
+        # Another worker may have synced recently; reuse its copy instead of calling Graph
+        if persisted and persisted.synced_at > dt.datetime.utcnow() - dt.timedelta(seconds=ttl):
+            return persisted
+
+        try:
+            templates = _fetch_from_graph()
+        except requests.RequestException:
+            if persisted is None:
+                raise
+            current_app.logger.warning("Template refresh failed, serving the last synced catalogue")
+            return persisted
+
+        now = dt.datetime.utcnow()
+        _persist(templates, now)
+        return Catalog(templates, now)
+
+
+def get_catalog():
+    """Current catalogue; stale copies are served while a background refresh runs."""
+    app = current_app._get_current_object()
+    return catalog_cache.get_or_load(
+        "catalog",
+        lambda: _load(app),
+        ttl=app.config["TEMPLATE_CACHE_TTL"],
+        stale_ttl=app.config["TEMPLATE_CACHE_STALE_TTL"]
+    )
+
+
+def invalidate_catalog(commit=True):
+    """Call after anything that changes templates on Meta's side."""
+    catalog_cache.invalidate("catalog")
+    db.session.query(MessageTemplate).update({"synced_at": STALE_SYNC}, synchronize_session=False)
+    if commit:
+        db.session.commit()
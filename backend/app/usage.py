@@ -0,0 +1,140 @@
+# app/usage.py — hourly usage rollups behind /dashboard/usage
+#
+# Every MessageLog insert bumps one usage_hourly counter (client, hour,
+# direction, status) and the client's usage_totals row in the same
+# transaction, so the dashboard reads 24 small rows and one totals row
+# instead of grouping a day of message_logs and counting all of history.
+# Hours are truncated in Python, so nothing here depends on SQL date
+# functions and SQLite and Postgres behave the same.
+
+import datetime as dt
+from sqlalchemy import event, select, and_, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from .extensions import db
+from .models import MessageLog, UsageHourly, UsageTotal
+from .migrations import backfill
+
+
+def hour_of(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _totals_for(direction, status):
+    """Which usage_totals column a log row counts towards, if any."""
+    if direction == "inbound" and status == "received":
+        return "received"
+    if direction == "outbound" and status == "sent":
+        return "sent"
+    return None
+
+
+def _upsert_counts(connection, table, keys, counters, rows):
+    """Adds `counters` of each row dict onto the existing row with the same `keys`."""
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[k] for k in keys],
+            set_={c: table.c[c] + getattr(stmt.excluded, c) for c in counters}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    # Other databases: plain read-modify-write per key
+    for values in rows:
+        key = and_(*(table.c[k] == values[k] for k in keys))
+        if connection.execute(select(table.c[keys[0]]).where(key)).first() is None:
+            connection.execute(table.insert().values(**values))
+        else:
+            connection.execute(table.update().where(key).values({
+                c: table.c[c] + literal(values[c]) for c in counters
+            }))
+
+
+def record_usage(connection, rows):
+    """
+    Counts (client_id, sent_at, direction, status) dicts into usage_hourly and
+    usage_totals with one statement each. Also used by bulk writers that
+    bypass the ORM flush.
+    """
+    hourly, totals = {}, {}
+    for row in rows:
+        if row.get("client_id") is None:
+            continue
+        key = (row["client_id"], hour_of(row["sent_at"]), row["direction"], row["status"] or "")
+        hourly[key] = hourly.get(key, 0) + 1
+        column = _totals_for(row["direction"], row["status"])
+        if column:
+            total = totals.setdefault(row["client_id"], {"client_id": row["client_id"], "sent": 0, "received": 0})
+            total[column] += 1
+
+    _upsert_counts(
+        connection, UsageHourly.__table__, ("client_id", "hour", "direction", "status"), ("count",),
+        [{"client_id": c, "hour": h, "direction": d, "status": s, "count": n} for (c, h, d, s), n in hourly.items()]
+    )
+    _upsert_counts(connection, UsageTotal.__table__, ("client_id",), ("sent", "received"), list(totals.values()))
+
+
+@event.listens_for(Session, "after_flush")
+def _count_message_logs(session, flush_context):
+    rows = [
+        {
+            "client_id": obj.client_id,
+            "sent_at": obj.sent_at or dt.datetime.utcnow(),
+            "direction": obj.direction or "outbound",
+            "status": obj.status
+        }
+        for obj in session.new if isinstance(obj, MessageLog)
+    ]
+    if rows:
+        record_usage(session.connection(), rows)
+
+
+# ----------- READS -----------
+def hourly_counts(client_id, since, direction, status):
+    """{hour: count} for one client's buckets starting at or after `since`."""
+    rows = db.session.query(UsageHourly.hour, UsageHourly.count).filter(
+        UsageHourly.client_id == client_id,
+        UsageHourly.direction == direction,
+        UsageHourly.status == status,
+        UsageHourly.hour >= hour_of(since)
+    )
+    return {hour: count for hour, count in rows}
+
+
+def totals(client_id):
+    row = db.session.get(UsageTotal, client_id)
+    return (row.sent, row.received) if row else (0, 0)
+
+
+# ----------- BACKFILL -----------
+@backfill("usage_hourly")
+def rebuild_usage(client_id=None, batch_size=10000):
+    """
+    Recomputes usage_hourly and usage_totals from message_logs (all clients,
+    or one). Streams the logs and buckets them in Python so it runs the same
+    on every database.
+    """
+    hourly_delete = UsageHourly.__table__.delete()
+    totals_delete = UsageTotal.__table__.delete()
+    query = select(MessageLog.client_id, MessageLog.sent_at, MessageLog.direction, MessageLog.status).where(
+        MessageLog.client_id.isnot(None), MessageLog.sent_at.isnot(None)
+    )
+    if client_id is not None:
+        hourly_delete = hourly_delete.where(UsageHourly.client_id == client_id)
+        totals_delete = totals_delete.where(UsageTotal.client_id == client_id)
+        query = query.where(MessageLog.client_id == client_id)
+
+    db.session.execute(hourly_delete)
+    db.session.execute(totals_delete)
+
+    # Read on a separate connection so the upserts can run while the cursor is open
+    with db.engine.connect() as reader:
+        result = reader.execute(query.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            record_usage(db.session.connection(), [row._asdict() for row in partition])
+    db.session.commit()
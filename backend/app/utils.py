@@ -1,11 +1,26 @@
 # utils.py — WhatsApp send helpers
 
+import logging
 import requests
 from flask import current_app
+from .extensions import graph
+from .cache import TTLCache
+from .logs import log_event
+
+log = logging.getLogger(__name__)
+
+
+def _log_send(res, recipient_number, kind):
+    # One line per recipient: successes are sampled (LOG_SAMPLING), failures always kept
+    if res.ok:
+        log_event(log, "send.result", recipient=recipient_number, type=kind, status=res.status_code)
+    else:
+        log_event(log, "send.failed", logging.WARNING, recipient=recipient_number, type=kind,
+                  status=res.status_code, response=res.text[:1000])
 
 
 def send_whatsapp_template(recipient_number, template_name, language="en_US", components=None):
-    url = f"{current_app.config['WHATSAPP_API_URL']}/{current_app.config['WHATSAPP_PHONE_ID']}/messages"
+    path = f"{current_app.config['WHATSAPP_PHONE_ID']}/messages"
 
     template_payload = {
         "name": template_name,
@@ -24,18 +39,13 @@ def send_whatsapp_template(recipient_number, template_name, language="en_US", co
         "template": template_payload
     }
 
-    headers = {
-        "Authorization": f"Bearer {current_app.config['WHATSAPP_TOKEN']}",
-        "Content-Type": "application/json"
-    }
-
-    res = requests.post(url, json=payload, headers=headers)
-    print(f"📡 WhatsApp API response for {recipient_number}:\nStatus Code: {res.status_code}\nResponse: {res.text}")
+    res = graph.post(path, json=payload, governed=True)  # 429s go to the send governor
+    _log_send(res, recipient_number, "template")
     return res
 
 
 def send_whatsapp_text(recipient_number, message_text):
-    url = f"{current_app.config['WHATSAPP_API_URL']}/{current_app.config['WHATSAPP_PHONE_ID']}/messages"
+    path = f"{current_app.config['WHATSAPP_PHONE_ID']}/messages"
     payload = {
         "messaging_product": "whatsapp",
         "to": recipient_number,
@@ -44,38 +54,45 @@ def send_whatsapp_text(recipient_number, message_text):
             "body": message_text
         }
     }
-    headers = {
-        "Authorization": f"Bearer {current_app.config['WHATSAPP_TOKEN']}",
-        "Content-Type": "application/json"
-    }
-    res = requests.post(url, json=payload, headers=headers)
-    print(f"📡 WhatsApp API response for {recipient_number}:\nStatus Code: {res.status_code}\nResponse: {res.text}")
+    res = graph.post(path, json=payload, governed=True)  # 429s go to the send governor
+    _log_send(res, recipient_number, "text")
     return res
 
 
 
-def get_whatsapp_tier_and_limit():
-    tier_limits = {
-        "TIER_250": 250,
-        "TIER_1K": 1000,
-        "TIER_10K": 10000,
-        "TIER_100K": 100000,
-        "TIER_UNLIMITED": float('inf')
-    }
+TIER_LIMITS = {
+    "TIER_250": 250,
+    "TIER_1K": 1000,
+    "TIER_10K": 10000,
+    "TIER_100K": 100000,
+    "TIER_UNLIMITED": float('inf')
+}
 
-    phone_number_id = current_app.config['WHATSAPP_PHONE_ID']
-    access_token = current_app.config["WHATSAPP_TOKEN"]
-    GRAPH_URL = current_app.config['WHATSAPP_API_URL']
-    url = f"{GRAPH_URL}/{phone_number_id}"
-    params = {"fields": "messaging_limit_tier"}
-    headers = {"Authorization": f"Bearer {access_token}"}
+# The messaging tier changes at most every few days, so it is served from memory
+# and refreshed in the background instead of costing a Graph round trip per send
+tier_cache = TTLCache("whatsapp_tier")
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
+
+def _fetch_whatsapp_tier(app):
+    with app.app_context():
+        response = graph.get(app.config['WHATSAPP_PHONE_ID'], params={"fields": "messaging_limit_tier"})
         response.raise_for_status()
-        tier_name = response.json().get("messaging_limit_tier", "TIER_250")
+        return response.json().get("messaging_limit_tier", "TIER_250")
+
+
+def get_whatsapp_tier_and_limit():
+    app = current_app._get_current_object()
+
+    try:
+        tier_name = tier_cache.get_or_load(
+            app.config['WHATSAPP_PHONE_ID'],
+            lambda: _fetch_whatsapp_tier(app),
+            ttl=app.config["TIER_CACHE_TTL"],
+            stale_ttl=app.config["TIER_CACHE_STALE_TTL"]
+        )
     except requests.RequestException as e:
-        print(f"Tier fetch error: {e}")
+        # Not cached, so the next call tries Graph again
+        log.warning(f"Tier fetch error: {e}")
         tier_name = "TIER_250"
 
-    return tier_name, tier_limits.get(tier_name, 250)
+    return tier_name, TIER_LIMITS.get(tier_name, 250)
@@ -0,0 +1,475 @@
+# app/webhooks.py — batched consumer for buffered WhatsApp webhook deliveries
+#
+# POST /webhook only verifies the request and appends the raw body to
+# webhook_inbox, so Meta always gets its 200 quickly no matter how busy the
+# database is. Consumers (`python worker.py --webhook-consumers N` or
+# `flask --app wsgi webhook consume`) claim up to WEBHOOK_BATCH_SIZE deliveries
+# at a time with a conditional UPDATE, parse them, and write every WebhookEvent,
+# inbound MessageLog and status change of the batch in one transaction that also
+# deletes the claimed inbox rows. A crashed consumer's claim expires after
+# WEBHOOK_LEASE_SECONDS; redelivered events are dropped by (message_id, event_type).
+# Status callbacks are matched to MessageLog rows by wamid, one UPDATE per batch.
+# A status can beat its own send (logs are committed after the fan-out), so one
+# whose wamid isn't logged yet waits in webhook_pending_statuses, and its
+# WebhookEvent is only written once a consumer has applied it.
+
+import datetime as dt
+import json
+import time
+from flask import current_app
+from sqlalchemy import update, select, or_, and_, func, case, tuple_
+from .extensions import db
+from .models import WebhookInbox, WebhookEvent, MessageLog, RecipientWindow, PendingStatus
+from .window import record_activity, IN_CHUNK
+from .usage import record_usage
+from .inbox import record_conversations
+from .template_catalog import invalidate_catalog
+from .events import publish, status_event, MESSAGE_INBOUND, TEMPLATE_STATUS
+
+# Statuses only move forward; a late "delivered" must not overwrite "read"
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 3}
+
+
+def enqueue_delivery(body):
+    """Appends one raw webhook body to the inbox. The only write on the request path."""
+    db.session.execute(WebhookInbox.__table__.insert().values(body=body, received_at=dt.datetime.utcnow()))
+    db.session.commit()
+
+
+# ----------- PARSING -----------
+def _timestamp(value):
+    try:
+        return dt.datetime.utcfromtimestamp(int(value))
+    except (TypeError, ValueError):
+        return dt.datetime.utcnow()
+
+
+def _message_text(message):
+    kind = message.get("type")
+    if kind == "text":
+        return message.get("text", {}).get("body")
+    if kind in ("image", "video", "document"):
+        return message.get(kind, {}).get("caption") or f"[{kind}]"
+    if kind == "button":
+        return message.get("button", {}).get("text")
+    if kind == "interactive":
+        reply = message.get("interactive", {})
+        reply = reply.get("button_reply") or reply.get("list_reply") or {}
+        return reply.get("title")
+    return f"[{kind}]" if kind else None
+
+
+def parse_delivery(body):
+    """
+    Splits one webhook body into (events, inbound, statuses):
+      events   — WebhookEvent dicts
+      inbound  — dicts for inbound messages (number, text, sent_at)
+      statuses — (wamid, status, timestamp, error) tuples
+    """
+    payload = json.loads(body)
+    events, inbound, statuses = [], [], []
+    now = dt.datetime.utcnow()
+
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+
+            if change.get("field") == "message_template_status_update":
+                events.append({
+                    "message_id": str(value.get("message_template_id", "")),
+                    "event_type": f"template_{str(value.get('event', '')).lower()}",
+                    "payload": value,
+                    "received_at": now
+                })
+                continue
+
+            for message in value.get("messages", []):
+                events.append({"message_id": message.get("id", ""), "event_type": "message", "payload": message, "received_at": now})
+                inbound.append({
+                    "wamid": message.get("id", ""),
+                    "recipient_number": message.get("from"),
+                    "content": _message_text(message),
+                    "sent_at": _timestamp(message.get("timestamp"))
+                })
+
+            for status in value.get("statuses", []):
+                events.append({"message_id": status.get("id", ""), "event_type": status.get("status", ""), "payload": status, "received_at": now})
+                errors = status.get("errors") or [{}]
+                statuses.append((
+                    status.get("id"),
+                    status.get("status"),
+                    _timestamp(status.get("timestamp")),
+                    errors[0].get("title") or errors[0].get("message")
+                ))
+
+    return events, inbound, statuses
+
+
+# ----------- WRITING -----------
+def _new_events(events):
+    """Drops events already stored (Meta retries until it sees a 200) and duplicates within the batch."""
+    unique = {(e["message_id"], e["event_type"]): e for e in events}
+    keys = list(unique)
+    for i in range(0, len(keys), IN_CHUNK):
+        chunk = keys[i:i + IN_CHUNK]
+        seen = db.session.execute(
+            select(WebhookEvent.message_id, WebhookEvent.event_type)
+            .where(tuple_(WebhookEvent.message_id, WebhookEvent.event_type).in_(chunk))
+        )
+        for key in seen:
+            unique.pop(tuple(key), None)
+    return list(unique.values())
+
+
+def _owners(numbers):
+    """
+    Which client each number belongs to: the one with the most recent activity
+    with it in recipient_windows (every client sends from the same phone id).
+    """
+    latest = {}
+    numbers = list(dict.fromkeys(numbers))
+    for i in range(0, len(numbers), IN_CHUNK):
+        rows = db.session.execute(
+            select(
+                RecipientWindow.recipient_number,
+                RecipientWindow.client_id,
+                RecipientWindow.last_template_at,
+                RecipientWindow.last_inbound_at
+            ).where(RecipientWindow.recipient_number.in_(numbers[i:i + IN_CHUNK]))
+        )
+        for number, client_id, last_template, last_inbound in rows:
+            seen = max(t for t in (last_template, last_inbound, dt.datetime.min) if t)
+            if number not in latest or seen > latest[number][0]:
+                latest[number] = (seen, client_id)
+    return {number: client_id for number, (_, client_id) in latest.items()}
+
+
+def _store_inbound(inbound, new_wamids):
+    inbound = [m for m in inbound if m["wamid"] in new_wamids and m["recipient_number"]]
+    owners = _owners(m["recipient_number"] for m in inbound)
+    fallback = current_app.config["INBOUND_FALLBACK_CLIENT_ID"]
+    rows, unrouted = [], 0
+    for m in inbound:
+        client_id = owners.get(m["recipient_number"], fallback)
+        if client_id is None:
+            unrouted += 1
+            current_app.logger.warning(
+                f"Dropped inbound message {m['wamid']} from {m['recipient_number']}: no client has messaged this "
+                f"number, set INBOUND_FALLBACK_CLIENT_ID to keep such messages"
+            )
+            continue
+        rows.append({
+            "client_id": client_id,
+            "recipient_number": m["recipient_number"],
+            "template_name": "inbound_text",
+            "content": m["content"],
+            "status": "received",
+            "sent_at": m["sent_at"],
+            "direction": "inbound",
+            "wamid": m["wamid"] or None
+        })
+    if not rows:
+        return 0, unrouted
+
+    # Core insert skips the after_flush hooks, so update the 24h window, usage rollups and inbox here
+    db.session.execute(MessageLog.__table__.insert(), rows)
+    record_activity(db.session.connection(), [
+        {"client_id": r["client_id"], "recipient_number": r["recipient_number"], "last_inbound_at": r["sent_at"]}
+        for r in rows
+    ])
+    record_usage(db.session.connection(), rows)
+    record_conversations(db.session.connection(), rows)
+
+    by_client = {}
+    for r in rows:
+        by_client.setdefault(r["client_id"], []).append({
+            "recipient": r["recipient_number"],
+            "wamid": r["wamid"],
+            "content": r["content"],
+            "sent_at": r["sent_at"].isoformat()
+        })
+    for client_id, messages in by_client.items():
+        publish(client_id, MESSAGE_INBOUND, {"messages": messages})
+    return len(rows), unrouted
+
+
+def _publish_statuses(chunk):
+    """Live message.<status> events for the rows of a chunk that now carry the reported status."""
+    rows = db.session.execute(
+        select(MessageLog.client_id, MessageLog.wamid, MessageLog.recipient_number, MessageLog.status)
+        .where(MessageLog.wamid.in_(list(chunk)))
+    )
+    grouped = {}
+    for client_id, wamid, recipient, status in rows:
+        if status == chunk[wamid]["status"]:
+            grouped.setdefault((client_id, status), []).append({"wamid": wamid, "recipient": recipient})
+    for (client_id, status), messages in grouped.items():
+        publish(client_id, status_event(status), {"messages": messages})
+
+
+def apply_statuses(statuses, batch_size=500):
+    """
+    Applies (wamid, status, timestamp[, error]) tuples to MessageLog with one
+    UPDATE per `batch_size` wamids, matched through ux_message_logs_wamid.
+    Statuses never move backwards. Returns the number of rows changed.
+    """
+    # Collapse to the furthest status per wamid; the first delivered/read time is the delivery time
+    final = {}
+    for wamid, status, timestamp, *rest in statuses:
+        rank = STATUS_RANK.get(status)
+        if not wamid or rank is None:
+            continue
+        seen = final.setdefault(wamid, {"status": status, "rank": rank, "delivered_at": None, "error": None})
+        if rank > seen["rank"]:
+            seen.update(status=status, rank=rank)
+        if status in ("delivered", "read") and (seen["delivered_at"] is None or timestamp < seen["delivered_at"]):
+            seen["delivered_at"] = timestamp
+        if status == "failed":
+            seen["error"] = rest[0] if rest else None
+
+    current_rank = case(STATUS_RANK, value=MessageLog.status, else_=0)
+    applied = 0
+    wamids = list(final)
+    for i in range(0, len(wamids), batch_size):
+        chunk = {w: final[w] for w in wamids[i:i + batch_size]}
+        new_status = case({w: v["status"] for w, v in chunk.items()}, value=MessageLog.wamid)
+        new_rank = case({w: v["rank"] for w, v in chunk.items()}, value=MessageLog.wamid)
+        moves = current_rank < new_rank
+        delivered = {w: v["delivered_at"] for w, v in chunk.items() if v["delivered_at"]}
+        errors = {w: v["error"] for w, v in chunk.items() if v["error"]}
+
+        values = {"status": case((moves, new_status), else_=MessageLog.status)}
+        changed = moves
+        if delivered:
+            changed = or_(moves, and_(MessageLog.delivery_time.is_(None), MessageLog.wamid.in_(list(delivered))))
+            values["delivery_time"] = func.coalesce(
+                MessageLog.delivery_time,
+                case(delivered, value=MessageLog.wamid, else_=None)
+            )
+        if errors:
+            values["error_message"] = case(
+                (and_(moves, new_status == "failed"), case(errors, value=MessageLog.wamid, else_=MessageLog.error_message)),
+                else_=MessageLog.error_message
+            )
+
+        res = db.session.execute(
+            update(MessageLog)
+            .where(MessageLog.wamid.in_(list(chunk)), changed)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        applied += res.rowcount
+        if res.rowcount:
+            _publish_statuses(chunk)
+    return applied
+
+
+def _logged_wamids(wamids):
+    """The subset of `wamids` that already have a MessageLog row."""
+    wamids = list(dict.fromkeys(w for w in wamids if w))
+    found = set()
+    for i in range(0, len(wamids), IN_CHUNK):
+        found.update(db.session.execute(
+            select(MessageLog.wamid).where(MessageLog.wamid.in_(wamids[i:i + IN_CHUNK]))
+        ).scalars())
+    return found
+
+
+def _hold_statuses(statuses, payloads):
+    """Parks statuses for messages not logged yet; a redelivery of one already parked is skipped."""
+    unique = {(s[0], s[1]): s for s in statuses}
+    keys = list(unique)
+    for i in range(0, len(keys), IN_CHUNK):
+        held = db.session.execute(
+            select(PendingStatus.wamid, PendingStatus.status)
+            .where(tuple_(PendingStatus.wamid, PendingStatus.status).in_(keys[i:i + IN_CHUNK]))
+        )
+        for key in held:
+            unique.pop(tuple(key), None)
+    if unique:
+        now = dt.datetime.utcnow()
+        db.session.execute(PendingStatus.__table__.insert(), [
+            {"wamid": wamid, "status": status, "status_at": timestamp, "error": error,
+             "payload": payloads.get((wamid, status)), "received_at": now}
+            for wamid, status, timestamp, error in unique.values()
+        ])
+    return len(unique)
+
+
+def ingest(bodies):
+    """Parses and writes a list of raw bodies in the current transaction. Returns counts."""
+    events, inbound, statuses = [], [], []
+    for body in bodies:
+        e, i, s = parse_delivery(body)
+        events.extend(e)
+        inbound.extend(i)
+        statuses.extend(s)
+
+    new_events = _new_events(events)
+    new_keys = {(e["message_id"], e["event_type"]) for e in new_events}
+    new_wamids = {wamid for wamid, kind in new_keys if kind == "message"}
+    statuses = [s for s in statuses if (s[0], s[1]) in new_keys]
+
+    # Statuses of messages not logged yet are held back, events and all, until they can be applied
+    logged = _logged_wamids(s[0] for s in statuses)
+    early = [s for s in statuses if s[0] and s[1] in STATUS_RANK and s[0] not in logged]
+    early_keys = {(s[0], s[1]) for s in early}
+    statuses = [s for s in statuses if (s[0], s[1]) not in early_keys]
+    recorded = [e for e in new_events if (e["message_id"], e["event_type"]) not in early_keys]
+    if recorded:
+        db.session.execute(WebhookEvent.__table__.insert(), recorded)
+    held = _hold_statuses(early, {
+        (e["message_id"], e["event_type"]): e["payload"] for e in new_events if (e["message_id"], e["event_type"]) in early_keys
+    })
+
+    template_events = [e for e in new_events if e["event_type"].startswith("template_")]
+    if template_events:
+        invalidate_catalog(commit=False)  # a template review finished on Meta's side
+        for e in template_events:
+            publish(None, TEMPLATE_STATUS, {
+                "template_id": e["message_id"],
+                "name": e["payload"].get("message_template_name"),
+                "language": e["payload"].get("message_template_language"),
+                "event": e["payload"].get("event"),
+                "reason": e["payload"].get("reason")
+            })
+
+    stored, unrouted = _store_inbound(inbound, new_wamids)
+    return {
+        "events": len(recorded),
+        "inbound": stored,
+        "inbound_unrouted": unrouted,
+        "statuses": apply_statuses(statuses),
+        "statuses_held": held
+    }
+
+
+def retry_pending_statuses():
+    """
+    Applies held statuses whose MessageLog row has appeared since, recording
+    their WebhookEvents, and drops those older than WEBHOOK_PENDING_MAX_HOURS.
+    Commits. Returns the number of held statuses applied.
+    """
+    cfg = current_app.config
+    rows = db.session.execute(
+        select(
+            PendingStatus.id, PendingStatus.wamid, PendingStatus.status, PendingStatus.status_at,
+            PendingStatus.error, PendingStatus.payload, PendingStatus.received_at
+        )
+        .join(MessageLog, MessageLog.wamid == PendingStatus.wamid)
+        .order_by(PendingStatus.id)
+        .limit(cfg["WEBHOOK_BATCH_SIZE"])
+    ).all()
+
+    if rows:
+        events = _new_events([
+            {"message_id": r.wamid, "event_type": r.status, "payload": r.payload, "received_at": r.received_at}
+            for r in rows
+        ])
+        if events:
+            db.session.execute(WebhookEvent.__table__.insert(), events)
+        apply_statuses([(r.wamid, r.status, r.status_at, r.error) for r in rows])
+        db.session.execute(PendingStatus.__table__.delete().where(PendingStatus.id.in_([r.id for r in rows])))
+
+    cutoff = dt.datetime.utcnow() - dt.timedelta(hours=cfg["WEBHOOK_PENDING_MAX_HOURS"])
+    expired = db.session.execute(PendingStatus.__table__.delete().where(PendingStatus.received_at < cutoff)).rowcount
+    db.session.commit()
+    if expired:
+        current_app.logger.warning(f"Dropped {expired} statuses whose message was never logged")
+    return len(rows)
+
+
+# ----------- CONSUMER -----------
+def claim_batch(consumer_id):
+    """Claims up to WEBHOOK_BATCH_SIZE unclaimed (or abandoned) deliveries for `consumer_id`."""
+    cfg = current_app.config
+    now = dt.datetime.utcnow()
+    claimable = (
+        WebhookInbox.attempts < cfg["WEBHOOK_MAX_ATTEMPTS"],
+        or_(
+            WebhookInbox.claimed_at.is_(None),
+            WebhookInbox.claimed_at < now - dt.timedelta(seconds=cfg["WEBHOOK_LEASE_SECONDS"])
+        )
+    )
+    ids = [r[0] for r in db.session.query(WebhookInbox.id).filter(*claimable)
+           .order_by(WebhookInbox.id).limit(cfg["WEBHOOK_BATCH_SIZE"])]
+    if not ids:
+        db.session.commit()
+        return []
+
+    # Conditional on the row still being claimable, so racing consumers never share a row
+    db.session.execute(
+        update(WebhookInbox)
+        .where(WebhookInbox.id.in_(ids), *claimable)
+        .values(claimed_by=consumer_id, claimed_at=now, attempts=WebhookInbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return db.session.execute(
+        select(WebhookInbox.id, WebhookInbox.body)
+        .where(and_(WebhookInbox.claimed_by == consumer_id, WebhookInbox.claimed_at == now))
+        .order_by(WebhookInbox.id)
+    ).all()
+
+
+def _delete(ids):
+    db.session.execute(WebhookInbox.__table__.delete().where(WebhookInbox.id.in_(ids)))
+
+
+def process_batch(rows):
+    """Writes a claimed batch in one transaction; on failure retries row by row to isolate bad payloads."""
+    if len(rows) > 1:
+        try:
+            counts = ingest([body for _, body in rows])
+            _delete([row_id for row_id, _ in rows])
+            db.session.commit()
+            return counts
+        except Exception:
+            db.session.rollback()
+            current_app.logger.warning(f"Webhook batch of {len(rows)} failed, retrying one by one")
+
+    counts = {"events": 0, "inbound": 0, "inbound_unrouted": 0, "statuses": 0, "statuses_held": 0}
+    for row_id, body in rows:
+        try:
+            for key, n in ingest([body]).items():
+                counts[key] += n
+            _delete([row_id])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception(f"Webhook delivery {row_id} failed")
+            db.session.execute(update(WebhookInbox).where(WebhookInbox.id == row_id).values(error=str(e)[:2000]))
+            db.session.commit()
+    return counts
+
+
+def run_consumer(consumer_id, poll_interval=None, once=False, should_stop=lambda: False):
+    """Drains webhook_inbox until `should_stop()` is true (or the inbox is empty when `once`)."""
+    poll_interval = poll_interval or current_app.config["WEBHOOK_POLL_INTERVAL"]
+    next_retry = 0.0
+
+    while not should_stop():
+        if time.monotonic() >= next_retry:
+            next_retry = time.monotonic() + current_app.config["WEBHOOK_PENDING_RETRY_SECONDS"]
+            try:
+                retry_pending_statuses()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception(f"Retrying held statuses failed on {consumer_id}")
+
+        rows = claim_batch(consumer_id)
+        if not rows:
+            db.session.remove()
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            counts = process_batch(rows)
+            current_app.logger.info(f"{consumer_id} ingested {len(rows)} deliveries: {counts}")
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(f"Webhook delivery failed on {consumer_id}")
+        finally:
+            db.session.remove()
@@ -0,0 +1,167 @@
+# app/window.py — rolling 24h recipient window
+#
+# recipient_windows holds, per (client, number), when we last sent a template
+# and when the number last wrote to us. It is upserted from every flush that
+# inserts MessageLog rows, so the tier check and the customer-service-window
+# check only look up the numbers in the current request instead of scanning
+# a day of message_logs.
+
+from sqlalchemy import event, case, select, func, and_, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+from .extensions import db
+from .models import MessageLog, RecipientWindow
+from .migrations import backfill
+
+IN_CHUNK = 500  # keeps IN (...) lists well under SQLite's bound-parameter limit
+
+
+def counts_as_template(direction, status, template_name):
+    return direction == "outbound" and template_name != "text" and status != "failed"
+
+
+def later_of(current, incoming):
+    """Newer of two nullable timestamps, written portably for SQLite and Postgres."""
+    return case(
+        (incoming.is_(None), current),
+        (current.is_(None), incoming),
+        (current < incoming, incoming),
+        else_=current
+    )
+
+
+def record_activity(connection, rows):
+    """
+    Upserts (client_id, recipient_number, last_template_at, last_inbound_at)
+    dicts into recipient_windows in one statement. Also used by bulk writers
+    that bypass the ORM flush.
+    """
+    merged = {}
+    for row in rows:
+        key = (row["client_id"], row["recipient_number"])
+        seen = merged.setdefault(key, {
+            "client_id": row["client_id"],
+            "recipient_number": row["recipient_number"],
+            "last_template_at": None,
+            "last_inbound_at": None
+        })
+        for col in ("last_template_at", "last_inbound_at"):
+            if row.get(col) and (seen[col] is None or row[col] > seen[col]):
+                seen[col] = row[col]
+    if not merged:
+        return
+
+    table = RecipientWindow.__table__
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.client_id, table.c.recipient_number],
+            set_={
+                "last_template_at": later_of(table.c.last_template_at, stmt.excluded.last_template_at),
+                "last_inbound_at": later_of(table.c.last_inbound_at, stmt.excluded.last_inbound_at)
+            }
+        )
+        connection.execute(stmt, list(merged.values()))
+        return
+
+    # Other databases: plain read-modify-write per number
+    for values in merged.values():
+        key = and_(table.c.client_id == values["client_id"], table.c.recipient_number == values["recipient_number"])
+        if connection.execute(select(table.c.client_id).where(key)).first() is None:
+            connection.execute(table.insert().values(**values))
+        else:
+            connection.execute(table.update().where(key).values({
+                col: later_of(table.c[col], literal(values[col], table.c[col].type))
+                for col in ("last_template_at", "last_inbound_at")
+            }))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_message_logs(session, flush_context):
+    rows = []
+    for obj in session.new:
+        if not isinstance(obj, MessageLog) or obj.client_id is None:
+            continue
+        rows.append({
+            "client_id": obj.client_id,
+            "recipient_number": obj.recipient_number,
+            "last_template_at": obj.sent_at if counts_as_template(obj.direction, obj.status, obj.template_name) else None,
+            "last_inbound_at": obj.sent_at if obj.direction == "inbound" else None
+        })
+    if rows:
+        record_activity(session.connection(), rows)
+
+
+# ----------- LOOKUPS -----------
+def _in_chunks(values):
+    values = list(dict.fromkeys(values))
+    for i in range(0, len(values), IN_CHUNK):
+        yield values[i:i + IN_CHUNK]
+
+
+def template_recipients_since(client_id, since, recipients):
+    """Which of `recipients` already got a template from this client after `since`."""
+    found = set()
+    for chunk in _in_chunks(recipients):
+        found.update(r[0] for r in db.session.query(RecipientWindow.recipient_number).filter(
+            RecipientWindow.client_id == client_id,
+            RecipientWindow.recipient_number.in_(chunk),
+            RecipientWindow.last_template_at >= since
+        ))
+    return found
+
+
+def count_template_recipients_since(client_id, since):
+    """Unique numbers this client sent a template to after `since` (index range count)."""
+    return db.session.query(func.count()).select_from(RecipientWindow).filter(
+        RecipientWindow.client_id == client_id,
+        RecipientWindow.last_template_at >= since
+    ).scalar()
+
+
+def inbound_recipients_since(client_id, since, recipients):
+    """Which of `recipients` messaged this client after `since`, i.e. have an open session."""
+    found = set()
+    for chunk in _in_chunks(recipients):
+        found.update(r[0] for r in db.session.query(RecipientWindow.recipient_number).filter(
+            RecipientWindow.client_id == client_id,
+            RecipientWindow.recipient_number.in_(chunk),
+            RecipientWindow.last_inbound_at >= since
+        ))
+    return found
+
+
+# ----------- BACKFILL -----------
+@backfill("recipient_windows")
+def rebuild_recipient_window(client_id=None):
+    """
+    Recomputes recipient_windows from message_logs (all clients, or one).
+    Run once for databases that already had logs before the table existed.
+    """
+    is_template = and_(
+        MessageLog.direction == "outbound",
+        MessageLog.template_name != "text",
+        MessageLog.status != "failed"
+    )
+    query = (
+        select(
+            MessageLog.client_id,
+            MessageLog.recipient_number,
+            func.max(case((is_template, MessageLog.sent_at))).label("last_template_at"),
+            func.max(case((MessageLog.direction == "inbound", MessageLog.sent_at))).label("last_inbound_at")
+        )
+        .where(MessageLog.client_id.isnot(None))
+        .group_by(MessageLog.client_id, MessageLog.recipient_number)
+    )
+    delete = RecipientWindow.__table__.delete()
+    if client_id is not None:
+        query = query.where(MessageLog.client_id == client_id)
+        delete = delete.where(RecipientWindow.client_id == client_id)
+
+    db.session.execute(delete)
+    db.session.execute(RecipientWindow.__table__.insert().from_select(
+        ["client_id", "recipient_number", "last_template_at", "last_inbound_at"], query
+    ))
+    db.session.commit()
@@ -0,0 +1,211 @@
+# benchmarks/load.py — end-to-end latency/throughput of the hot endpoints against a mock Graph API
+#
+#   python benchmarks/load.py                                    # 200k logs in a temp SQLite file
+#   python benchmarks/load.py --rows 2000000 --concurrency 32
+#   python benchmarks/load.py --graph-throttle-rate 0.05 --mps 40 --scenarios send_message,send_message_x10
+#   python benchmarks/load.py --json results.json                # save a run...
+#   python benchmarks/load.py --baseline results.json            # ...and fail (exit 1) if a later one regresses
+#   DATABASE_URL=postgresql://... python benchmarks/load.py      # existing empty Postgres db
+#
+# Starts benchmarks/mock_graph.py in place of graph.facebook.com, loads a
+# synthetic dataset with app/synthetic.py (message_logs plus the recipient
+# window, usage and inbox rollups built from them), serves the app on a
+# threaded local server and drives every scenario over HTTP with
+# --concurrency keep-alive clients. Reports p50/p90/p99 latency and
+# requests/second per scenario.
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_graph import MockGraph  # noqa: E402
+from loadgen import drive, summarize  # noqa: E402
+from webhook_gen import generate, sign  # noqa: E402
+
+SCENARIOS = (
+    "send_message", "send_message_x10", "messages_log", "messages_log_failed", "dashboard_usage",
+    "conversations", "conversations_inbox", "conversation_history", "webhook"
+)
+
+parser = argparse.ArgumentParser(description="End-to-end load benchmark against a mock Graph API")
+parser.add_argument("--rows", type=int, default=200_000, help="message_logs rows loaded before the run")
+parser.add_argument("--clients", type=int, default=10)
+parser.add_argument("--numbers", type=int, default=20_000, help="distinct recipient numbers")
+parser.add_argument("--requests", type=int, default=500, help="timed requests per scenario")
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+parser.add_argument("--graph-latency-ms", type=float, default=50.0)
+parser.add_argument("--graph-error-rate", type=float, default=0.0)
+parser.add_argument("--graph-throttle-rate", type=float, default=0.0)
+parser.add_argument("--mps", type=float, default=80.0, help="messages/second the mock allows per phone number")
+parser.add_argument("--json", help="write the results to this file")
+parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+parser.add_argument("--max-regression", type=float, default=0.25, help="allowed p99 growth / throughput drop vs the baseline")
+parser.add_argument("--seed", type=int, default=7)
+args = parser.parse_args()
+
+unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+if unknown:
+    sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+graph_mock = MockGraph(
+    latency_ms=args.graph_latency_ms,
+    jitter_ms=args.graph_latency_ms / 5,
+    error_rate=args.graph_error_rate,
+    throttle_rate=args.graph_throttle_rate,
+    mps=args.mps,
+    seed=args.seed
+).start()
+
+# The app reads its settings at import time, so point it at the mock first
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ.update({
+    "WHATSAPP_API_URL": graph_mock.url,
+    "WHATSAPP_TOKEN": "bench-token",
+    "WHATSAPP_PHONE_ID": "bench-phone",
+    "WHATSAPP_BUSINESS_ACCOUNT_ID": "bench-waba",
+    "WHATSAPP_APP_SECRET": "bench-secret",
+    "WHATSAPP_MPS": str(args.mps),
+    "RATE_LIMIT_BURST": "0",  # per-client buckets off: measure the handlers, not the limiter
+    "RATE_LIMIT_PER_HOUR": "0",
+    "EVENTS_BROADCASTER": "local"
+})
+
+from werkzeug.serving import make_server  # noqa: E402
+from app import create_app  # noqa: E402
+from app.auth import _issue_api_key  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import MessageLog, Client, Plan  # noqa: E402
+from app.synthetic import seed_synthetic  # noqa: E402
+
+
+def build_calls(name, ctx, rng):
+    """The `args.requests` HTTP calls of one scenario, as loadgen.drive() callables."""
+    base, headers = ctx["base"], {"Authorization": f"Bearer {ctx['api_key']}"}
+    numbers, sent = ctx["numbers"], ctx["sent"]
+
+    def get(path):
+        return lambda s: s.get(base + path, headers=headers, timeout=60)
+
+    def send(recipients):
+        body = {"to": recipients, "type": "template", "name": "bench_template_0"}
+        return lambda s: s.post(base + "/messages/send_message", json=body, headers=headers, timeout=60)
+
+    def webhook(body):
+        signed = {"Content-Type": "application/json", "X-Hub-Signature-256": sign(body, "bench-secret")}
+        return lambda s: s.post(base + "/webhook", data=body, headers=signed, timeout=60)
+
+    n = args.requests
+    if name == "send_message":
+        return [send([rng.choice(numbers)]) for _ in range(n)]
+    if name == "send_message_x10":
+        return [send(rng.sample(numbers, min(10, len(numbers)))) for _ in range(n)]
+    if name == "messages_log":
+        return [get("/messages/log") for _ in range(n)]
+    if name == "messages_log_failed":
+        return [get("/messages/log?status=failed") for _ in range(n)]
+    if name == "dashboard_usage":
+        return [get("/dashboard/usage") for _ in range(n)]
+    if name == "conversations":
+        return [get("/conversations") for _ in range(n)]
+    if name == "conversations_inbox":
+        return [get("/conversations/inbox") for _ in range(n)]
+    if name == "conversation_history":
+        return [get(f"/conversation/{rng.choice(numbers)}/messages") for _ in range(n)]
+    if name == "webhook":
+        return [webhook(body) for body in generate(n, numbers, sent, batch=5, seed=rng.random())]
+    raise ValueError(name)
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose p99 grew or whose throughput dropped by more than `tolerance` vs the baseline."""
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if now["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99_ms']} -> {now['p99_ms']} ms")
+        if now["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['rps']} -> {now['rps']} req/s")
+    return regressions
+
+
+def main():
+    rng = random.Random(args.seed)
+    app = create_app()
+
+    with app.app_context():
+        if MessageLog.query.first() is not None:
+            sys.exit("benchmark needs an empty database")
+        print(f"Loading {args.rows:,} message_logs rows into {db.engine.url.render_as_string(hide_password=True)}")
+        seed_synthetic(
+            args.rows, clients=args.clients, numbers=args.numbers, seed=args.seed,
+            progress=lambda done, total: print(f"\r  loaded {done:,}/{total:,} rows", end="", flush=True)
+        )
+        print()
+
+        # The first synthetic client sends the most, so it is the worst case
+        client = Client.query.filter_by(username=f"syn{args.seed}_1").one()
+        client.is_active = True
+        client.plan = Plan.query.filter_by(monthly_cap=None).first()  # sends never hit a monthly cap
+        client.plan_expiry = dt.datetime.utcnow() + dt.timedelta(days=365)
+        db.session.commit()
+        client_id = client.id
+        rows = (
+            db.session.query(MessageLog.wamid, MessageLog.recipient_number)
+            .filter_by(client_id=client_id, direction="outbound")
+            .limit(5000)
+            .all()
+        )
+        ctx = {
+            "api_key": _issue_api_key(client_id),
+            "numbers": sorted({number for _, number in rows}),
+            "sent": [tuple(r) for r in rows]
+        }
+        db.session.remove()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    ctx["base"] = f"http://127.0.0.1:{server.port}"
+
+    results = {}
+    for name in args.scenarios.split(","):
+        drive(build_calls(name, ctx, rng)[:min(20, args.requests)], args.concurrency)  # warm caches and pools
+        results[name] = summarize(*drive(build_calls(name, ctx, rng), args.concurrency))
+        print(f"  {name}: {results[name]['rps']} req/s, p99 {results[name]['p99_ms']} ms")
+
+    server.shutdown()
+    graph_stats = graph_mock.stats()
+    graph_mock.stop()
+
+    width = max(len(n) for n in results)
+    print(f"\n{'scenario':<{width}}  {'req/s':>8}  {'p50 ms':>8}  {'p90 ms':>8}  {'p99 ms':>8}  {'max ms':>8}  {'errors':>6}")
+    for name, r in results.items():
+        print(f"{name:<{width}}  {r['rps']:>8.1f}  {r['p50_ms']:>8.2f}  {r['p90_ms']:>8.2f}  "
+              f"{r['p99_ms']:>8.2f}  {r['max_ms']:>8.2f}  {r['errors']:>6}")
+    print(f"\nmock Graph: {graph_stats}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.max_regression)
+        if regressions:
+            print("\nRegressions against " + args.baseline + ":\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/loadgen.py — concurrent HTTP driver and latency summaries for the benchmarks
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def drive(calls, concurrency=8):
+    """
+    Runs every `call(session)` on `concurrency` threads, each with its own
+    keep-alive requests.Session. A call returns a requests.Response.
+    Returns (latencies in ms, status codes, wall seconds), in call order.
+    """
+    local = threading.local()
+
+    def run(call):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = call(local.session).status_code
+        except requests.RequestException:
+            status = 599  # connection failures count as errors, not as crashes of the run
+        return (time.perf_counter() - start) * 1000, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        outcomes = list(pool.map(run, calls))
+    wall = time.perf_counter() - start
+    return [ms for ms, _ in outcomes], [status for _, status in outcomes], wall
+
+
+def summarize(latencies, statuses, wall):
+    """p50/p90/p99/max latency, requests/second and non-2xx count of one driven run."""
+    if not latencies:
+        return {"requests": 0, "rps": 0.0, "p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "errors": 0}
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(q[49], 2),
+        "p90_ms": round(q[89], 2),
+        "p99_ms": round(q[98], 2),
+        "max_ms": round(max(latencies), 2),
+        "errors": sum(1 for s in statuses if not 200 <= s < 300)
+    }
@@ -0,0 +1,165 @@
+# benchmarks/message_log_indexes.py — MessageLog query latency before/after the composite indexes
+#
+#   python benchmarks/message_log_indexes.py                 # 1M rows in a temp SQLite file
+#   python benchmarks/message_log_indexes.py --rows 200000
+#   DATABASE_URL=postgresql://... python benchmarks/message_log_indexes.py   # existing empty Postgres db
+#
+# Loads synthetic rows with the message_logs indexes dropped, times the queries
+# behind the hot endpoints, then runs app.migrations.upgrade() (the same path an
+# existing deployment takes) and times them again.
+
+import argparse
+import datetime as dt
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description="MessageLog query latency before/after the composite indexes")
+parser.add_argument("--rows", type=int, default=1_000_000)
+parser.add_argument("--clients", type=int, default=20)
+parser.add_argument("--numbers", type=int, default=50_000, help="distinct recipient numbers")
+parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+parser.add_argument("--seed", type=int, default=7)
+args = parser.parse_args()
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import func, distinct, text  # noqa: E402
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import MessageLog, Plan, Client  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+
+BATCH = 20_000
+
+
+def pick_number(rng, numbers):
+    # Half the traffic goes to a small set of very active contacts
+    if rng.random() < 0.5:
+        return numbers[min(int(rng.paretovariate(0.8)) - 1, len(numbers) - 1)]
+    return numbers[rng.randrange(len(numbers))]
+
+
+def load_rows(rng):
+    now = dt.datetime.utcnow()
+    plan = Plan(name="Bench", monthly_cap=None, price_cents=0)
+    db.session.add(plan)
+    db.session.flush()
+    db.session.add_all([
+        Client(name=f"bench{i}", username=f"bench{i}", password="x", plan_id=plan.id)
+        for i in range(args.clients)
+    ])
+    db.session.commit()
+
+    # Core inserts: the ORM flush hook is not needed for a read benchmark
+    table = MessageLog.__table__
+    numbers = [f"92300{n:07d}" for n in range(args.numbers)]
+    done = 0
+    while done < args.rows:
+        batch = []
+        for _ in range(min(BATCH, args.rows - done)):
+            inbound = rng.random() < 0.3
+            batch.append({
+                "client_id": min(int(rng.paretovariate(1.2)), args.clients),  # a few big clients
+                "recipient_number": pick_number(rng, numbers),
+                "template_name": "inbound_text" if inbound else rng.choice(["text", "order_update", "promo"]),
+                "status": "received" if inbound else rng.choice(["sent", "sent", "delivered", "read", "failed"]),
+                "direction": "inbound" if inbound else "outbound",
+                "sent_at": now - dt.timedelta(seconds=rng.randrange(365 * 86400)),
+            })
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        done += len(batch)
+        print(f"\r  loaded {done:,}/{args.rows:,} rows", end="", flush=True)
+    print()
+
+
+def queries(client_id, number):
+    since = dt.datetime.utcnow() - dt.timedelta(hours=24)
+    q = MessageLog.query
+    return {
+        "/messages/log (newest 100)": lambda: q.filter_by(client_id=client_id)
+            .order_by(MessageLog.sent_at.desc()).limit(100).all(),
+        "/messages/log?direction=inbound&recipient=": lambda: q.filter_by(
+            client_id=client_id, direction="inbound", recipient_number=number)
+            .order_by(MessageLog.sent_at.desc()).all(),
+        "/messages/log?status=failed (newest 100)": lambda: q.filter_by(client_id=client_id, status="failed")
+            .order_by(MessageLog.sent_at.desc()).limit(100).all(),
+        "/conversation/<n>/messages": lambda: q.filter_by(client_id=client_id, recipient_number=number)
+            .order_by(MessageLog.sent_at.desc()).limit(50).all(),
+        "/conversation/<n>/can_send_text": lambda: q.filter_by(
+            client_id=client_id, recipient_number=number, status="sent")
+            .order_by(MessageLog.sent_at.desc()).first(),
+        "/dashboard/usage sent in 24h": lambda: db.session.query(func.count()).filter(
+            MessageLog.client_id == client_id, MessageLog.status == "sent", MessageLog.sent_at >= since).scalar(),
+        "/dashboard/usage total sent": lambda: db.session.query(func.count()).filter(
+            MessageLog.client_id == client_id, MessageLog.status == "sent").scalar(),
+        "/conversations (distinct numbers)": lambda: db.session.query(distinct(MessageLog.recipient_number))
+            .filter(MessageLog.client_id == client_id).all(),
+    }
+
+
+def time_all(client_id, number):
+    results = {}
+    for name, run in queries(client_id, number).items():
+        run()  # warm the page cache
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - start) * 1000)
+            db.session.expunge_all()
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    rng = random.Random(args.seed)
+    app = create_app()
+
+    with app.app_context():
+        if MessageLog.query.first() is not None:
+            sys.exit("benchmark needs an empty database")
+
+        for index in MessageLog.__table__.indexes:
+            index.drop(bind=db.engine, checkfirst=True)
+
+        print(f"Loading {args.rows:,} message_logs rows into {db.engine.url.render_as_string(hide_password=True)}")
+        load_rows(rng)
+        if db.engine.dialect.name == "sqlite":
+            db.session.execute(text("ANALYZE"))
+        else:
+            db.session.execute(text("ANALYZE message_logs"))
+        db.session.commit()
+
+        client_id = 1  # the largest client is the worst case
+        number = db.session.query(MessageLog.recipient_number).filter_by(client_id=client_id).first()[0]
+
+        print("Timing without composite indexes...")
+        before = time_all(client_id, number)
+
+        start = time.perf_counter()
+        summary = upgrade()
+        print(f"upgrade() created {', '.join(summary['indexes'])} in {time.perf_counter() - start:.1f}s")
+        if db.engine.dialect.name != "sqlite":
+            db.session.execute(text("ANALYZE message_logs"))
+            db.session.commit()
+
+        print("Timing with composite indexes...")
+        after = time_all(client_id, number)
+
+    width = max(len(n) for n in before)
+    print(f"\n{'query':<{width}}  {'before ms':>10}  {'after ms':>10}  {'speedup':>8}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<{width}}  {before[name]:>10.2f}  {after[name]:>10.2f}  {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
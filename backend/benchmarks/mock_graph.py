@@ -0,0 +1,239 @@
+# benchmarks/mock_graph.py — local stand-in for the WhatsApp Graph API
+#
+#   python benchmarks/mock_graph.py --port 8089 --latency-ms 80 --error-rate 0.01 --throttle-rate 0.02
+#   WHATSAPP_API_URL=http://127.0.0.1:8089/v22.0 flask run
+#
+# Answers the calls app/utils.py, app/template_catalog.py and routes/templates.py
+# make, with Graph's response shapes:
+#   POST   /<phone id>/messages            -> {"messages": [{"id": "wamid..."}]}
+#   GET    /<phone id>                     -> messaging_limit_tier etc.
+#   GET    /<waba id>/message_templates    -> paged template list
+#   POST   /<waba id>/message_templates    -> {"id", "status": "PENDING"}
+#   DELETE /<waba id>/message_templates    -> {"success": true}
+#   GET    /_stats                         -> counters of this mock
+# Every request waits `latency_ms` ± `jitter_ms`. Sends fail with a 500 at
+# `error_rate`, and are throttled with HTTP 429 / error 130429 at
+# `throttle_rate` or whenever they go over `mps` messages/second per phone
+# number. That is the signal app/governor.py reacts to.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+THROTTLE_ERROR = {
+    "message": "(#130429) Rate limit hit",
+    "type": "OAuthException",
+    "code": 130429,
+    "error_data": {"messaging_product": "whatsapp", "details": "Cloud API message throughput has been reached."}
+}
+SERVER_ERROR = {"message": "An unknown error has occurred.", "type": "OAuthException", "code": 1, "is_transient": True}
+
+
+def sample_templates(count):
+    categories = ("MARKETING", "UTILITY", "AUTHENTICATION")
+    return [{
+        "id": str(900000000000 + i),
+        "name": f"bench_template_{i}",
+        "language": "en_US",
+        "category": categories[i % len(categories)],
+        "status": "APPROVED",
+        "parameter_format": "POSITIONAL",
+        "components": [
+            {"type": "BODY", "text": "Hello {{1}}, your order {{2}} is on its way.", "example": {"body_text": [["Ali", "#1234"]]}}
+        ]
+    } for i in range(count)]
+
+
+class MockGraph:
+    """A threaded HTTP server impersonating graph.facebook.com. Use start()/stop() or as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, version="v22.0", latency_ms=50.0, jitter_ms=10.0,
+                 error_rate=0.0, throttle_rate=0.0, mps=None, tier="TIER_UNLIMITED", templates=25, seed=None):
+        self.version = version
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.mps = mps
+        self.tier = tier
+        self.templates = sample_templates(templates)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets = {}  # phone id -> (tokens, updated_at)
+        self.counters = {"requests": 0, "sent": 0, "throttled": 0, "errors": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{self.version}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-graph", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    # ----------- BEHAVIOUR -----------
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _delay(self):
+        with self._lock:
+            delay = self._rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def _over_mps(self, phone_id):
+        """Token bucket of `mps` per phone number, the way Meta enforces throughput."""
+        if not self.mps:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(phone_id, (self.mps, now))
+            tokens = min(self.mps, tokens + (now - updated_at) * self.mps)
+            allowed = tokens >= 1
+            self._buckets[phone_id] = (tokens - 1 if allowed else tokens, now)
+            return not allowed
+
+    def send_message(self, phone_id, body):
+        if self._roll(self.throttle_rate) or self._over_mps(phone_id):
+            self._count("throttled")
+            return 429, {"error": THROTTLE_ERROR}
+        if self._roll(self.error_rate):
+            self._count("errors")
+            return 500, {"error": SERVER_ERROR}
+        self._count("sent")
+        to = body.get("to", "")
+        return 200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+        }
+
+    def list_templates(self, query, base_url):
+        limit = int(query.get("limit", ["200"])[0])
+        offset = int(query.get("after", ["0"])[0])
+        page = self.templates[offset:offset + limit]
+        body = {"data": page, "paging": {"cursors": {"before": str(offset), "after": str(offset + len(page))}}}
+        if offset + limit < len(self.templates):
+            body["paging"]["next"] = f"{base_url}?{urlencode({'limit': limit, 'after': offset + limit})}"
+        return 200, body
+
+    def _handler(self):
+        graph = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like graph.facebook.com
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+                try:
+                    return json.loads(self.rfile.read(length))
+                except ValueError:
+                    return {}
+
+            def _route(self, method):
+                url = urlsplit(self.path)
+                path = re.sub(r"^/v\d+\.\d+", "", url.path).strip("/")
+                query = parse_qs(url.query)
+                body = self._body() if method == "POST" else {}
+
+                if path == "_stats":
+                    return self._reply(200, graph.stats())
+
+                graph._count("requests")
+                graph._delay()
+                parts = path.split("/")
+
+                if method == "POST" and len(parts) == 2 and parts[1] == "messages":
+                    return self._reply(*graph.send_message(parts[0], body))
+                if len(parts) == 2 and parts[1] == "message_templates":
+                    if method == "GET":
+                        base = f"http://{self.headers.get('Host')}{url.path}"
+                        return self._reply(*graph.list_templates(query, base))
+                    if method == "POST":
+                        return self._reply(200, {"id": str(uuid.uuid4().int)[:15], "status": "PENDING", "category": body.get("category")})
+                    if method == "DELETE":
+                        return self._reply(200, {"success": True})
+                if method == "GET" and len(parts) == 1 and parts[0]:
+                    return self._reply(200, {
+                        "id": parts[0],
+                        "display_phone_number": "+1 555 010 0000",
+                        "quality_rating": "GREEN",
+                        "messaging_limit_tier": graph.tier
+                    })
+                self._reply(404, {"error": {"message": f"Unknown path components: /{path}", "type": "OAuthException", "code": 2500}})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+            def do_DELETE(self):
+                self._route("DELETE")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the WhatsApp Graph API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of sends answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of sends answered with a 429 / 130429")
+    parser.add_argument("--mps", type=float, default=None, help="throttle sends above this many messages/second per phone number")
+    parser.add_argument("--tier", default="TIER_UNLIMITED")
+    parser.add_argument("--templates", type=int, default=25)
+    args = parser.parse_args()
+
+    mock = MockGraph(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                     error_rate=args.error_rate, throttle_rate=args.throttle_rate, mps=args.mps,
+                     tier=args.tier, templates=args.templates)
+    print(f"Mock Graph API on {mock.url} (Ctrl+C to stop)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
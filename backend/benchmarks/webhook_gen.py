@@ -0,0 +1,116 @@
+# benchmarks/webhook_gen.py — synthetic WhatsApp webhook deliveries
+#
+#   python benchmarks/webhook_gen.py --url http://127.0.0.1:5000/webhook --deliveries 5000 --concurrency 16
+#   python benchmarks/webhook_gen.py --secret $WHATSAPP_APP_SECRET --wamids-file sent_wamids.txt
+#
+# Builds bodies shaped like Meta's callbacks: inbound messages from customer
+# numbers, and sent/delivered/read/failed statuses for wamids we sent. Bodies
+# are signed with X-Hub-Signature-256 when a secret is given. A POST only
+# lands in webhook_inbox, so run `python worker.py --webhook-consumers N`
+# alongside to measure ingestion end to end.
+
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+
+from loadgen import drive, summarize
+
+STATUS_FLOW = ("sent", "delivered", "read")
+
+
+def _envelope(value, field="messages", waba_id="bench-waba", phone_id="bench-phone"):
+    value = dict(value, messaging_product="whatsapp", metadata={
+        "display_phone_number": "15550100000",
+        "phone_number_id": phone_id
+    })
+    return {"object": "whatsapp_business_account", "entry": [{"id": waba_id, "changes": [{"field": field, "value": value}]}]}
+
+
+def inbound_delivery(messages, **ids):
+    """One body carrying inbound text messages, `messages` being (from_number, text) pairs."""
+    now = int(time.time())
+    return _envelope({
+        "contacts": [{"profile": {"name": f"Customer {number[-4:]}"}, "wa_id": number} for number, _ in messages],
+        "messages": [{
+            "from": number,
+            "id": f"wamid.{uuid.uuid4().hex}",
+            "timestamp": str(now),
+            "type": "text",
+            "text": {"body": text}
+        } for number, text in messages]
+    }, **ids)
+
+
+def status_delivery(statuses, **ids):
+    """One body carrying status updates, `statuses` being (wamid, recipient, status) triples."""
+    now = int(time.time())
+    entries = []
+    for wamid, recipient, status in statuses:
+        entry = {"id": wamid, "recipient_id": recipient, "status": status, "timestamp": str(now)}
+        if status == "failed":
+            entry["errors"] = [{"code": 131026, "title": "Message undeliverable"}]
+        entries.append(entry)
+    return _envelope({"statuses": entries}, **ids)
+
+
+def sign(body, secret):
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def generate(count, numbers, sent=(), status_share=0.7, batch=1, failed_share=0.02, seed=None):
+    """
+    Yields `count` encoded bodies. `sent` holds (wamid, recipient) pairs to
+    report statuses for; without it every delivery is an inbound message.
+    Each body carries `batch` events, the way Meta groups busy periods.
+    """
+    rng = random.Random(seed)
+    sent = list(sent)
+    for _ in range(count):
+        if sent and rng.random() < status_share:
+            picks = [rng.choice(sent) for _ in range(batch)]
+            body = status_delivery([
+                (wamid, recipient, "failed" if rng.random() < failed_share else rng.choice(STATUS_FLOW))
+                for wamid, recipient in picks
+            ])
+        else:
+            body = inbound_delivery([(rng.choice(numbers), f"Hi, question #{rng.randrange(10000)}") for _ in range(batch)])
+        yield json.dumps(body).encode()
+
+
+def post_all(url, bodies, concurrency=8, secret=None):
+    """POSTs every body, signed when `secret` is set. Returns loadgen.drive()'s (latencies, statuses, wall)."""
+    def call(body):
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers["X-Hub-Signature-256"] = sign(body, secret)
+        return lambda session: session.post(url, data=body, headers=headers, timeout=30)
+
+    return drive([call(body) for body in bodies], concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send synthetic WhatsApp webhook deliveries")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/webhook")
+    parser.add_argument("--deliveries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1, help="events per delivery")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--numbers", type=int, default=1000, help="distinct customer numbers sending inbound messages")
+    parser.add_argument("--wamids-file", help="lines of '<wamid> <recipient>' to send statuses for")
+    parser.add_argument("--secret", help="WHATSAPP_APP_SECRET, to sign the bodies")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    numbers = [f"92300{n:07d}" for n in range(args.numbers)]
+    sent = []
+    if args.wamids_file:
+        with open(args.wamids_file) as f:
+            sent = [tuple(line.split()[:2]) for line in f if line.strip()]
+
+    bodies = list(generate(args.deliveries, numbers, sent, batch=args.batch, seed=args.seed))
+    result = summarize(*post_all(args.url, bodies, args.concurrency, args.secret))
+    print(f"{result['requests']} deliveries at {result['rps']}/s, p50 {result['p50_ms']} ms, "
+          f"p99 {result['p99_ms']} ms, {result['errors']} non-2xx")
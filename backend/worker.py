@@ -0,0 +1,66 @@
+# worker.py — drains the outbound message queue (jobs created by send_message with "async": true,
+# then started campaigns) and the buffered webhook deliveries (webhook_inbox)
+#
+#   python worker.py                                   # one queue worker
+#   python worker.py --workers 4                       # four queue workers sharing the queue
+#   python worker.py --workers 2 --webhook-consumers 2 # plus two webhook consumers
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+
+from app import create_app
+from app.jobs import run_worker
+from app.webhooks import run_consumer
+
+_stopping = False
+
+
+def _stop(*_):
+    global _stopping
+    _stopping = True
+
+
+def _run(index, poll_interval, once, kind="queue"):
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    app = create_app()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{kind}{index}"
+    with app.app_context():
+        if kind == "webhook":
+            app.logger.info(f"Webhook consumer {worker_id} started")
+            run_consumer(worker_id, poll_interval, once=once, should_stop=lambda: _stopping)
+        else:
+            app.logger.info(f"Queue worker {worker_id} started")
+            run_worker(worker_id, poll_interval, once=once, should_stop=lambda: _stopping)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outbound WhatsApp message queue worker")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--webhook-consumers", type=int, default=0, help="number of webhook consumer processes")
+    parser.add_argument("--poll-interval", type=float, default=None, help="seconds to sleep when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="exit once the queue is empty")
+    args = parser.parse_args()
+
+    if args.workers <= 1 and args.webhook_consumers == 0:
+        _run(0, args.poll_interval, args.once)
+    else:
+        procs = [
+            multiprocessing.Process(target=_run, args=(i, args.poll_interval, args.once), name=f"wa-worker-{i}")
+            for i in range(args.workers)
+        ] + [
+            multiprocessing.Process(target=_run, args=(i, args.poll_interval, args.once, "webhook"), name=f"wa-webhook-{i}")
+            for i in range(args.webhook_consumers)
+        ]
+        for p in procs:
+            p.start()
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
@@ -118,15 +118,30 @@ export default function AdminPanel() {
 
   }, [])
 
+  // /admin/clients is keyset-paginated: follow X-Next-Cursor until every client is loaded
+  const fetchAllClients = async (adminToken: string) => {
+    const all: any[] = []
+    let cursor: string | null = null
+    do {
+      const params = new URLSearchParams({ limit: "1000" })
+      if (cursor) params.set("cursor", cursor)
+      const res = await fetch(`/admin/clients?${params}`, {
+        headers: { "X-Admin-Token": adminToken },
+      })
+      if (!res.ok) throw new Error(`Failed to fetch clients: ${res.status}`)
+      all.push(...(await res.json()))
+      cursor = res.headers.get("X-Next-Cursor")
+    } while (cursor)
+    return all
+  }
+
   const fetchData = async () => {
     const adminToken = localStorage.getItem("admin_token")
     if (!adminToken) return
 
     try {
-      const [clientsRes, plansRes, analyticsRes, requestsRes] = await Promise.all([
-        fetch("/admin/clients", {
-          headers: { "X-Admin-Token": adminToken },
-        }),
+      const [clientsData, plansRes, analyticsRes, requestsRes] = await Promise.all([
+        fetchAllClients(adminToken),
         fetch("/subscription/plans"),
         fetch("/admin/analytics", {
           headers: { "X-Admin-Token": adminToken },
@@ -136,8 +151,7 @@ export default function AdminPanel() {
         }),
       ])
 
-      const [clientsData, plansData, analyticsData, requestsData] = await Promise.all([
-        clientsRes.json(),
+      const [plansData, analyticsData, requestsData] = await Promise.all([
         plansRes.json(),
         analyticsRes.json(),
         requestsRes.json(),
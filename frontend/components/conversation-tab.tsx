@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
@@ -15,6 +15,7 @@ interface Conversation {
   last_message: string
   last_message_time: string | null
   can_send_text: boolean
+  unread_count: number
 }
 
 interface Message {
@@ -34,6 +35,7 @@ export default function ConversationTab() {
   const [newMessage, setNewMessage] = useState("")
   const [loading, setLoading] = useState(true)
   const [sendingMessage, setSendingMessage] = useState(false)
+  const tailCursor = useRef<string | null>(null)
 
   // Add these helper functions at the top of the component
   const formatTimeSafe = (timestamp: string) => {
@@ -66,58 +68,62 @@ export default function ConversationTab() {
 
   useEffect(() => {
     if (selectedConversation) {
+      tailCursor.current = null
       fetchMessages(selectedConversation)
+      fetch(`/conversation/${selectedConversation}/read`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${user?.token}` },
+      }).catch(() => {})
     }
   }, [selectedConversation])
 
-  const checkCanSendText = async (phoneNumber: string): Promise<boolean> => {
-    try {
-      // Check if there's an inbound message from this number in the last 24 hours
-      const response = await fetch(`/messages/log?direction=inbound&recipient=${phoneNumber}`, {
-        headers: { Authorization: `Bearer ${user?.token}` },
-      })
-      const data = await response.json()
+  // Long-poll for messages newer than the ones on screen while a chat is open
+  useEffect(() => {
+    if (!selectedConversation) return
+    let cancelled = false
+    const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
 
-      if (data.messages && data.messages.length > 0) {
-        const lastInbound = new Date(data.messages[0].sent_at)
-        const now = new Date()
-        const hoursDiff = (now.getTime() - lastInbound.getTime()) / (1000 * 60 * 60)
-        return hoursDiff < 24
+    const tail = async () => {
+      while (!cancelled) {
+        const cursor = tailCursor.current
+        if (!cursor) {
+          await sleep(1000)
+          continue
+        }
+        try {
+          const response = await fetch(
+            `/conversation/${selectedConversation}/messages?after=${encodeURIComponent(cursor)}&wait=25`,
+            { headers: { Authorization: `Bearer ${user?.token}` } },
+          )
+          const data = await response.json()
+          if (cancelled || tailCursor.current !== cursor) continue
+          if (data.messages?.length) {
+            setMessages((prev) => {
+              const known = new Set(prev.map((m) => m.id))
+              return [...prev, ...data.messages.filter((m: Message) => !known.has(m.id))]
+            })
+          }
+          if (data.after) tailCursor.current = data.after
+        } catch (error) {
+          await sleep(3000)
+        }
       }
+    }
 
-      return false
-    } catch (error) {
-      console.error("Failed to check text capability:", error)
-      return false
+    tail()
+    return () => {
+      cancelled = true
     }
-  }
+  }, [selectedConversation])
 
   const fetchConversations = async () => {
     try {
-      const response = await fetch("/conversations", {
+      // One request for the whole inbox: last message, 24h window and unread count per contact
+      const response = await fetch("/conversations/inbox?limit=5000", {
         headers: { Authorization: `Bearer ${user?.token}` },
       })
-      const phoneNumbers = await response.json()
-
-      // Fetch additional info for each conversation
-      const conversationPromises = phoneNumbers.map(async (phone: string) => {
-        const canSendText = await checkCanSendText(phone)
-
-        const canSendResponse = await fetch(`/conversation/${phone}/can_send_text`, {
-          headers: { Authorization: `Bearer ${user?.token}` },
-        })
-        const canSendData = await canSendResponse.json()
-
-        return {
-          phone_number: phone,
-          last_message: canSendData.last_message || "No messages yet",
-          last_message_time: canSendData.last_message_time,
-          can_send_text: canSendText,
-        }
-      })
-
-      const conversationsData = await Promise.all(conversationPromises)
-      setConversations(conversationsData)
+      const data = await response.json()
+      setConversations(data.conversations || [])
     } catch (error) {
       console.error("Failed to fetch conversations:", error)
     } finally {
@@ -132,6 +138,7 @@ export default function ConversationTab() {
       })
       const data = await response.json()
       setMessages(data.messages || [])
+      tailCursor.current = data.after || null
     } catch (error) {
       console.error("Failed to fetch messages:", error)
     }
@@ -9,6 +9,7 @@ import { Input } from "@/components/ui/input"
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from "@/components/ui/dialog"
 import { Plus, Edit, Eye, CheckCircle, XCircle, Clock, AlertCircle, Filter, Search } from "lucide-react"
 import { useAuth } from "@/contexts/auth-context"
+import { useEvents } from "@/hooks/use-events"
 import TemplateCreator from "@/components/template-creator"
 import TemplatePreview from "@/components/template-preview"
 
@@ -37,15 +38,13 @@ export default function TemplateManager() {
 
   useEffect(() => {
     fetchTemplates()
-
-    // Set up periodic status updates every 30 seconds
-    const interval = setInterval(() => {
-      fetchTemplates()
-    }, 30000)
-
-    return () => clearInterval(interval)
   }, [user?.token])
 
+  // Refresh when Meta finishes reviewing a template instead of polling
+  useEvents(user?.token, (event) => {
+    if (event.type === "template.status") fetchTemplates()
+  })
+
   useEffect(() => {
     // Apply filters whenever templates or filter criteria change
     let filtered = templates
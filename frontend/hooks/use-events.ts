@@ -0,0 +1,58 @@
+import * as React from "react"
+
+export interface LiveEvent {
+  id: number
+  type: string
+  data: any
+}
+
+// Subscribes to the backend's /events/stream (Server-Sent Events).
+// Uses fetch instead of EventSource so the API key can go in the Authorization header.
+export function useEvents(token: string | undefined, onEvent: (event: LiveEvent) => void) {
+  const handler = React.useRef(onEvent)
+  handler.current = onEvent
+
+  React.useEffect(() => {
+    if (!token) return
+    const controller = new AbortController()
+    let lastEventId: string | null = null
+
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const headers: Record<string, string> = { Authorization: `Bearer ${token}` }
+          if (lastEventId) headers["Last-Event-ID"] = lastEventId
+          const response = await fetch("/events/stream", { headers, signal: controller.signal })
+          if (!response.ok || !response.body) throw new Error(`stream failed: ${response.status}`)
+
+          const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+          let buffer = ""
+          while (true) {
+            const { value, done } = await reader.read()
+            if (done) break
+            buffer += value
+            const frames = buffer.split("\n\n")
+            buffer = frames.pop() || ""
+            for (const frame of frames) {
+              let id = "", type = "message", data = ""
+              for (const line of frame.split("\n")) {
+                if (line.startsWith("id: ")) id = line.slice(4)
+                else if (line.startsWith("event: ")) type = line.slice(7)
+                else if (line.startsWith("data: ")) data += line.slice(6)
+              }
+              if (!id || !data) continue
+              lastEventId = id
+              handler.current({ id: Number(id), type, data: JSON.parse(data) })
+            }
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return
+        }
+        await new Promise((resolve) => setTimeout(resolve, 3000))
+      }
+    }
+
+    connect()
+    return () => controller.abort()
+  }, [token])
+}
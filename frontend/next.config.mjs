@@ -32,6 +32,10 @@ const nextConfig = {
         source: '/conversations',
         destination: 'http://localhost:5000/conversations',
       },
+      {
+        source: '/conversations/:path*',
+        destination: 'http://localhost:5000/conversations/:path*',
+      },
       {
         source: '/conversation/:path*',
         destination: 'http://localhost:5000/conversation/:path*',
@@ -40,6 +44,10 @@ const nextConfig = {
         source: '/subscription/:path*',
         destination: 'http://localhost:5000/subscription/:path*',
       },
+      {
+        source: '/events/:path*',
+        destination: 'http://localhost:5000/events/:path*',
+      },
       {
         source: '/templates/:path*',
         destination: 'http://localhost:5000/templates/:path*',